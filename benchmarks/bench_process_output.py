@@ -0,0 +1,102 @@
+"""
+Benchmark the assembly stage of HSA alone: turning the raw output of each combination
+(hsa_raw_output_dicts) into hsa_output_df, reported as output rows per second.
+
+Run from the repo root:
+    python benchmarks/bench_process_output.py --rows-per-combo 200000
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import encoding
+
+
+def build_raw_output_dicts(rows_per_combo: int, seed: int = 0) -> list:
+    """Synthetic raw outputs of 3 high cardinality combinations, shaped like _run_obj_func_iterations()."""
+    rng = np.random.default_rng(seed)
+    combinations = [["ts", "user"], ["ts", "user", "item"], ["ts", "Overall"]]
+
+    raw_output_dicts = []
+    for combo in combinations:
+        df = pd.DataFrame(
+            {
+                "ts": rng.integers(0, 30, rows_per_combo),
+                "user": rng.integers(0, 10**6, rows_per_combo).astype(str),
+                "item": rng.integers(0, 10**4, rows_per_combo),
+                "Overall": "Overall",
+            }
+        )[combo]
+        df["n_rows"] = rng.integers(1, 100, rows_per_combo)
+        df["metric"] = rng.random(rows_per_combo)
+        raw_output_dicts.append({"combination": combo, "interaction_count": len(combo) - 1, "df": df})
+    return raw_output_dicts
+
+
+def process_row_wise(raw_output_dicts: list) -> pd.DataFrame:
+    """The row-wise assembly HSA used up to 1.1.0, kept as the reference point."""
+    combo_dfs = []
+    for combo_i_dict in raw_output_dicts:
+        combo = combo_i_dict["combination"]
+        combo_i_df = combo_i_dict["df"].copy()
+        combo_i_df["interaction_count"] = combo_i_dict["interaction_count"]
+        obj_func_calcs = [col for col in combo_i_df.columns if col not in combo]
+        combo_i_df["combo_dict"] = combo_i_df[combo].apply(
+            lambda row: dict(zip(combo, row.values.astype(str))),
+            axis=1,
+        )
+        combo_dfs.append(combo_i_df[["combo_dict"] + obj_func_calcs])
+    return pd.concat(combo_dfs).reset_index(drop=True)
+
+
+def build_data_codes(raw_output_dicts: list) -> dict:
+    """The encoded grouping columns, which HotSpotAnalyzer builds once in _build_data()."""
+    data = pd.concat([combo_i_dict["df"] for combo_i_dict in raw_output_dicts])
+    return encoding.encode_columns(data, ["ts", "user", "item", "Overall"])
+
+
+def process_columnar(raw_output_dicts: list, data_codes: dict) -> pd.DataFrame:
+    """The assembly stage of HotSpotAnalyzer."""
+    HSA = HotSpotAnalyzer(target_cols=["user", "item"], time_period=["ts"])
+    HSA.combinations = [combo_i_dict["combination"] for combo_i_dict in raw_output_dicts]
+    HSA.data_codes = data_codes
+    HSA.hsa_raw_output_dicts = raw_output_dicts
+    with contextlib.redirect_stdout(io.StringIO()):
+        HSA._process_hsa_raw_output_dicts()
+    return HSA.hsa_output_df
+
+
+def time_stage(process, raw_output_dicts: list, repeats: int) -> float:
+    """Best wall time of the assembly stage over repeats."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process(raw_output_dicts)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows-per-combo", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    raw_output_dicts = build_raw_output_dicts(args.rows_per_combo)
+    n_rows = sum(len(combo_i_dict["df"]) for combo_i_dict in raw_output_dicts)
+
+    process_columnar_encoded = functools.partial(process_columnar, data_codes=build_data_codes(raw_output_dicts))
+    for name, process in [("row_wise", process_row_wise), ("columnar", process_columnar_encoded)]:
+        seconds = time_stage(process, raw_output_dicts, args.repeats)
+        print(f"{name:>10}: {n_rows:,} rows in {seconds:.3f}s -> {n_rows / seconds:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
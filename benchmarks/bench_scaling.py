@@ -0,0 +1,243 @@
+"""
+Benchmark how HSA scales with the rows of the data and the number of combinations.
+
+Rows are scaled by stacking the bundled datasets (data/tips_dataset.csv & data/titanic_dataset.csv)
+with demo.data_stacker, and combinations by the number of target_cols & the interaction_limit.
+Each case records the throughput & peak memory of run_hsa(), its latency per phase (see
+HotSpotAnalyzer.profile), and the latency of search_hsa_output() & lag_hsa_by_time_period().
+Nothing is downloaded.
+
+Run from the repo root, save a baseline, and compare a later run against it:
+    python benchmarks/bench_scaling.py run --output bench_baseline.json
+    python benchmarks/bench_scaling.py run --output bench_current.json
+    python benchmarks/bench_scaling.py compare bench_baseline.json bench_current.json --threshold 0.2
+
+compare exits with status 1 when a case is slower (or uses more memory) than the baseline by more
+than the threshold, so it can gate a CI job.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, metrics
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+# The target columns of each dataset, by decreasing relevance, & the metrics of each objective function
+DATASETS = {
+    "tips": {
+        "file_name": "tips_dataset.csv",
+        "target_cols": ["day", "smoker", "size", "sex", "time"],
+        "metric_specs": {"avg_tip": metrics.Mean("tip"), "total_bill": metrics.Sum("total_bill")},
+    },
+    "titanic": {
+        "file_name": "titanic_dataset.csv",
+        "target_cols": ["sex", "pclass", "embarked", "who", "deck", "alone"],
+        "metric_specs": {"survival_rate": metrics.Mean("survived"), "avg_fare": metrics.Mean("fare")},
+    },
+}
+
+# (stack_counts, (n_target_cols, interaction_limit) pairs) of each suite, stack_count=k stacks k*(k+1)/2 copies
+SUITES = {
+    "quick": ([5, 20], [(3, 2), (5, 3)]),
+    "full": ([10, 40, 80], [(3, 2), (5, 3), (6, 4)]),
+}
+
+# The metrics compare flags, lower is better
+COMPARED_METRICS = ["run_hsa_seconds", "search_seconds", "lag_seconds", "peak_memory_mb"]
+
+
+def load_dataset(name: str, stack_count: int) -> pd.DataFrame:
+    """A bundled dataset stacked stack_count times, with a fake_ts column per stack."""
+    df = pd.read_csv(os.path.join(DATA_DIR, DATASETS[name]["file_name"]))
+    return demo.data_stacker(df, stack_count).reset_index(drop=True)
+
+
+def build_objective_function(name: str, objective: str):
+    """The metric specs of a dataset, or the equivalent objective function."""
+    metric_specs = DATASETS[name]["metric_specs"]
+    if objective == "specs":
+        return metric_specs
+
+    aggregations = {
+        metric_name: (metric.column, type(metric).__name__.lower()) for metric_name, metric in metric_specs.items()
+    }
+    return lambda data: data.agg(**aggregations)
+
+
+def build_hsa(data: pd.DataFrame, name: str, objective: str, n_target_cols: int, interaction_limit: int):
+    """A quiet HotSpotAnalyzer of a dataset over its first n_target_cols target columns."""
+    return HotSpotAnalyzer(
+        data=data,
+        target_cols=DATASETS[name]["target_cols"][:n_target_cols],
+        time_period=["fake_ts"],
+        interaction_limit=interaction_limit,
+        objective_function=build_objective_function(name, objective),
+        verbose=False,
+    )
+
+
+def best_time(func, repeats: int) -> float:
+    """Best wall time of func over repeats."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_case(
+    data: pd.DataFrame,
+    name: str,
+    objective: str,
+    n_target_cols: int,
+    interaction_limit: int,
+    repeats: int,
+) -> dict:
+    """Benchmark run_hsa, search_hsa_output & lag_hsa_by_time_period on a dataset."""
+    hsa_args = (data, name, objective, n_target_cols, interaction_limit)
+
+    # Timed without tracemalloc, which slows down allocations
+    run_timings = []
+    for _ in range(repeats):
+        HSA = build_hsa(*hsa_args)
+        start = time.perf_counter()
+        HSA.run_hsa()
+        run_timings.append(time.perf_counter() - start)
+    run_seconds = min(run_timings)
+    phase_seconds = HSA.profile().set_index("phase")["wall_time"].round(6).to_dict()
+
+    search_term = str(data[HSA.target_cols[0]].dropna().iloc[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        search_seconds = best_time(
+            lambda: HSA.search_hsa_output(search_terms=search_term, search_across="values"),
+            repeats,
+        )
+    lag_seconds = best_time(lambda: HSA.lag_hsa_by_time_period(1), repeats)
+
+    HSA_memory = build_hsa(*hsa_args)
+    tracemalloc.start()
+    HSA_memory.run_hsa()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "rows": len(data),
+        "combinations": len(HSA.combinations),
+        "output_rows": len(HSA.hsa_output_df),
+        "run_hsa_seconds": round(run_seconds, 6),
+        "rows_per_second": round(len(data) / run_seconds),
+        "phase_seconds": phase_seconds,
+        "search_seconds": round(search_seconds, 6),
+        "lag_seconds": round(lag_seconds, 6),
+        "peak_memory_mb": round(peak_memory / 1e6, 3),
+    }
+
+
+def run_suite(suite: str, repeats: int) -> dict:
+    """Benchmark every case of a suite, keyed by case id."""
+    stack_counts, combination_scales = SUITES[suite]
+    results = {}
+    for name, stack_count in itertools.product(DATASETS, stack_counts):
+        data = load_dataset(name, stack_count)
+        cases = itertools.product(combination_scales, ["function", "specs"])
+        for (n_target_cols, interaction_limit), objective in cases:
+            case_id = f"{name}-stack{stack_count}-cols{n_target_cols}-limit{interaction_limit}-{objective}"
+            results[case_id] = run_case(data, name, objective, n_target_cols, interaction_limit, repeats)
+            result = results[case_id]
+            print(
+                f"{case_id:>45}: {result['rows']:>9,} rows, {result['combinations']:>3} combinations in "
+                f"{result['run_hsa_seconds']:.3f}s -> {result['rows_per_second']:>11,} rows/s, "
+                f"peak {result['peak_memory_mb']:.1f}MB"
+            )
+    return results
+
+
+def environment() -> dict:
+    """The versions & platform the benchmark ran on, as timings are only comparable on the same machine."""
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_seconds: float) -> list:
+    """
+    Compare the results of two runs.
+
+    Parameters:
+    - baseline (dict): The saved results of the baseline run.
+    - current (dict): The saved results of the current run.
+    - threshold (float): The relative increase of a metric flagged as a regression, ie: 0.2 for +20%.
+    - min_seconds (float): Timings below this in both runs are noise, and never flagged.
+
+    Returns:
+    - list: The (case_id, metric, baseline, current, ratio) of each regression.
+    """
+    regressions = []
+    for case_id in sorted(set(baseline["results"]) & set(current["results"])):
+        for metric in COMPARED_METRICS:
+            baseline_value = baseline["results"][case_id][metric]
+            current_value = current["results"][case_id][metric]
+            if metric.endswith("_seconds") and max(baseline_value, current_value) < min_seconds:
+                continue
+            ratio = current_value / baseline_value if baseline_value > 0 else np.inf
+            if ratio > 1 + threshold:
+                regressions.append((case_id, metric, baseline_value, current_value, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks, and save their results as JSON")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.add_argument("--suite", choices=list(SUITES), default="quick")
+    run_parser.add_argument("--repeats", type=int, default=3)
+
+    compare_parser = commands.add_parser("compare", help="Flag the regressions of a run against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    compare_parser.add_argument("--min-seconds", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = {"environment": environment(), "suite": args.suite, "results": run_suite(args.suite, args.repeats)}
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved {len(results['results'])} cases to {args.output}")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    n_cases = len(set(baseline["results"]) & set(current["results"]))
+    regressions = compare(baseline, current, args.threshold, args.min_seconds)
+    for case_id, metric, baseline_value, current_value, ratio in regressions:
+        print(f"REGRESSION {case_id} {metric}: {baseline_value} -> {current_value} ({ratio:.2f}x)")
+    print(f"{len(regressions)} regressions across {n_cases} cases, threshold: +{args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+The hot-spot-analysis command: run HotSpotAnalyzer over a CSV or Parquet file, and write its output
+to a directory of Parquet files partitioned by interaction_count.
+
+    hot-spot-analysis data.csv --target-cols day smoker size --time-period fake_ts \\
+        --metric avg_tip=mean:tip --metric total_bill=sum:total_bill --output hsa_output/
+
+Run `hot-spot-analysis --help` for every option.
+"""
+
+import argparse
+import importlib
+import itertools
+import os
+import re
+import shutil
+import sys
+import time
+from typing import List, Optional
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import metrics, rollup, sinks, streaming
+
+# The rows read to estimate the memory of the data, see: estimate_memory
+SAMPLE_ROWS = 10_000
+# The share of the memory budget a chunk may take, the rest is left to the partial aggregates & output
+CHUNK_BUDGET_SHARE = 0.25
+BYTE_UNITS = {"": 1, "B": 1, "KB": 10**3, "MB": 10**6, "GB": 10**9, "TB": 10**12}
+
+
+def parse_bytes(size: str) -> int:
+    """
+    Parse a size in bytes, ie: '512MB', '4GB' or '1000000'.
+
+    Raises:
+    - argparse.ArgumentTypeError: If the size isn't a number followed by an optional unit.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B?)\s*", size.upper())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"'{size}' is not a size, ie: 512MB or 4GB")
+    return int(float(match.group(1)) * BYTE_UNITS[match.group(2)])
+
+
+def parse_metric(metric: str) -> tuple:
+    """
+    Parse a built-in metric, ie: 'avg_tip=mean:tip' to ('avg_tip', Mean('tip')).
+
+    Raises:
+    - argparse.ArgumentTypeError: If the metric isn't NAME=FUNC:COLUMN, or FUNC isn't decomposable.
+    """
+    match = re.fullmatch(r"([^=]+)=([^:]+):(.+)", metric)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"'{metric}' must be NAME=FUNC:COLUMN, ie: avg_tip=mean:tip")
+    name, func, column = match.groups()
+    try:
+        return name, metrics.to_metric(name, (column, func))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from error
+
+
+def import_objective_function(path: str):
+    """
+    Import an objective function (or a dict of metric specs), ie: 'my_package.metrics:calc_tip_stats'.
+
+    Raises:
+    - argparse.ArgumentTypeError: If the path isn't MODULE:NAME, or can't be imported.
+    """
+    module_name, _, attribute = path.partition(":")
+    if not module_name or not attribute:
+        raise argparse.ArgumentTypeError(f"'{path}' must be MODULE:NAME, ie: my_package.metrics:calc_tip_stats")
+
+    # Modules next to the working directory can be imported, like with python -m
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    try:
+        return getattr(importlib.import_module(module_name), attribute)
+    except (ImportError, AttributeError) as error:
+        raise argparse.ArgumentTypeError(f"Can't import '{path}': {error}") from error
+
+
+def estimate_memory(path: str) -> tuple:
+    """
+    Estimate the memory a file takes once read, from the memory of its first rows.
+
+    Parameters:
+    - path (str): The path of a CSV or Parquet file.
+
+    Returns:
+    - tuple: The estimated bytes of the whole file in memory, and the bytes per row.
+    """
+    sample = next(streaming.read_file(path, chunksize=SAMPLE_ROWS))
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+
+    if path.endswith(streaming.PARQUET_SUFFIXES):
+        import pyarrow.parquet as pq
+
+        n_rows = pq.ParquetFile(path).metadata.num_rows
+    else:
+        # The rows of the file, from the bytes per line of the sample & the size of the file
+        with open(path, "rb") as file:
+            sample_bytes = sum(len(line) for line in itertools.islice(file, len(sample) + 1))
+        n_rows = os.path.getsize(path) * len(sample) / max(sample_bytes, 1)
+
+    return int(bytes_per_row * n_rows), bytes_per_row
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="hot-spot-analysis",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("input", help="The CSV or Parquet ('.parquet' or '.pq') file to analyze.")
+    parser.add_argument("--target-cols", nargs="+", required=True, help="The columns to drill down into.")
+    parser.add_argument("--time-period", nargs="+", default=[], help="The time period columns.")
+    parser.add_argument("--group-by", nargs="+", default=[], help="The columns every combination is grouped by.")
+    parser.add_argument("--interaction-limit", type=int, default=3)
+    parser.add_argument("--min-support", type=int, default=0, help="Drop the groups with fewer rows.")
+
+    objective = parser.add_mutually_exclusive_group(required=True)
+    objective.add_argument(
+        "--metric",
+        type=parse_metric,
+        action="append",
+        help=f"A built-in metric NAME=FUNC:COLUMN, repeatable. FUNC: {', '.join(metrics.NAMED_AGG_METRICS)}",
+    )
+    objective.add_argument(
+        "--objective-function",
+        type=import_objective_function,
+        help="An importable objective function or dict of metric specs, as MODULE:NAME.",
+    )
+
+    parser.add_argument("--output", required=True, help="The directory the output is written to.")
+    parser.add_argument("--layout", choices=["compact", "dicts"], default="compact", help="See: output_layout.")
+    parser.add_argument("--overwrite", action="store_true", help="Remove the output directory first.")
+    parser.add_argument("--rollup-schedule", choices=rollup.SCHEDULES, default="lattice", help="See: rollup_schedule.")
+
+    parser.add_argument(
+        "--n-jobs", type=int, default=1, help="Worker processes, -1 for one per CPU. Not with chunked input."
+    )
+    parser.add_argument(
+        "--chunksize", type=int, help="Read the input in chunks of rows, requires decomposable metrics."
+    )
+    parser.add_argument(
+        "--cache", help="The directory to cache the output of each combination in. Not with chunked input."
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=parse_bytes,
+        help="ie: 4GB. The input is read in chunks when it is estimated not to fit, see: --chunksize.",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Print the progress of HSA.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    """Run the hot-spot-analysis command, see: build_parser for the arguments."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    objective_function = dict(args.metric) if args.metric else args.objective_function
+    is_metric_specs = metrics.is_metric_specs(objective_function)
+
+    chunksize = args.chunksize
+    if chunksize is None and args.memory_budget is not None:
+        memory, bytes_per_row = estimate_memory(args.input)
+        if memory > args.memory_budget:
+            if not is_metric_specs:
+                parser.error(
+                    f"The input takes ~{memory / 1e9:.1f}GB, over the memory budget. "
+                    "Reading it in chunks requires decomposable metrics, see: --metric"
+                )
+            chunksize = max(int(args.memory_budget * CHUNK_BUDGET_SHARE / bytes_per_row), 1)
+    if chunksize is not None and not is_metric_specs:
+        parser.error("Reading the input in chunks requires decomposable metrics, see: --metric")
+    if chunksize is not None and (args.n_jobs != 1 or args.cache is not None):
+        reason = "--chunksize is set" if args.chunksize is not None else "the input is over the --memory-budget"
+        parser.error(f"--n-jobs & --cache don't apply when reading the input in chunks, which it is as {reason}")
+
+    if args.overwrite and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+    sink = sinks.PartitionedParquetSink(args.output)
+
+    hsa_args = {
+        "target_cols": args.target_cols,
+        "time_period": args.time_period,
+        "interaction_limit": args.interaction_limit,
+        "objective_function": objective_function,
+        "output_layout": args.layout,
+        "min_support": args.min_support,
+        "rollup_schedule": args.rollup_schedule,
+        "verbose": args.verbose,
+    }
+    start = time.perf_counter()
+    if chunksize is not None:
+        HSA = HotSpotAnalyzer(**hsa_args)
+        # The chunks are plain DataFrames, so the groups are set on the analyzer
+        HSA.grouped_by = args.group_by or None  # type: ignore
+        HSA.run_hsa_streaming(args.input, chunksize=chunksize)
+        sink.write(HSA.hsa_output_df)
+        sink.close()
+    else:
+        data = next(streaming.read_file(args.input))
+        if args.group_by:
+            data = data.groupby(args.group_by)
+        HSA = HotSpotAnalyzer(data=data, **hsa_args)  # type: ignore
+
+        if args.n_jobs == 1 and args.cache is None:
+            # Only one combination is held in memory at a time
+            HSA.run_hsa(sink=sink)
+        else:
+            HSA.run_hsa(n_jobs=args.n_jobs, cache=args.cache)
+            sink.write(HSA.hsa_output_df)
+            sink.close()
+
+    print(
+        f"hot-spot-analysis: {len(HSA.combinations)} combinations written to {args.output} "
+        + f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
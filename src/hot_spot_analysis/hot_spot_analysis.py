@@ -1,10 +1,37 @@
+import os
+import warnings
 from dataclasses import dataclass
-from typing import Callable, Union
+from concurrent.futures import Executor
+from typing import Callable, Iterator, Optional, Union
 
 import numpy as np
 import pandas as pd
 
-from hot_spot_analysis.utils import combos, demo, general, grouped_df, lists
+from hot_spot_analysis.utils import (
+    bitmap_index,
+    combos,
+    compact,
+    demo,
+    duckdb_backend,
+    encoding,
+    grouped_df,
+    incremental,
+    lag,
+    lattice,
+    lists,
+    metrics,
+    objectives,
+    parallel,
+    polars_backend,
+    profiling,
+    result_cache,
+    rollup,
+    sampling,
+    search_index,
+    sinks,
+    streaming,
+    support,
+)
 
 
 @dataclass
@@ -14,13 +41,45 @@ class HotSpotAnalyzer:
     Attributes:
     -----------
     data : pd.DataFrame
-        The dataset to be analyzed. Defaults to an empty DataFrame.
+        The dataset to be analyzed. Defaults to an empty DataFrame. A Polars DataFrame or LazyFrame
+        is run on the polars backend, & the path of a Parquet file on the duckdb backend.
     target_cols : list[str]
         The target columns within the dataset to focus the analysis on.
     interaction_limit : int
         The maximum number of interactions to consider during the analysis.
     objective_function : Callable
-        A function to evaluate the objective of the analysis.
+        A function to evaluate the objective of the analysis. Alternatively a dict of
+        decomposable metric specs, ie: {"avg_tips": metrics.Mean("tip")} or named aggregations
+        like {"total_tips": ("tip", "sum")}, which lets HSA aggregate the data once & roll up
+        every combination from that result. A dict of functions, ie: {"revenue": revenue_func,
+        "latency": latency_func}, runs them all on the same grouped data frame of each combination &
+        joins their outputs column-wise, see: utils/objectives.py.
+    output_layout : str
+        The layout of hsa_output_df, either: 'dicts' (default) or 'compact'. The compact layout has an
+        integer combo_id & a categorical column per target column (missing where the column isn't part
+        of the cut) instead of a dict per row, see: hsa_combinations_df & export_hsa_output_df(as_dicts=True).
+    min_support : int
+        The minimum number of rows (n_rows) of a group, groups with fewer rows are dropped from the output.
+        As a group never has more rows than its parent groups (the same cut with one target column less),
+        the children of dropped groups are never computed by an objective function. Metric specs are rolled
+        up for every group, and only then filtered. Defaults to 0, ie: every group is kept.
+    verbose : bool
+        If False, HSA runs quietly instead of printing its progress. Defaults to True.
+    on_event : Callable, optional
+        A function called with the profiling.Event of each phase as it ends (ie: the groupby & objective
+        call of each combination), see: profile() for a summary of the events.
+    backend : str
+        The engine that runs the combinations, either: 'auto' (default), 'pandas', 'polars' or 'duckdb'.
+        The polars backend runs every combination of decomposable metric specs as a lazy group-by query,
+        collected together so they share a single scan of the data, see: utils/polars_backend.py. The
+        duckdb backend runs them all as a single GROUPING SETS query on an in-process DuckDB, which spills
+        to disk when the data doesn't fit in memory, see: utils/duckdb_backend.py. 'auto' picks polars for
+        Polars data, duckdb for a Parquet path & pandas otherwise.
+    rollup_schedule : str
+        How metric specs roll up the combinations in run_hsa & run_hsa_streaming on the pandas backend,
+        either: 'lattice' (default) or 'pipesort'. 'lattice' rolls up each combination from its smallest
+        computed parent, 'pipesort' rolls up chains of nested combinations from a single sort each, see:
+        utils/pipesort.py. Both give the same output, & 'lattice' is as fast or faster on the benchmarks.
     """
 
     data: pd.DataFrame
@@ -35,23 +94,94 @@ class HotSpotAnalyzer:
         time_period: list = [None],  # []
         interaction_limit: int = 3,  # 3
         objective_function: Callable = None,  # type: ignore
+        output_layout: str = "dicts",  # "dicts"
+        min_support: int = 0,  # 0
+        verbose: bool = True,  # True
+        on_event: Optional[Callable[[profiling.Event], None]] = None,  # None
+        backend: str = "auto",  # "auto"
+        rollup_schedule: str = "lattice",  # "lattice"
     ):
         self.data_input = data
         self.target_cols = lists.unique(target_cols, drop_none=True)  # type: ignore
         self.time_period = lists.unique(time_period, drop_none=True)
         self.interaction_limit = interaction_limit
+        if objectives.is_objective_set(objective_function):
+            # The functions share the groups of each combination, see: utils/objectives.py
+            objective_function = objectives.ObjectiveSet(dict(objective_function))  # type: ignore
         self.objective_function = objective_function
 
+        output_layouts = ["dicts", "compact"]
+        if output_layout not in output_layouts:
+            raise ValueError(f"'output_layout' must be either: {output_layouts}")
+        self.output_layout = output_layout
+
+        if not isinstance(min_support, (int, np.integer)) or min_support < 0:
+            raise ValueError("'min_support' must be a non-negative integer, the minimum n_rows of a group.")
+        self.min_support = int(min_support)
+        self.verbose = verbose
+
+        backends = ["auto", "pandas", "polars", "duckdb"]
+        if backend not in backends:
+            raise ValueError(f"'backend' must be either: {backends}")
+        if backend == "auto" and polars_backend.is_polars_frame(data):
+            backend = "polars"
+        elif backend == "auto" and duckdb_backend.is_parquet_path(data):
+            backend = "duckdb"
+        elif backend == "auto":
+            backend = "pandas"
+        self.backend = backend
+
+        if rollup_schedule not in rollup.SCHEDULES:
+            raise ValueError(f"'rollup_schedule' must be either: {rollup.SCHEDULES}")
+        self.rollup_schedule = rollup_schedule
+        self.profiler = profiling.Profiler(callbacks=[on_event] if on_event is not None else [])
+
         # Set defaults for variables set via functions
         self.grouped_by: list[str] = None  # type: ignore
+        # The chunks of data appended since the data was last read, with their own codes (see append)
+        self._appended: list[tuple[pd.DataFrame, dict[str, encoding.EncodedColumn]]] = []
         self.data_prep: pd.DataFrame = pd.DataFrame(None)
+        self.data_codes: dict[str, encoding.EncodedColumn] = None  # type: ignore
         self.combinations: list[list[str]] = None  # type: ignore
         self.obj_func_tested: bool = False
         self.hsa_raw_output_dicts: list[dict] = None  # type: ignore
         self.hsa_output_df: pd.DataFrame = pd.DataFrame(None)
+        self.hsa_compact_df: pd.DataFrame = pd.DataFrame(None)
+        self.hsa_combinations_df: pd.DataFrame = pd.DataFrame(None)
+        self.hsa_search_index: Optional[search_index.SearchIndex] = None
+        self.hsa_lagged_df: pd.DataFrame = pd.DataFrame(None)
+        self.lag_params: Optional[dict] = None
+        self.n_jobs: int = 1
+        self.executor: Optional[Executor] = None
+        self.cache: Optional[result_cache.ResultCache] = None
+        self.cache_keys: list[str] = None  # type: ignore
+        self.cache_stats: dict[str, int] = None  # type: ignore
+        self.sample_params: Optional[dict] = None
+        self.sample_strata: Optional[sampling.Strata] = None
+        self.bitmap_index: Optional[bitmap_index.BitmapIndex] = None
+
+    def _log(self, message: str):
+        """Print the progress of HSA, unless it runs quietly."""
+        if self.verbose:
+            print(message)
 
     def _prep_class(self):
         """Extract any groups & the dataframe from the init"""
+        if polars_backend.is_polars_frame(self.data_input):
+            if self.backend == "polars":
+                # Only the columns of the data are kept, to validate the inputs against
+                self.data_prep = pd.DataFrame(columns=polars_backend.get_columns(self.data_input))
+            else:
+                self.data_prep = polars_backend.to_pandas(self.data_input)
+            return
+
+        if duckdb_backend.is_parquet_path(self.data_input):
+            if self.backend != "duckdb":
+                raise ValueError("The path of a Parquet file is only supported by the duckdb backend, see: 'backend'.")
+            # Only the columns of the data are kept, to validate the inputs against
+            self.data_prep = pd.DataFrame(columns=duckdb_backend.get_columns(self.data_input))
+            return
+
         self.data_prep = grouped_df.return_data(self.data_input)
 
         if grouped_df.is_grouped(self.data_input):
@@ -107,42 +237,102 @@ class HotSpotAnalyzer:
         if self.data_prep.empty:
             self._prep_class()
 
-        combinations = combos.create_combos(
-            target_cols=self.target_cols,
-            interaction_max=self.interaction_limit,
-        )
+        with self.profiler.phase("build_combos") as event:
+            combinations = combos.create_combos(
+                target_cols=self.target_cols,
+                interaction_max=self.interaction_limit,
+            )
 
-        combinations = [["Overall"]] + combinations
+            combinations = [["Overall"]] + combinations
 
-        if self.grouped_by is not None:
-            # If the input data is grouped we add the groups!
-            combinations = grouped_df.add_groups_to_combos(
-                group_vars=self.grouped_by,
-                combos=combinations,
-            )
+            if self.grouped_by is not None:
+                # If the input data is grouped we add the groups!
+                combinations = grouped_df.add_groups_to_combos(
+                    group_vars=self.grouped_by,
+                    combos=combinations,
+                )
 
-        if self.time_period:
-            combinations = grouped_df.add_groups_to_combos(
-                group_vars=self.time_period,
-                combos=combinations,
-            )
+            if self.time_period:
+                combinations = grouped_df.add_groups_to_combos(
+                    group_vars=self.time_period,
+                    combos=combinations,
+                )
 
-        self.combinations = combinations
+            self.combinations = combinations
+            event.rows_out = len(combinations)
 
-        print(
+        self._log(
             f"Combinations have been generated. There are {len(combinations)} across the target variables: {','.join(self.target_cols)}"
         )
 
+    @property
+    def data_prep(self) -> pd.DataFrame:
+        """The data the analysis reads, including the data appended since (see append)."""
+        self._merge_appended()
+        return self._data_prep
+
+    @data_prep.setter
+    def data_prep(self, data_prep: pd.DataFrame):
+        self._appended = []
+        self._data_prep = data_prep
+
+    @property
+    def data_codes(self) -> dict[str, encoding.EncodedColumn]:
+        """The encoded grouping columns of data_prep."""
+        self._merge_appended()
+        return self._data_codes
+
+    @data_codes.setter
+    def data_codes(self, data_codes: dict[str, encoding.EncodedColumn]):
+        self._appended = []
+        self._data_codes = data_codes
+
+    def _merge_appended(self):
+        """Concatenate the chunks appended since the data was last read, & merge their codes, all at once."""
+        if not self._appended:
+            return
+        appended, self._appended = self._appended, []
+        self._data_prep = pd.concat([self._data_prep] + [data for data, _ in appended], ignore_index=True)
+        self._data_codes = {
+            col: incremental.merge_encoded([encoded_col] + [codes[col] for _, codes in appended])
+            for col, encoded_col in self._data_codes.items()
+        }
+
+    def _project_data(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Select the columns the analysis reads, without copying them.
+
+        Metric specs only read the grouping & metric columns, an objective function may read any column.
+        """
+        if not metrics.is_metric_specs(self.objective_function):
+            return data
+
+        self.objective_function = metrics.validate_metrics(self.objective_function)
+        metric_cols = [column for column, _ in metrics.statistics(self.objective_function)]
+        used_cols = set(self.time_period + (self.grouped_by or []) + self.target_cols + metric_cols)
+        return grouped_df.project_columns(data, [col for col in data.columns if col in used_cols])
+
     def _build_data(self):
-        """Prepare the data for analysis by validating inputs and adding necessary columns."""
+        """Prepare the data for analysis by validating inputs and encoding the grouping columns.
+
+        The input data is never modified or copied: data_prep is a read-only projection of its columns,
+        and 'Overall' is a virtual column that only exists in data_codes. Peak memory is the input data,
+        the integer codes of the grouping columns (1-2 bytes per row & column for most columns) and the
+        output of the combinations.
+        """
         if self.data_prep.empty:
             self._prep_class()
 
-        self._validate_input("target_cols")
-        self._validate_input("time_period")
+        with self.profiler.phase("build_data", rows_in=len(self.data_prep)) as event:
+            self._validate_input("target_cols")
+            self._validate_input("time_period")
+
+            self.data_prep = self._project_data(self.data_prep)
 
-        self.data_prep["Overall"] = "Overall"
-        print("Data passed checks, and is ready for analysis.")
+            # Factorize the grouping columns once, every combination is then grouped by these codes
+            grouping_cols = self.time_period + (self.grouped_by or []) + ["Overall"] + self.target_cols
+            self.data_codes = encoding.encode_columns(self.data_prep, lists.unique(grouping_cols))
+            event.rows_out = len(self.data_prep)
+        self._log("Data passed checks, and is ready for analysis.")
 
     def test_objective_function(
         self,
@@ -167,14 +357,21 @@ class HotSpotAnalyzer:
             self._build_data()
 
         if verbose:
-            print(
+            self._log(
                 f"Using random sample of {row_limit} rows. Note that rows will be recycled to meet row_limit if data has insufficient rows."
             )
 
-        test_df = self.data_prep.sample(row_limit, replace=True)
+        test_df = self.data_prep.sample(row_limit, replace=len(self.data_prep) < row_limit)
+
+        if metrics.is_metric_specs(self.objective_function):
+            self.objective_function = metrics.validate_metrics(self.objective_function)
 
         try:
-            output = self.objective_function(test_df.groupby("Overall"))
+            if metrics.is_metric_specs(self.objective_function):
+                output = rollup.rollup_combos(test_df, [["Overall"]], self.objective_function)[0]
+            else:
+                overall_key = encoding.constant_column("Overall", len(test_df)).to_categorical("Overall", test_df.index)
+                output = self.objective_function(test_df.groupby(overall_key, observed=True))
         except:
             raise ValueError(
                 "The function supplied to 'objective_function' is not compatible\n\nThe function must be able to run on a grouped data frame."
@@ -191,132 +388,569 @@ class HotSpotAnalyzer:
         if not self.obj_func_tested:
             self.test_objective_function(verbose=False)
 
+    def _run_obj_func_on_combo(
+        self,
+        step_i: int,
+        combo: list[str],
+        data_keys: dict[str, pd.Series],
+        rows: Optional[np.ndarray] = None,
+    ) -> pd.DataFrame:
+        """Group the data (or a subset of its rows) by a single combination, and run the objective function on it."""
+        self._log(f"\tstep: {step_i} group by {combo}")
+        return grouped_df.run_objective_function(
+            self.data_prep,
+            data_keys,
+            combo,
+            self.objective_function,
+            rows=rows,
+            profiler=self.profiler,
+        )
+
     def _run_obj_func_iterations(self):
         """Run the objective function across all combinations of the data."""
         self._prep_analysis()
 
         if self.hsa_raw_output_dicts is not None:
-            print("The objective function has already been run.")
+            self._log("The objective function has already been run.")
+
+        self._log("\n")
+        combination_dfs = {}
+        if self.cache is not None:
+            combination_dfs = self._read_cached_combos()
+        combo_ids = [combo_i for combo_i in range(len(self.combinations)) if combo_i not in combination_dfs]
+
+        computed_dfs = {}
+        if self.min_support > 0 and not metrics.is_metric_specs(self.objective_function):
+            # Each level only groups the rows whose parent groups (one target column less) have the support
+            key_cols = self.time_period + (self.grouped_by or [])
+            combo_ids_to_run = set(combo_ids)
+            level_masks = support.iter_level_masks(self.data_codes, self.combinations, key_cols, self.min_support)
+            for level_combo_ids, masks in level_masks:
+                level_runs = [
+                    (combo_i, mask)
+                    for combo_i, mask in zip(level_combo_ids, masks)
+                    if combo_i in combo_ids_to_run and mask.any()
+                ]
+                level_dfs = self._run_combos(
+                    [self.combinations[combo_i] for combo_i, _ in level_runs],
+                    [mask for _, mask in level_runs],
+                )
+                computed_dfs.update(zip([combo_i for combo_i, _ in level_runs], level_dfs))
+        elif combo_ids:
+            computed_dfs = dict(zip(combo_ids, self._run_combos([self.combinations[combo_i] for combo_i in combo_ids])))
+
+        if self.min_support > 0:
+            computed_dfs = {
+                combo_i: df[df["n_rows"] >= self.min_support].reset_index(drop=True)
+                for combo_i, df in computed_dfs.items()
+            }
+        if self.cache is not None:
+            self._write_cached_combos(list(computed_dfs), list(computed_dfs.values()))
+        combination_dfs.update(computed_dfs)
+
+        # The combinations whose parent cuts were all pruned are skipped, & have no groups
+        skipped_combo_ids = [combo_i for combo_i in range(len(self.combinations)) if combo_i not in combination_dfs]
+        if skipped_combo_ids:
+            self._log(f"\tmin_support: skipped {len(skipped_combo_ids)} combinations, as their parent cuts were pruned")
+            template_i, template_df = next(iter(combination_dfs.items()))
+            for combo_i in skipped_combo_ids:
+                combination_dfs[combo_i] = support.empty_output(
+                    self.combinations[combo_i],
+                    self.data_codes,
+                    template_df,
+                    self.combinations[template_i],
+                )
+
+        self._build_raw_output_dicts([combination_dfs[combo_i] for combo_i in range(len(self.combinations))])
+
+    def _run_backend_iterations(self):
+        """Run every combination on the polars or duckdb backend, see: polars_backend & duckdb_backend.run_combos."""
+        if not metrics.is_metric_specs(self.objective_function):
+            raise ValueError(
+                f"The {self.backend} backend requires metric specs as the 'objective_function', see: utils/metrics.py"
+            )
+        self.objective_function = metrics.validate_metrics(self.objective_function)
+        sketch_stats = [stat for _, stat in metrics.statistics(self.objective_function) if stat in metrics.SKETCH_SIZES]
+        if sketch_stats:
+            raise ValueError(
+                f"The {self.backend} backend doesn't support the Distinct & Quantile sketch metrics, "
+                "use the default pandas backend"
+            )
 
-        combination_outputs = []
-        print("\n")
-        for step_i, combo in enumerate(self.combinations):
-            print(f"\tstep: {step_i} group by {combo}")
-            df_grp_by_combo = self.data_prep.groupby(combo, observed=True)
-            df_combo_output = self.objective_function(df_grp_by_combo)
+        self._prep_class()
+        self._validate_input("target_cols")
+        self._validate_input("time_period")
+        self._build_combos()
 
-            df_grp_nrows = df_grp_by_combo.size().reset_index(name="n_rows")  # type: ignore
+        if self.backend == "polars":
+            data = self.data_input if polars_backend.is_polars_frame(self.data_input) else self.data_prep
+            self._log("\n\tRunning every combination as a lazy Polars query, sharing a single scan of the data")
+            run_combos = polars_backend.run_combos
+        else:
+            data = self.data_input
+            if not duckdb_backend.is_parquet_path(data):
+                data = self._project_data(self.data_prep)
+            self._log("\n\tRunning every combination as a single DuckDB GROUPING SETS query")
+            run_combos = duckdb_backend.run_combos
 
-            combination_output_df = df_grp_nrows.merge(df_combo_output, on=combo)
+        with self.profiler.phase(self.backend) as event:
+            combination_dfs, self.data_codes = run_combos(data, self.combinations, self.objective_function)
+            event.rows_out = event.n_groups = sum(len(df) for df in combination_dfs)
 
-            if "Overall" in combo:
-                interaction_count = len(combo) - 1
-            else:
-                interaction_count = len(combo)
+        if self.min_support > 0:
+            combination_dfs = [df[df["n_rows"] >= self.min_support].reset_index(drop=True) for df in combination_dfs]
+        self._build_raw_output_dicts(combination_dfs)
 
-            combination_output = {
-                "combination": combo,
-                "interaction_count": interaction_count,
-                "df": combination_output_df.reset_index(drop=True),
-            }
-            combination_outputs.append(combination_output)
-        print("\n")
+    def _run_sampled_iterations(self):
+        """Run every combination on a stratified sample of the rows, and estimate the output of every row.
+
+        The rows are sampled within each time period & group, & the output of each cut is scaled back
+        up with a confidence interval, see: utils/sampling.py.
+        """
+        self._prep_analysis()
+        key_cols = self.time_period + (self.grouped_by or [])
+        with self.profiler.phase("sample", rows_in=len(self.data_prep)) as event:
+            rows, self.sample_strata = sampling.sample_rows(
+                self.data_codes,
+                key_cols,
+                self.sample_params["sample_fraction"],
+                self.sample_params["random_state"],
+            )
+            event.rows_out = len(rows)
+        self._log(f"\n\tRunning every combination on a sample of {len(rows)} out of {len(self.data_prep)} rows")
+
+        metric_specs = self.objective_function if metrics.is_metric_specs(self.objective_function) else None
+        data_prep, data_codes, objective_function = self.data_prep, self.data_codes, self.objective_function
+        self.data_prep = data_prep.iloc[rows]
+        self.data_codes = sampling.take_rows(data_codes, rows)
+        if metric_specs is not None:
+            # The variance of the estimates needs the moments of the metric columns in each cut
+            self.objective_function = sampling.add_moment_specs(metric_specs)
+        try:
+            sampled_dfs = self._run_combos(self.combinations)
+        finally:
+            self.data_prep, self.data_codes, self.objective_function = data_prep, data_codes, objective_function
+
+        with self.profiler.phase("estimate", rows_in=sum(len(df) for df in sampled_dfs)) as event:
+            combination_dfs = [
+                sampling.estimate(
+                    df,
+                    self.sample_strata,
+                    self.data_codes,
+                    metric_specs,
+                    self.sample_params["confidence"],
+                    self.sample_params["max_relative_error"],
+                )
+                for df in sampled_dfs
+            ]
+            event.rows_out = sum(len(df) for df in combination_dfs)
+
+        if self.min_support > 0:
+            # The support of a cut is its estimated n_rows
+            combination_dfs = [df[df["n_rows"] >= self.min_support].reset_index(drop=True) for df in combination_dfs]
+        self._build_raw_output_dicts(combination_dfs)
+
+    def _check_pandas_backend(self, method: str):
+        """Raise a ValueError if a method that only the pandas backend supports is run on another backend."""
+        if self.backend != "pandas":
+            raise ValueError(f"{method} is only supported by the pandas backend, see: 'backend'.")
+
+    def _run_combos(self, combinations: list[list[str]], row_masks: Optional[list[np.ndarray]] = None) -> list:
+        """Run the objective function on the combinations, optionally on a subset of the rows of each."""
+        if not combinations:
+            return []
+
+        if metrics.is_metric_specs(self.objective_function) and row_masks is not None:
+            # Subsets of the rows can't be rolled up from a shared finest cut, so each is aggregated on its own
+            shifts = rollup.compute_shifts(self.data_prep, self.objective_function)
+            combination_dfs = []
+            for combo, rows in zip(combinations, row_masks):
+                rows_in = len(self.data_prep) if rows is None else int(rows.sum())
+                with self.profiler.phase("aggregate", combo, rows_in=rows_in) as event:
+                    combination_df = rollup.aggregate_combo(
+                        self.data_prep, self.data_codes, combo, self.objective_function, shifts, rows
+                    )
+                    event.rows_out = event.n_groups = len(combination_df)
+                combination_dfs.append(combination_df)
+            return combination_dfs
+
+        if metrics.is_metric_specs(self.objective_function):
+            self._log("\tAggregating the finest cut once, and rolling up each combination from it")
+            with self.profiler.phase("rollup", rows_in=len(self.data_prep)) as event:
+                combination_dfs = rollup.rollup_combos(
+                    self.data_prep,
+                    combinations,
+                    self.objective_function,
+                    encoded=self.data_codes,
+                    schedule=self.rollup_schedule,
+                )
+                event.rows_out = event.n_groups = sum(len(df) for df in combination_dfs)
+            return combination_dfs
+
+        if self.n_jobs != 1 or self.executor is not None:
+            self._log(f"\tRunning {len(combinations)} combinations in parallel")
+            with self.profiler.phase("parallel", rows_in=len(self.data_prep)) as event:
+                combination_dfs = parallel.run_combos(
+                    self.data_prep,
+                    self.data_codes,
+                    combinations,
+                    self.objective_function,
+                    n_jobs=self.n_jobs,
+                    executor=self.executor,
+                    row_masks=row_masks,
+                    profiler=self.profiler,
+                )
+                event.rows_out = event.n_groups = sum(len(df) for df in combination_dfs)
+            return combination_dfs
+
+        # Categorical keys built from the codes, so pandas doesn't re-hash the values for each combination
+        data_keys = {
+            col: encoded_col.to_categorical(col, self.data_prep.index) for col, encoded_col in self.data_codes.items()
+        }
+        if row_masks is None:
+            row_masks = [None] * len(combinations)
+        return [
+            self._run_obj_func_on_combo(step_i, combo, data_keys, rows)
+            for step_i, (combo, rows) in enumerate(zip(combinations, row_masks))
+        ]
+
+    def _cache_keys(self) -> list[str]:
+        """The cache key of each combination, from the hashes of the data & the objective function."""
+        if metrics.is_metric_specs(self.objective_function):
+            # Only the grouping & metric columns can change the output of metric specs
+            metric_cols = [column for column, _ in metrics.statistics(self.objective_function)]
+            hash_cols = lists.unique([col for col in self.data_codes if col != "Overall"] + metric_cols)
+        else:
+            hash_cols = list(self.data_prep.columns)
+
+        data_hash = result_cache.hash_data(self.data_prep, hash_cols)
+        # Pruned runs only hold the groups with the minimum support
+        objective_function_hash = str(result_cache.hash_objective_function(self.objective_function)) + str(
+            self.min_support
+        )
+        return [result_cache.combo_key(data_hash, combo, objective_function_hash) for combo in self.combinations]
+
+    def _read_cached_combos(self) -> dict[int, pd.DataFrame]:
+        """Read back the output of every combination that is in the cache."""
+        self.cache_keys = self._cache_keys()
+        cached_dfs = {}
+        for combo_i, key in enumerate(self.cache_keys):
+            cached_df = self.cache.get(key)
+            if cached_df is not None:
+                cached_dfs[combo_i] = cached_df
+
+        self.cache_stats = {"hits": len(cached_dfs), "misses": len(self.combinations) - len(cached_dfs)}
+        self._log(f"\tCache: {self.cache_stats['hits']} hits, {self.cache_stats['misses']} misses")
+        return cached_dfs
+
+    def _write_cached_combos(self, combo_ids: list[int], combination_dfs: list[pd.DataFrame]):
+        """Write the output of the computed combinations to the cache, and evict the least recently used entries."""
+        for combo_i, combination_df in zip(combo_ids, combination_dfs):
+            self.cache.put(self.cache_keys[combo_i], combination_df)
+        self.cache.evict()
+
+    def _raw_output_dict(self, combo: list[str], combination_output_df: pd.DataFrame) -> dict:
+        """The output of a combination, with its combination & interaction_count."""
+        if "Overall" in combo:
+            interaction_count = len(combo) - 1
+        else:
+            interaction_count = len(combo)
+
+        return {
+            "combination": combo,
+            "interaction_count": interaction_count,
+            "df": combination_output_df.reset_index(drop=True),
+        }
+
+    def _build_raw_output_dicts(self, combination_dfs: list[pd.DataFrame]):
+        """Store the output of each combination, with its combination & interaction_count."""
+        combination_outputs = [
+            self._raw_output_dict(combo, combination_output_df)
+            for combo, combination_output_df in zip(self.combinations, combination_dfs)
+        ]
+        self._log("\n")
         self.hsa_raw_output_dicts = combination_outputs
 
+    def _iter_combination_dfs(self) -> Iterator[tuple[int, pd.DataFrame]]:
+        """Yield the output of each combination in order, computing one combination at a time."""
+        if metrics.is_metric_specs(self.objective_function):
+            self._log("\tAggregating the finest cut once, and rolling up each combination from it")
+            combination_dfs = rollup.iter_rollup_combos(
+                self.data_prep,
+                self.combinations,
+                self.objective_function,
+                encoded=self.data_codes,
+            )
+            for combo_i, combination_df in enumerate(combination_dfs):
+                if self.min_support > 0:
+                    combination_df = combination_df[combination_df["n_rows"] >= self.min_support]
+                yield combo_i, combination_df
+            return
+
+        data_keys = {
+            col: encoded_col.to_categorical(col, self.data_prep.index) for col, encoded_col in self.data_codes.items()
+        }
+        if self.min_support > 0:
+            key_cols = self.time_period + (self.grouped_by or [])
+            levels = support.iter_level_masks(self.data_codes, self.combinations, key_cols, self.min_support)
+        else:
+            levels = iter([(list(range(len(self.combinations))), [None] * len(self.combinations))])
+
+        # The combinations are in the order of their levels, so the levels yield them in order
+        template_i, template_df = None, None
+        for level_combo_ids, masks in levels:
+            for combo_i, rows in zip(level_combo_ids, masks):
+                combo = self.combinations[combo_i]
+                if rows is not None and not rows.any():
+                    combination_df = support.empty_output(
+                        combo, self.data_codes, template_df, self.combinations[template_i]
+                    )
+                else:
+                    combination_df = self._run_obj_func_on_combo(combo_i, combo, data_keys, rows)
+                    if self.min_support > 0:
+                        combination_df = combination_df[combination_df["n_rows"] >= self.min_support]
+                    if template_df is None:
+                        template_i, template_df = combo_i, combination_df
+                yield combo_i, combination_df
+
     def _process_hsa_raw_output_dicts(self):
         """Process the raw output dictionaries to create the final HSA output dataframe."""
         if not self.hsa_output_df.empty:
-            print("The HSA data output already exsists.")
+            self._log("The HSA data output already exsists.")
             return
 
-        if self.hsa_raw_output_dicts is None:
+        if self.hsa_raw_output_dicts is None and self.backend != "pandas":
+            self._run_backend_iterations()
+        elif self.hsa_raw_output_dicts is None and self.sample_params is not None:
+            self._run_sampled_iterations()
+        elif self.hsa_raw_output_dicts is None:
             self._run_obj_func_iterations()
 
-        combo_dfs = []
-        for row_i, _ in enumerate(self.hsa_raw_output_dicts):
-            combo_i_dict = self.hsa_raw_output_dicts[row_i]
+        key_cols = self.time_period + (self.grouped_by or [])
+        n_raw_rows = sum(len(raw_output_dict["df"]) for raw_output_dict in self.hsa_raw_output_dicts)
+        with self.profiler.phase("assembly", rows_in=n_raw_rows) as event:
+            self.hsa_combinations_df = compact.build_combinations_df(self.combinations, key_cols)
+            self.hsa_compact_df = compact.build_compact_df(
+                self.hsa_raw_output_dicts,
+                self.data_codes,
+                key_cols,
+                self.target_cols,
+            )
 
-            combo_i_combination = combo_i_dict["combination"]
-            combo_i_df = combo_i_dict["df"]
-            combo_i_df["interaction_count"] = combo_i_dict["interaction_count"]
+            if self.output_layout == "compact":
+                self.hsa_output_df = self.hsa_compact_df
+            else:
+                self.hsa_output_df = self._materialize_dicts(self.hsa_compact_df)
+            event.rows_out = len(self.hsa_output_df)
+        # The search index is rebuilt by the next search, see: search_hsa_output
+        self.hsa_search_index = None
+
+    def _build_search_index(self):
+        """Build the inverted index of the keys & values of hsa_output_df, which search_hsa_output uses."""
+        self.hsa_search_index = search_index.build_search_index(
+            self.hsa_compact_df,
+            self.hsa_combinations_df,
+            self.time_period + (self.grouped_by or []),
+            self.target_cols,
+        )
 
-            combo_i_df_obj_func_calcs = lists.find_items(
-                combo_i_df.columns,
-                combo_i_combination,
-                return_matching=False,
-            )
+    def _materialize_dicts(self, compact_df: pd.DataFrame) -> pd.DataFrame:
+        """Build the dict layout (combo_dict, grouped_by_dict & time_period_dict) of a compact HSA output."""
+        return compact.materialize_dicts(
+            compact_df,
+            self.hsa_combinations_df,
+            self.target_cols,
+            self.time_period,
+            self.grouped_by or [],
+        )
 
-            #! Create combo_dict directly from row data without temporary columns
-            combo_i_df["combo_dict"] = combo_i_df[combo_i_combination].apply(
-                lambda row: dict(zip(combo_i_combination, row.values.astype(str))),
-                axis=1,
-            )
+    def run_hsa(
+        self,
+        n_jobs: int = 1,
+        executor: Optional[Executor] = None,
+        cache: Optional[Union[str, os.PathLike, result_cache.ResultCache]] = None,
+        sink: Optional[Union[str, os.PathLike, Callable[[pd.DataFrame], None]]] = None,
+        approximate: bool = False,
+        sample_fraction: Optional[float] = None,
+        confidence: float = 0.95,
+        max_relative_error: float = 0.1,
+        random_state: Optional[int] = None,
+    ):
+        """Process all inputs, and then run HotSpotAnalyzer.
+
+        Parameters:
+        -----------
+        n_jobs : int, optional
+            The number of processes to spread the combinations across, -1 uses all CPUs. Defaults to 1.
+            The data is shared with the processes through memory-mapped files, and the objective
+            function must be picklable (ie: defined at the top level of a module).
+        executor : Executor, optional
+            A concurrent.futures executor to run the combinations on instead of a new process pool.
+        cache : str or ResultCache, optional
+            A directory (or result_cache.ResultCache) to cache the output of each combination in. The
+            combinations whose data & objective function haven't changed are read back from the cache
+            instead of being recomputed, see: cache_stats for the hits & misses of the run.
+        sink : str or Callable, optional
+            A Parquet/CSV file, or a function, to write the output of each combination to as soon as it
+            is computed (see: iter_hsa), instead of keeping the output in hsa_output_df. Combinations are
+            run one at a time, so a sink can't be combined with n_jobs, executor or cache.
+        approximate : bool, optional
+            If True, every combination is run on a random sample of the rows (see: sample_fraction), for a
+            quick look at large data. The rows are sampled within each time period & group, n_rows & the
+            Sum, Count & Mean metric specs are estimated for every row with '<name>_lower' & '<name>_upper'
+            confidence intervals, n_sample_rows is the number of sampled rows of the cut, and is_noisy
+            flags the cuts whose intervals are too wide (see: max_relative_error). Other metric specs & the
+            outputs of an objective function are computed on the sample as is. Defaults to False.
+        sample_fraction : float, optional
+            The fraction of the rows to sample, in (0, 1]. Setting it runs an approximate HSA. Defaults to 0.1.
+        confidence : float, optional
+            The confidence level of the intervals of an approximate HSA. Defaults to 0.95.
+        max_relative_error : float, optional
+            The largest half width of an interval, relative to its estimate, of a cut that isn't flagged
+            as noisy. Defaults to 0.1, ie: the estimates of the cut are within 10% at the confidence level.
+        random_state : int, optional
+            The seed of the sample of an approximate HSA. Defaults to a new sample on each run.
+
+        Note: the output is identical to a serial run, whatever the number of processes.
+        """
+        if approximate or sample_fraction is not None:
+            if sample_fraction is None:
+                sample_fraction = sampling.DEFAULT_SAMPLE_FRACTION
+            if not 0 < sample_fraction <= 1:
+                raise ValueError("'sample_fraction' must be in (0, 1].")
+            if not 0 < confidence < 1:
+                raise ValueError("'confidence' must be in (0, 1).")
+            if self.backend != "pandas" or cache is not None or sink is not None:
+                raise ValueError("An approximate HSA runs on the pandas backend, without cache or sink.")
+            self.sample_params = {
+                "sample_fraction": sample_fraction,
+                "confidence": confidence,
+                "max_relative_error": max_relative_error,
+                "random_state": random_state,
+            }
+
+        if self.backend != "pandas" and (n_jobs != 1 or executor is not None or cache is not None or sink is not None):
+            raise ValueError(f"The {self.backend} backend runs without n_jobs, executor, cache or sink.")
 
-            #! Now we dynamically grab hsa cols & reorder
-            hsa_columns = list(
-                # Dynamically grab the HSA columns using sets
-                # NOTE: This preserves the column order
-                set(combo_i_df.columns)
-                - set(combo_i_df_obj_func_calcs)
-                - set(combo_i_combination)
+        if sink is not None:
+            if n_jobs != 1 or executor is not None or cache is not None:
+                raise ValueError("A 'sink' runs the combinations one at a time, without n_jobs, executor or cache.")
+            self._run_hsa_to_sink(sinks.open_sink(sink))
+            return
+
+        self.n_jobs = n_jobs
+        self.executor = executor
+        if cache is not None and result_cache.hash_objective_function(self.objective_function) is None:
+            warnings.warn(
+                "The objective function can't be hashed (ie: it holds objects that can't be pickled), "
+                "so HSA runs without the cache.",
+                stacklevel=2,
             )
-            hsa_columns.sort()
+            cache = None
+        if cache is not None and not isinstance(cache, result_cache.ResultCache):
+            cache = result_cache.ResultCache(cache)
+        self.cache = cache
+        self._process_hsa_raw_output_dicts()
+        self._log("HSA has been run & the output has been processed.")
 
-            column_ordered = hsa_columns + combo_i_df_obj_func_calcs
+    def _run_hsa_to_sink(self, sink: sinks.Sink):
+        """Write the output of each combination to a sink, see: iter_hsa."""
+        n_output_rows = 0
+        try:
+            for combination_df in self.iter_hsa():
+                sink.write(combination_df)
+                n_output_rows += len(combination_df)
+        finally:
+            sink.close()
+        self._log(f"HSA has been run & {n_output_rows} rows of output were written to the sink.")
 
-            combo_i_df_final = combo_i_df[column_ordered]
-            combo_dfs.append(combo_i_df_final)
+    def iter_hsa(self) -> Iterator[pd.DataFrame]:
+        """Yield the output of each combination as soon as it is computed, instead of holding the whole output.
 
-        hsa_df = pd.concat(combo_dfs).reset_index(drop=True)
-        self.hsa_output_df = hsa_df
+        The frames are in the output_layout & the order of hsa_output_df, and their index carries on
+        from one combination to the next, so pd.concat(HSA.iter_hsa()) matches the output of run_hsa().
+        Only the current combination is held in memory (& the finest cut for metric specs), and the
+        combinations are run one at a time.
 
-    def _pop_key_off_combo_dict(self, pop_type=None):
-        """Pop a key off the combination dictionary.
+        Returns:
+        --------
+        Iterator[pd.DataFrame]
+            The output of each combination, see: hsa_combinations_df for the combo_id of the compact layout.
+        """
+        self._check_pandas_backend("iter_hsa")
+        self._prep_analysis()
+        key_cols = self.time_period + (self.grouped_by or [])
+        self.hsa_combinations_df = compact.build_combinations_df(self.combinations, key_cols)
+
+        n_output_rows = 0
+        for combo_i, combination_df in self._iter_combination_dfs():
+            compact_df = compact.build_compact_df(
+                [self._raw_output_dict(self.combinations[combo_i], combination_df)],
+                self.data_codes,
+                key_cols,
+                self.target_cols,
+            )
+            compact_df["combo_id"] = combo_i
+            compact_df.index = pd.RangeIndex(n_output_rows, n_output_rows + len(compact_df))
+            n_output_rows += len(compact_df)
+
+            if self.output_layout == "compact":
+                yield compact_df
+            else:
+                yield self._materialize_dicts(compact_df)
+
+    def run_hsa_streaming(self, source: streaming.ChunkSource, chunksize: Optional[int] = None):
+        """Run HotSpotAnalyzer over data that doesn't fit in memory, one chunk at a time.
+
+        Each chunk is aggregated into the sufficient statistics of its finest cut, which are merged
+        as the chunks arrive, so memory is bounded by the number of groups rather than the number of
+        rows. The output is the same as running HSA on all the data at once.
 
         Parameters:
         -----------
-        pop_type : str, optional
-            The type of key to pop, either 'grouped_by' or 'time_period'.
+        source : DataFrame, path, or iterable of DataFrames & paths
+            The chunks of data, ie: an iterator of DataFrames or a list of CSV/Parquet files.
+        chunksize : int, optional
+            The number of rows per chunk when reading files. Defaults to reading whole files.
 
         Raises:
         -------
         ValueError
-            If the pop_type is not 'grouped_by' or 'time_period'.
+            If the objective_function isn't a dict of decomposable metric specs, or there is no data.
         """
+        self._check_pandas_backend("run_hsa_streaming")
+        if not metrics.is_metric_specs(self.objective_function):
+            raise ValueError(
+                "Streaming requires decomposable metric specs as the 'objective_function', see: utils/metrics.py"
+            )
+        self.objective_function = metrics.validate_metrics(self.objective_function)
+        self._build_combos()
 
-        if pop_type == "grouped_by":
-            if self.grouped_by is None:
-                return
-            pop_key = self.grouped_by
-            pop_dict = "grouped_by_dict"
-        elif pop_type == "time_period":
-            if not self.time_period:
-                return
-            pop_key = self.time_period
-            pop_dict = "time_period_dict"
-        else:
-            raise ValueError("Invalid pop_type. Must be either: 'grouped_by' or 'time_period'")
-
-        self.hsa_output_df[pop_dict] = [
-            general.pop_keys(combo_dict, pop_key)
-            for combo_dict in self.hsa_output_df["combo_dict"]
-        ]
-
-        # Reorder columns to have time_period then all others
-        all_columns_with_dupes = [pop_dict] + list(self.hsa_output_df.columns)
-        all_columns_ordered = lists.unique(all_columns_with_dupes)
-        self.hsa_output_df = self.hsa_output_df[all_columns_ordered]
-
-    def run_hsa(self):
-        """Process all inputs, and then run HotSpotAnalyzer."""
+        self._log("\n\tAggregating each chunk, and rolling up each combination from the merged chunks")
+        combination_dfs, self.data_codes = streaming.rollup_chunks(
+            self._validate_chunks(streaming.iter_chunks(source, chunksize)),
+            self.combinations,
+            self.objective_function,
+            schedule=self.rollup_schedule,
+        )
+        self._build_raw_output_dicts(combination_dfs)
         self._process_hsa_raw_output_dicts()
-        self._pop_key_off_combo_dict(pop_type="grouped_by")
-        self._pop_key_off_combo_dict(pop_type="time_period")
-        print("HSA has been run & the output has been processed.")
+        self._log("HSA has been run & the output has been processed.")
+
+    def _validate_chunks(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Check the columns of the first chunk, and pass on every chunk."""
+        for chunk_i, chunk in enumerate(chunks):
+            if chunk_i == 0:
+                # Only the columns of the data are kept, to validate the inputs against
+                self.data_prep = chunk.iloc[:0]
+                self._validate_input("target_cols")
+                self._validate_input("time_period")
+            yield chunk
 
     def lag_hsa_by_time_period(
         self,
         lag_iterations: Union[int, list[int]] = [1],
+        lag_by: str = "rows",
     ) -> pd.DataFrame:
         """Lag the HSA output by the specified time period to see time trends.
 
@@ -324,58 +958,158 @@ class HotSpotAnalyzer:
         -----------
         lag_iterations : Union[int, list[int]], optional
             The number of lag iterations to apply. Defaults to [1].
+        lag_by : str, optional
+            Either 'rows' to lag each series by its previous rows, or 'time_period' to lag it by the
+            previous time periods, so a period missing from a series gives a missing lag rather than
+            the period before it. The time periods are the values observed in the data, so a period
+            absent from the whole data (ie: a date without any row) isn't a gap. Defaults to 'rows'.
 
         Returns:
         --------
         pd.DataFrame
-            The lagged HSA output dataframe.
+            The lagged HSA output dataframe, with a '{column}_lag{i}' column per lag for the time_period,
+            n_rows & the metrics.
 
         Raises:
         -------
         TypeError
             If the data provided to HSA was not grouped.
+        ValueError
+            If lag_by is invalid.
         """
 
-        # NOTE: This lag operations requires hashable, so we convert list(dict) --> JSON, compute the lags & merge, JSON -->  dict(list)
-
         if not self.time_period:
-            return TypeError("Data provided to HSA was not grouped.")
+            raise TypeError("Data provided to HSA was not grouped.")
+        if self.hsa_output_df.empty:
+            raise UserWarning("You must first run: run_hsa()")
         if isinstance(lag_iterations, int):
             lag_iterations = [lag_iterations]
 
-        df = self.hsa_output_df.copy()
-
         lag_across = ", ".join(self.time_period)
-        print(f"Attempting to lag data across: {lag_across}")
-
-        dict_columns = ["combo_dict"]
-        if self.grouped_by is not None:
-            dict_columns = ["grouped_by_dict"] + dict_columns
-        for dict_column in dict_columns:
-            df[dict_column] = general.dict_to_json(df[dict_column])  # type: ignore
-
-        # Loop through the lags & merge them back into df.
-        df_baseline = df.copy()  # copy() is required to keep the objects separate
-        for lag_i in lag_iterations:
-            print(f"Running lag: {lag_i}")
-            df_lag_i = df_baseline.groupby(["combo_dict", "interaction_count"]).shift(lag_i)
-
-            df = df.merge(
-                df_lag_i,
-                how="left",
-                left_index=True,
-                right_index=True,
-                suffixes=("", f"_lag{lag_i}"),
-            )
+        self._log(f"Attempting to lag data across: {lag_across}")
+
+        # Each series is a combination & the values of its cut, other than the time_period
+        series_cols = (self.grouped_by or []) + self.target_cols
+        series_ids = lag.dense_ids(
+            [self.hsa_compact_df["combo_id"].to_numpy()]
+            + [self.hsa_compact_df[col].cat.codes.to_numpy() for col in series_cols]
+        )
+        period_ids = lag.period_positions(
+            [self.hsa_compact_df[col].cat.codes.to_numpy() for col in self.time_period],
+            [len(self.hsa_compact_df[col].cat.categories) for col in self.time_period],
+        )
+        sources = lag.lag_sources(series_ids, period_ids, lag_iterations, lag_by)
+
+        df = self.hsa_output_df
+        if self.output_layout == "compact":
+            key_cols = ["combo_id", "interaction_count"] + series_cols
+        else:
+            key_cols = ["grouped_by_dict", "combo_dict", "interaction_count"]
+        lag_cols = [col for col in df.columns if col not in key_cols]
+
+        self._log(f"Running lags: {', '.join(map(str, lag_iterations))}")
+        with self.profiler.phase("lag", rows_in=len(df)) as event:
+            # The lagged output is kept, so append() can extend it
+            self.hsa_lagged_df = lag.lag_columns(df, lag_cols, lag_iterations, sources)
+            event.rows_out = len(self.hsa_lagged_df)
+        self.lag_params = {"lag_iterations": lag_iterations, "lag_by": lag_by}
+        return self.hsa_lagged_df
+
+    def append(self, new_data: pd.DataFrame):
+        """Append the HSA output of new time periods, by only running HSA on the new data.
+
+        Every combination includes the time_period, so the cuts of the new time periods don't change
+        the existing cuts. The new cuts are merged into hsa_output_df in order, and the last lagged
+        output (see lag_hsa_by_time_period) is recomputed.
+
+        Parameters:
+        -----------
+        new_data : pd.DataFrame
+            The data of the new time periods, grouped like the data HSA was run on.
+
+        Raises:
+        -------
+        UserWarning
+            If HSA has not been run yet.
+        ValueError
+            If there is no time_period, the new data has other columns, dtypes or combinations than the
+            data HSA was run on, or holds time periods that already have an output.
+        """
+        self._check_pandas_backend("append")
+        if self.hsa_output_df.empty:
+            raise UserWarning("You must first run: run_hsa()")
+        if not self.time_period:
+            raise ValueError("append() requires a 'time_period', new data can only add new time periods.")
+
+        HSA_new = HotSpotAnalyzer(
+            data=new_data,
+            target_cols=self.target_cols,
+            time_period=self.time_period,
+            interaction_limit=self.interaction_limit,
+            objective_function=self.objective_function,
+            output_layout="compact",
+            min_support=self.min_support,
+            verbose=self.verbose,
+        )
+        # The events of the new data are recorded with the events of this analyzer
+        HSA_new.profiler = self.profiler
+        HSA_new._prep_class()
+        # The appended chunks share the schema of the data, which isn't concatenated to check it
+        incremental.check_schema(self._data_prep, self._project_data(HSA_new.data_prep))
+        HSA_new._build_combos()
+        if HSA_new.combinations != self.combinations:
+            raise ValueError("The new data must be grouped like the data HSA was run on, as its combinations differ.")
+        incremental.check_new_periods(self.hsa_compact_df[self.time_period], HSA_new.data_prep[self.time_period])
+
+        HSA_new.obj_func_tested = self.obj_func_tested
+        HSA_new.n_jobs = self.n_jobs
+        HSA_new.executor = self.executor
+        # The new time periods are new strata, so they are sampled on their own
+        HSA_new.sample_params = self.sample_params
+        HSA_new._process_hsa_raw_output_dicts()
+
+        # Only the labels are merged, the codes of the chunks are merged once the whole data is read again
+        key_cols = self.time_period + (self.grouped_by or []) + self.target_cols
+        chunk_codes = [self._data_codes] + [codes for _, codes in self._appended] + [HSA_new.data_codes]
+        labels = {col: incremental.merge_labels([codes[col].labels for codes in chunk_codes]) for col in key_cols}
+        hsa_compact_df, order = incremental.append_compact(
+            self.hsa_compact_df,
+            HSA_new.hsa_compact_df,
+            labels,
+            key_cols,
+        )
 
-        for dict_column in dict_columns:
-            df[dict_column] = general.json_to_dict(df[dict_column])  # type: ignore
+        if self.output_layout == "compact":
+            self.hsa_output_df = hsa_compact_df
+        else:
+            # Only the dicts of the new cuts are materialized
+            new_output_df = self._materialize_dicts(HSA_new.hsa_compact_df)
+            hsa_output_df = pd.concat([self.hsa_output_df, new_output_df], ignore_index=True)
+            self.hsa_output_df = hsa_output_df.iloc[order].reset_index(drop=True)
+
+        self.hsa_raw_output_dicts = [
+            {**combo_i_dict, "df": pd.concat([combo_i_dict["df"], new_combo_i_dict["df"]], ignore_index=True)}
+            for combo_i_dict, new_combo_i_dict in zip(self.hsa_raw_output_dicts, HSA_new.hsa_raw_output_dicts)
+        ]
+        self._appended.append((HSA_new.data_prep, HSA_new.data_codes))
+        self.hsa_compact_df = hsa_compact_df
+        self.hsa_search_index = None
+        # The codes of the appended data may differ, the bitmap index is rebuilt by the next query
+        self.bitmap_index = None
 
-        return df
+        if self.lag_params is not None:
+            self.lag_hsa_by_time_period(**self.lag_params)
+        self._log("The new time periods have been appended to the HSA output.")
 
-    def export_hsa_output_df(self) -> pd.DataFrame:
+    def export_hsa_output_df(self, as_dicts: Optional[bool] = None) -> pd.DataFrame:
         """Export the HSA output dataframe.
 
+        Parameters:
+        -----------
+        as_dicts : bool, optional
+            True for the dict layout (combo_dict, grouped_by_dict & time_period_dict), False for the
+            compact layout. Defaults to the output_layout of HotSpotAnalyzer.
+
         Returns:
         --------
         pd.DataFrame
@@ -388,7 +1122,37 @@ class HotSpotAnalyzer:
         """
         if self.hsa_output_df.empty:
             raise ValueError("hsa_output_df is not defined. Try: running run_hsa() then use this command.")
-        return self.hsa_output_df
+        if as_dicts is None:
+            return self.hsa_output_df
+        if as_dicts:
+            if self.output_layout == "dicts":
+                return self.hsa_output_df
+            return self._materialize_dicts(self.hsa_compact_df)
+        return self.hsa_compact_df
+
+    def profile(self, by_phase: bool = True) -> pd.DataFrame:
+        """Return the timing & memory of each phase HSA has run, see: profiling.Event.
+
+        The phases are build_data, build_combos, the groupby, objective & merge of each combination
+        (or aggregate & rollup for metric specs), assembly and lag. A dict of objective functions also
+        times each function as an 'objective:<name>' phase. Combinations run in parallel are timed in
+        the workers, which send their events back (with the peak RSS delta of the worker), within a
+        'parallel' phase. The combinations read back from the cache don't run, so they have no events.
+
+        Parameters:
+        -----------
+        by_phase : bool, optional
+            True for a summary with one row per phase, False for one row per event. Defaults to True.
+
+        Returns:
+        --------
+        pd.DataFrame
+            The wall time (in seconds), rows in & out, number of groups and peak RSS delta (in bytes)
+            of the phases, in the order they ran.
+        """
+        if by_phase:
+            return self.profiler.summary()
+        return self.profiler.to_frame()
 
     def search_hsa_output(
         self,
@@ -398,6 +1162,7 @@ class HotSpotAnalyzer:
         search_type: str = "any",
         interactions: Union[int, list[int]] = [0],  # default defined below
         n_row_minimum: int = 0,
+        exclude_noisy: bool = False,
     ) -> pd.DataFrame:
         """Search across the HSA output dataframe for specific keys(columns) or values.
 
@@ -415,6 +1180,8 @@ class HotSpotAnalyzer:
             The interaction levels to consider during the search. Defaults to [0].
         n_row_minimum : int, optional
             The minimum number of rows to include in the search. Defaults to 0.
+        exclude_noisy : bool, optional
+            If True, the cuts an approximate HSA flagged as noisy (see: run_hsa) are left out. Defaults to False.
 
         Returns:
         --------
@@ -429,10 +1196,14 @@ class HotSpotAnalyzer:
             If the search parameters are invalid or no results are found.
         """
 
+        # Searches of hsa_output_df use its index, other dataframes are scanned row by row
+        use_search_index = hsa_df.empty
         if hsa_df.empty:
             if self.hsa_output_df.empty:
                 raise UserWarning("You must first run: run_hsa()")
-            hsa_df = self.hsa_output_df.copy()
+            hsa_df = self.hsa_output_df
+            if self.hsa_search_index is None:
+                self._build_search_index()
 
         if isinstance(interactions, int):
             interactions = [interactions]
@@ -440,18 +1211,6 @@ class HotSpotAnalyzer:
             # default to all possible interactions
             interactions = list(np.arange(self.interaction_limit) + 1)
 
-        df = hsa_df[(hsa_df["interaction_count"].isin(interactions)) & (hsa_df["n_rows"] >= n_row_minimum)].copy()
-        df.reset_index(inplace=True, drop=True)
-
-        has_grouped_by_dict = "grouped_by_dict" in df.columns
-        has_time_period_dict = "time_period_dict" in df.columns
-
-        df["hsa_dict"] = df["combo_dict"]
-        if has_grouped_by_dict:
-            df["hsa_dict"] = lists.zip_lists_of_dicts(df["grouped_by_dict"], df["hsa_dict"])
-        if has_time_period_dict:
-            df["hsa_dict"] = lists.zip_lists_of_dicts(df["time_period_dict"], df["hsa_dict"])
-
         if isinstance(search_terms, str):
             search_terms = [search_terms]
         search_terms = sorted(search_terms)
@@ -463,29 +1222,66 @@ class HotSpotAnalyzer:
         #! END
 
         if search_across in ["key", "value"]:
-            print("Update search_across to 'keys' or 'values'")
+            self._log("Update search_across to 'keys' or 'values'")
             search_across = search_across + "s"
-
-        if search_across == "keys":
-            search_vector = [list(x.keys()) for x in df["hsa_dict"]]
-        elif search_across == "values":
-            search_vector = [list(x.values()) for x in df["hsa_dict"]]
-        else:
+        if search_across not in ["keys", "values"]:
             raise ValueError("search_across must be either: 'keys' or 'values'")
 
-        if search_type == "all":
-            search_results_bool = [search_terms == sorted(x) for x in search_vector]
+        is_compact = "combo_id" in hsa_df.columns
+        has_grouped_by_dict = "grouped_by_dict" in hsa_df.columns
+        has_time_period_dict = "time_period_dict" in hsa_df.columns
+
+        filter_bool = (hsa_df["interaction_count"].isin(interactions) & (hsa_df["n_rows"] >= n_row_minimum)).to_numpy()
+        if exclude_noisy:
+            if "is_noisy" not in hsa_df.columns:
+                raise ValueError("'exclude_noisy' requires an approximate HSA, see: run_hsa(approximate=True).")
+            filter_bool = filter_bool & ~hsa_df["is_noisy"].to_numpy(dtype=bool)
+
+        if use_search_index:
+            # The index answers the search for every row, & the results keep their position among the filtered rows
+            search_results_bool = filter_bool & self.hsa_search_index.search(search_terms, search_across, search_type)
+            search_results = hsa_df[search_results_bool]
+            search_results.index = np.cumsum(filter_bool)[search_results_bool] - 1
         else:
-            search_results_bool = [
-                any(lists.find_items(search_terms, x, return_bools=True))
-                for x in search_vector
-            ]
-
-        search_results = df[search_results_bool]
+            df = hsa_df[filter_bool].copy()
+            df.reset_index(inplace=True, drop=True)
+
+            if is_compact:
+                # The compact layout is searched column-wise, see: compact.search_mask
+                search_results_bool = compact.search_mask(
+                    df,
+                    self.hsa_combinations_df,
+                    self.time_period + (self.grouped_by or []),
+                    self.target_cols,
+                    search_terms,
+                    search_across,
+                    search_type,
+                )
+            else:
+                df["hsa_dict"] = df["combo_dict"]
+                if has_grouped_by_dict:
+                    df["hsa_dict"] = lists.zip_lists_of_dicts(df["grouped_by_dict"], df["hsa_dict"])
+                if has_time_period_dict:
+                    df["hsa_dict"] = lists.zip_lists_of_dicts(df["time_period_dict"], df["hsa_dict"])
+
+                if search_across == "keys":
+                    search_vector = [list(x.keys()) for x in df["hsa_dict"]]
+                else:
+                    search_vector = [list(x.values()) for x in df["hsa_dict"]]
+
+                if search_type == "all":
+                    search_results_bool = [search_terms == sorted(x) for x in search_vector]
+                else:
+                    search_results_bool = [
+                        any(lists.find_items(search_terms, x, return_bools=True))
+                        for x in search_vector
+                    ]
+
+            search_results = df[search_results_bool]
 
         # If we have valid results return them else
         if len(search_results) > 0:
-            return search_results.drop(columns="hsa_dict")
+            return search_results.drop(columns="hsa_dict", errors="ignore")
         else:
             if has_time_period_dict:
                 extra_msg_search_across = " & time_period_dict"
@@ -512,3 +1308,226 @@ class HotSpotAnalyzer:
                 + f"n_row_minimum: {n_row_minimum}"
             )
             raise ValueError(search_failed_helper)
+
+    def find_top_hotspots(
+        self,
+        score: lattice.Score,
+        k: int = 50,
+        max_depth: Optional[int] = None,
+        beam_width: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Find the k cuts with the highest score, by searching the combinations best-first instead of running them all.
+
+        Each depth (ie: number of target columns) only computes the children of the best cuts of the
+        previous depth, on the rows of those cuts. When the score can't grow from a cut to its children
+        ('n_rows', or the name of a Count metric or a Sum metric of non-negative values), only the cuts
+        that can still beat the k-th best score are expanded, and the result matches sorting a full run.
+        Other scores keep the beam_width best cuts of each depth, which is a heuristic search.
+
+        Parameters:
+        -----------
+        score : Union[str, Callable]
+            The column of the output to rank the cuts by (ie: 'n_rows' or a metric), or a function of
+            the output of a combination returning a score per cut, ie: lambda df: (df["avg_tips"] - 3).abs().
+            Higher scores are better, missing scores are never returned.
+        k : int, optional
+            The number of cuts to return. Defaults to 50.
+        max_depth : int, optional
+            The maximum number of target columns of a cut. Defaults to the interaction_limit.
+        beam_width : int, optional
+            The number of cuts of each depth whose children are computed, for scores that can grow. Defaults to k.
+
+        Returns:
+        --------
+        pd.DataFrame
+            The best cuts in the output_layout with a 'score' column, best first. The compact layout has
+            the 'combination' of each cut instead of its combo_id, as only some combinations are run.
+
+        Raises:
+        -------
+        ValueError
+            If k, max_depth or beam_width are not positive, the score isn't a column of the output,
+            or none of the cuts have a score.
+        """
+        self._check_pandas_backend("find_top_hotspots")
+        max_depth = self.interaction_limit if max_depth is None else max_depth
+        beam_width = k if beam_width is None else beam_width
+        for name, value in [("k", k), ("max_depth", max_depth), ("beam_width", beam_width)]:
+            if value < 1:
+                raise ValueError(f"'{name}' must be a positive integer.")
+
+        if self.data_codes is None:
+            self._build_data()
+        if not self.obj_func_tested:
+            self.test_objective_function(verbose=False)
+
+        key_cols = self.time_period + (self.grouped_by or [])
+        is_exact = lattice.is_antimonotone(score, self.objective_function, self.data_prep)
+
+        combinations: list[list[str]] = []
+        combination_dfs: list[pd.DataFrame] = []
+        combination_scores: list[np.ndarray] = []
+
+        level_targets = [(col,) for col in self.target_cols]
+        level_masks: list[Optional[np.ndarray]] = [None] * len(level_targets)
+        for depth in range(1, max_depth + 1):
+            level_combos = [key_cols + list(targets) for targets in level_targets]
+            level_dfs = self._run_combos(level_combos, level_masks)
+            level_scores = []
+            for df in level_dfs:
+                df_scores = lattice.score_cuts(df, score)
+                if self.min_support > 0:
+                    df_scores[df["n_rows"].to_numpy() < self.min_support] = -np.inf
+                level_scores.append(df_scores)
+
+            combinations += level_combos
+            combination_dfs += level_dfs
+            combination_scores += level_scores
+            if depth == max_depth:
+                break
+
+            # Expand the cuts that can still lead to a top hot spot
+            if is_exact:
+                threshold = lattice.kth_best(combination_scores, k)
+                level_expanded = [
+                    np.flatnonzero(np.isfinite(df_scores) & (threshold is None or df_scores > threshold))
+                    for df_scores in level_scores
+                ]
+            else:
+                level_expanded = lattice.select_top(level_dfs, level_scores, beam_width)
+
+            expanded_rows = {
+                targets: lattice.group_rows(self.data_codes, combo, df.iloc[positions])
+                for targets, combo, df, positions in zip(level_targets, level_combos, level_dfs, level_expanded)
+                if len(positions) > 0
+            }
+
+            # A child is computed on the rows of its expanded parents, ie: of the cuts it is a subset of
+            level_targets = lattice.child_targets(list(expanded_rows), self.target_cols)
+            level_masks = []
+            for targets in level_targets:
+                parent_targets = [tuple(col for col in targets if col != target) for target in targets]
+                parent_rows = [expanded_rows[parent] for parent in parent_targets if parent in expanded_rows]
+                level_masks.append(np.logical_or.reduce(parent_rows))
+            if not level_targets:
+                break
+
+        self._log(
+            f"Searched {len(combinations)} combinations & {sum(len(df) for df in combination_dfs)} cuts "
+            + f"for the top {k} hot spots"
+        )
+
+        # Only the combinations of the selected cuts are assembled
+        selected = lattice.select_top(combination_dfs, combination_scores, k)
+        top_combo_ids = [combo_i for combo_i, positions in enumerate(selected) if len(positions) > 0]
+        if not top_combo_ids:
+            raise ValueError("None of the cuts have a score, check the score & the min_support.")
+        raw_output_dicts = []
+        for combo_i in top_combo_ids:
+            positions = selected[combo_i]
+            df = combination_dfs[combo_i].iloc[positions].assign(score=combination_scores[combo_i][positions])
+            raw_output_dicts.append(
+                {
+                    "combination": combinations[combo_i],
+                    "interaction_count": len(combinations[combo_i]),
+                    "df": df.reset_index(drop=True),
+                }
+            )
+        top_df = compact.build_compact_df(raw_output_dicts, self.data_codes, key_cols, self.target_cols)
+        top_df = top_df.iloc[np.argsort(-top_df["score"].to_numpy(), kind="stable")].reset_index(drop=True)
+
+        combinations_df = compact.build_combinations_df([combinations[combo_i] for combo_i in top_combo_ids], key_cols)
+        if self.output_layout == "dicts":
+            return compact.materialize_dicts(
+                top_df,
+                combinations_df,
+                self.target_cols,
+                self.time_period,
+                self.grouped_by or [],
+            )
+
+        combination = combinations_df.set_index("combo_id")["combination"]
+        top_df.insert(0, "combination", combination.reindex(top_df["combo_id"]).to_numpy())
+        return top_df.drop(columns="combo_id")
+
+    def build_index(self):
+        """Build a bitmap index of the rows holding each value of the target columns, which query() uses.
+
+        Frequent values are packed bitmaps (1 bit per row) & rare values sorted row ids, so the index
+        takes at most 4 bytes per row & target column (~1-2 in practice), see: utils/bitmap_index.py.
+        """
+        self._check_pandas_backend("build_index")
+        if self.data_codes is None:
+            self._build_data()
+        with self.profiler.phase("build_index", rows_in=len(self.data_prep)) as event:
+            self.bitmap_index = bitmap_index.build_bitmap_index(self.data_codes, self.target_cols)
+            event.rows_out = len(self.bitmap_index.dense) + len(self.bitmap_index.sparse)
+        self._log(f"Indexed the values of {len(self.target_cols)} target columns in {self.bitmap_index.nbytes:,} bytes")
+
+    def query(self, cut: dict) -> pd.DataFrame:
+        """Compute the output of a single cut, ie: {"day": "Sat", "smoker": "Yes", "size": 4}, over time.
+
+        The rows of the cut are found by intersecting the bitmaps of its values (see build_index, which
+        the first query runs), and the objective function is only run on those rows, without running
+        any combination. The cut may hold any number of target columns, including more than the
+        interaction_limit.
+
+        Parameters:
+        -----------
+        cut : dict
+            The value of each target column of the cut, values may also be given as strings like in combo_dict.
+
+        Returns:
+        --------
+        pd.DataFrame
+            The output of the cut for each time period (& grouped_by value) in the output_layout, with the
+            same columns but no rows when no row holds the cut. The compact layout has the 'combination' of
+            the cut instead of its combo_id.
+
+        Raises:
+        -------
+        ValueError
+            If the cut is empty or holds columns that aren't target columns.
+        """
+        self._check_pandas_backend("query")
+        if not isinstance(cut, dict) or not cut:
+            raise ValueError("'cut' must be a non-empty dict of target columns & values.")
+        unknown_cols = [col for col in cut if col not in self.target_cols]
+        if unknown_cols:
+            raise ValueError(f"The columns of 'cut' must be target columns, not: {unknown_cols}")
+
+        if self.data_codes is None:
+            self._build_data()
+        if not self.obj_func_tested:
+            self.test_objective_function(verbose=False)
+        if self.bitmap_index is None:
+            self.build_index()
+
+        key_cols = self.time_period + (self.grouped_by or [])
+        combo = key_cols + [col for col in self.target_cols if col in cut]
+        with self.profiler.phase("query", combo) as event:
+            rows = self.bitmap_index.rows(cut)  # type: ignore
+            event.rows_in = int(rows.sum())
+        if rows.any():
+            combination_df = self._run_combos([combo], [rows])[0]
+        else:
+            # No row holds the cut, the objective function runs on a single row for the columns of its output
+            first_row = np.zeros(len(rows), dtype=bool)
+            first_row[:1] = True
+            combination_df = self._run_combos([combo], [first_row])[0].iloc[:0]
+
+        combinations_df = compact.build_combinations_df([combo], key_cols)
+        query_df = compact.build_compact_df(
+            [self._raw_output_dict(combo, combination_df)], self.data_codes, key_cols, self.target_cols
+        )
+        if self.output_layout == "dicts":
+            return compact.materialize_dicts(
+                query_df,
+                combinations_df,
+                self.target_cols,
+                self.time_period,
+                self.grouped_by or [],
+            )
+
+        query_df.insert(0, "combination", [combo] * len(query_df))
+        return query_df.drop(columns="combo_id")
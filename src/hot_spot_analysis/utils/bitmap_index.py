@@ -0,0 +1,112 @@
+"""
+A bitmap index over the values of the target columns, so the rows of any cut are found without a scan of the data.
+
+Each (column, value) maps to the rows holding it, as a packed bitmap (1 bit per row) when the value is
+frequent, or as its sorted row ids (32 bits per row) when it is rare, like the containers of Roaring
+bitmaps. A bitmap holds at least DENSE_FRACTION of the rows, so either way a column takes at most 32
+bits per row. The rows of a cut, ie: {day: Sat, size: 4}, are the intersection of the rows of its
+values, at any depth.
+"""
+
+from dataclasses import dataclass, field
+from functools import reduce
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, general, search_index
+
+# From this share of the rows, the rows of a value are a packed bitmap rather than row ids
+DENSE_FRACTION = 1 / 32
+
+
+@dataclass
+class BitmapIndex:
+    """The rows holding each value of the indexed columns.
+
+    Attributes:
+    -----------
+    n_rows : int
+        The number of rows of the data.
+    labels : dict[str, pd.Index]
+        The values of each indexed column, the position of a value is its code.
+    dense : dict[tuple[str, int], np.ndarray]
+        The packed bitmap (np.packbits) of the rows holding each frequent (column, code).
+    sparse : dict[tuple[str, int], np.ndarray]
+        The sorted row ids holding each rare (column, code).
+    """
+
+    n_rows: int
+    labels: Dict[str, pd.Index] = field(default_factory=dict)
+    dense: Dict[Tuple[str, int], np.ndarray] = field(default_factory=dict)
+    sparse: Dict[Tuple[str, int], np.ndarray] = field(default_factory=dict)
+
+    @property
+    def nbytes(self) -> int:
+        """The memory held by the bitmaps & row ids."""
+        return sum(bits.nbytes for bits in self.dense.values()) + sum(ids.nbytes for ids in self.sparse.values())
+
+    def code_of(self, column: str, value) -> int:
+        """The code of a value of a column, matched as is or by its string (ie: a value of combo_dict), -1 if absent."""
+        labels = self.labels[column]
+        code = labels.get_indexer([value])[0]
+        if code < 0 and isinstance(value, str):
+            matches = np.flatnonzero(general.values_to_str(labels) == value)
+            code = matches[0] if len(matches) else -1
+        return int(code)
+
+    def rows(self, cut: Dict[str, object]) -> np.ndarray:
+        """
+        Find the rows of a cut, by intersecting the rows of each of its values.
+
+        Parameters:
+        - cut (Dict[str, object]): The value of each column of the cut, ie: {"day": "Sat", "size": 4}.
+
+        Returns:
+        - np.ndarray: A boolean mask of the rows of the cut, every row for an empty cut.
+        """
+        keys = [(column, self.code_of(column, value)) for column, value in cut.items()]
+        if any(key not in self.dense and key not in self.sparse for key in keys):
+            return np.zeros(self.n_rows, dtype=bool)
+
+        bitmaps = [self.dense[key] for key in keys if key in self.dense]
+        row_ids = [self.sparse[key] for key in keys if key in self.sparse]
+        bits = np.bitwise_and.reduce(bitmaps) if bitmaps else None
+        if not row_ids:
+            if bits is None:
+                return np.ones(self.n_rows, dtype=bool)
+            return np.unpackbits(bits, count=self.n_rows).view(bool)
+
+        # The rare values are intersected as row ids, which are then looked up in the bitmaps
+        ids = reduce(lambda left, right: np.intersect1d(left, right, assume_unique=True), row_ids)
+        if bits is not None:
+            ids = ids[(bits[ids >> 3] >> (7 - (ids & 7)).astype(np.uint8)) & 1 == 1]
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[ids] = True
+        return mask
+
+
+def build_bitmap_index(data_codes: Dict[str, encoding.EncodedColumn], columns: List[str]) -> BitmapIndex:
+    """
+    Build the bitmap index of the values of some encoded columns.
+
+    Parameters:
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+    - columns (List[str]): The columns to index, ie: the target columns.
+
+    Returns:
+    - BitmapIndex: The rows of each value of the columns, missing values aren't indexed.
+    """
+    n_rows = len(next(iter(data_codes.values())).codes)
+    index = BitmapIndex(n_rows=n_rows)
+    id_dtype = np.int32 if n_rows < 2**31 else np.int64
+    for column in columns:
+        encoded_col = data_codes[column]
+        index.labels[column] = encoded_col.labels
+        for code, row_ids in search_index.group_rows(encoded_col.codes).items():
+            if len(row_ids) >= DENSE_FRACTION * n_rows:
+                index.dense[(column, code)] = np.packbits(encoded_col.codes == code)
+            else:
+                index.sparse[(column, code)] = row_ids.astype(id_dtype)
+    return index
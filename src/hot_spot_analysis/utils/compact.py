@@ -0,0 +1,206 @@
+"""
+Functions for the compact, columnar layout of the HSA output.
+
+The compact layout has an integer combo_id, a categorical column per time_period, grouped_by
+& target column (missing where the column isn't part of the cut), and a small combinations
+table. The dict columns (combo_dict, grouped_by_dict & time_period_dict) are only built when
+they are asked for.
+"""
+
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, general
+
+
+def build_combinations_df(combinations: List[List[str]], key_cols: List[str]) -> pd.DataFrame:
+    """
+    Build the combinations table of the compact layout.
+
+    Parameters:
+    - combinations (List[List[str]]): Every combination, including the time_period & grouped_by columns.
+    - key_cols (List[str]): The time_period & grouped_by columns, which are part of every combination.
+
+    Returns:
+    - pd.DataFrame: One row per combo_id with the target columns of the combination (or ['Overall'])
+      and its interaction_count.
+    """
+    return pd.DataFrame(
+        {
+            "combo_id": np.arange(len(combinations)),
+            "combination": [[col for col in combo if col not in key_cols] for combo in combinations],
+            "interaction_count": [len(combo) - 1 if "Overall" in combo else len(combo) for combo in combinations],
+        }
+    )
+
+
+def build_compact_df(
+    raw_output_dicts: List[dict],
+    data_codes: Dict[str, encoding.EncodedColumn],
+    key_cols: List[str],
+    target_cols: List[str],
+) -> pd.DataFrame:
+    """
+    Assemble the raw output of each combination into the compact layout.
+
+    Parameters:
+    - raw_output_dicts (List[dict]): The raw output of each combination (see HotSpotAnalyzer.hsa_raw_output_dicts).
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns, their labels are the categories.
+    - key_cols (List[str]): The time_period & grouped_by columns.
+    - target_cols (List[str]): The target columns.
+
+    Returns:
+    - pd.DataFrame: The compact HSA output, one row per cut.
+    """
+    combo_dfs = []
+    for combo_id, combo_i_dict in enumerate(raw_output_dicts):
+        combo_i_combination = combo_i_dict["combination"]
+        combo_i_df = combo_i_dict["df"]
+        n_rows = len(combo_i_df)
+
+        combo_i_columns = {
+            "combo_id": np.full(n_rows, combo_id),
+            "interaction_count": np.full(n_rows, combo_i_dict["interaction_count"]),
+        }
+        for col in key_cols + target_cols:
+            labels = data_codes[col].labels
+            if col in combo_i_combination:
+                combo_i_columns[col] = pd.Categorical(combo_i_df[col], categories=labels)
+            else:
+                combo_i_columns[col] = pd.Categorical.from_codes(np.full(n_rows, -1), categories=labels)
+
+        # The objective function outputs keep their order, ie: n_rows then the metrics
+        for col in combo_i_df.columns:
+            if col not in combo_i_combination:
+                combo_i_columns[col] = combo_i_df[col].to_numpy()
+
+        combo_dfs.append(pd.DataFrame(combo_i_columns))
+
+    # Every combination has the same columns & categories, so a single concat keeps the categoricals
+    return pd.concat(combo_dfs, ignore_index=True)
+
+
+def materialize_dicts(
+    compact_df: pd.DataFrame,
+    combinations_df: pd.DataFrame,
+    target_cols: List[str],
+    time_period: List[str],
+    grouped_by: List[str],
+) -> pd.DataFrame:
+    """
+    Build the dict layout of the HSA output from its compact layout.
+
+    Parameters:
+    - compact_df (pd.DataFrame): The compact HSA output (see build_compact_df).
+    - combinations_df (pd.DataFrame): The combinations table (see build_combinations_df).
+    - target_cols (List[str]): The target columns.
+    - time_period (List[str]): The time_period columns.
+    - grouped_by (List[str]): The grouped_by columns.
+
+    Returns:
+    - pd.DataFrame: The HSA output with time_period_dict, grouped_by_dict & combo_dict columns.
+    """
+    output = {}
+    if time_period:
+        time_period_values = [general.values_to_str(compact_df[col]) for col in time_period]
+        output["time_period_dict"] = general.columns_to_dicts(time_period, time_period_values)
+    if grouped_by:
+        grouped_by_values = [general.values_to_str(compact_df[col]) for col in grouped_by]
+        output["grouped_by_dict"] = general.columns_to_dicts(grouped_by, grouped_by_values)
+
+    combo_dict = np.empty(len(compact_df), dtype=object)
+    combinations = combinations_df.set_index("combo_id")["combination"]
+    for combo_id, rows in compact_df.groupby("combo_id", sort=False).indices.items():
+        combination = combinations[combo_id]
+        if combination == ["Overall"]:
+            combo_dict[rows] = [{"Overall": "Overall"} for _ in rows]
+        else:
+            combo_values = [general.values_to_str(compact_df[col].iloc[rows]) for col in combination]
+            combo_dict[rows] = general.columns_to_dicts(combination, combo_values)
+    output["combo_dict"] = combo_dict
+
+    # n_rows & the metrics, then the interaction_count
+    key_cols = ["combo_id", "interaction_count"] + time_period + grouped_by + target_cols
+    for col in compact_df.columns:
+        if col not in key_cols:
+            output[col] = compact_df[col].to_numpy()
+    output["interaction_count"] = compact_df["interaction_count"].to_numpy()
+
+    return pd.DataFrame(output, index=compact_df.index)
+
+
+def match_values(values: pd.Series, search_terms: set) -> np.ndarray:
+    """Check if str(value) of each row is one of the search terms, by only checking each unique value once."""
+    codes, uniques = pd.factorize(values)
+    uniques_match = np.array([str(unique) in search_terms for unique in uniques] + [False])
+    return uniques_match[codes]
+
+
+def search_mask(
+    compact_df: pd.DataFrame,
+    combinations_df: pd.DataFrame,
+    key_cols: List[str],
+    target_cols: List[str],
+    search_terms: List[str],
+    search_across: str,
+    search_type: str,
+) -> np.ndarray:
+    """
+    Search the keys or values of each cut of the compact HSA output.
+
+    This matches the search of the dict layout, where the keys & values of a cut are those of
+    its time_period_dict, grouped_by_dict & combo_dict.
+
+    Parameters:
+    - compact_df (pd.DataFrame): The compact HSA output (see build_compact_df).
+    - combinations_df (pd.DataFrame): The combinations table (see build_combinations_df).
+    - key_cols (List[str]): The time_period & grouped_by columns.
+    - target_cols (List[str]): The target columns.
+    - search_terms (List[str]): The terms to search for.
+    - search_across (str): Either: 'keys' or 'values'.
+    - search_type (str): Either 'any' of the search_terms, or 'all' of them (& nothing else).
+
+    Returns:
+    - np.ndarray: A boolean mask of the matching rows.
+    """
+    combinations = combinations_df.set_index("combo_id")["combination"]
+    combo_ids = compact_df["combo_id"].to_numpy()
+    max_combo_id = int(combinations.index.max()) + 1
+
+    if search_across == "keys":
+        combo_match = np.zeros(max_combo_id, dtype=bool)
+        for combo_id, combination in combinations.items():
+            combo_keys = key_cols + combination
+            if search_type == "all":
+                combo_match[combo_id] = sorted(search_terms) == sorted(combo_keys)
+            else:
+                combo_match[combo_id] = any(term in combo_keys for term in search_terms)
+        return combo_match[combo_ids]
+
+    # 'Overall' is the (virtual) value of the Overall cuts
+    is_overall = np.zeros(max_combo_id, dtype=bool)
+    n_keys = np.zeros(max_combo_id, dtype=int)
+    for combo_id, combination in combinations.items():
+        is_overall[combo_id] = combination == ["Overall"]
+        n_keys[combo_id] = len(key_cols) + len(combination)
+    rows_overall = is_overall[combo_ids]
+
+    value_cols = [col for col in key_cols + target_cols if col in compact_df.columns]
+    if search_type == "any":
+        terms = set(search_terms)
+        mask = rows_overall & ("Overall" in terms)
+        for col in value_cols:
+            mask |= match_values(compact_df[col], terms)
+        return mask
+
+    # 'all' requires the values of the cut to be exactly the search terms, duplicates included
+    mask = n_keys[combo_ids] == len(search_terms)
+    for term, term_count in Counter(search_terms).items():
+        matches = rows_overall.astype(int) * (term == "Overall")
+        for col in value_cols:
+            matches = matches + match_values(compact_df[col], {term})
+        mask &= matches == term_count
+    return mask
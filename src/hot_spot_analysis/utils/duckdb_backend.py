@@ -0,0 +1,283 @@
+"""
+A DuckDB backend that runs every combination of decomposable metric specs as a single GROUPING SETS query.
+
+The data (a pandas DataFrame, or a Parquet file that is never loaded into pandas) is scanned by an
+in-process DuckDB, so nothing runs as a service, and DuckDB spills to disk when the aggregation
+doesn't fit in memory. Each grouping set is a combination, bounded by the interaction_limit, and
+each row of the result is assigned back to its combination by its GROUPING() id. The sufficient
+statistics of the metrics (see metrics.py) are finalized like the pandas rollup, so the output
+matches the pandas backend.
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, lists, metrics, rollup, streaming
+
+# The name the data is registered as on the DuckDB connection
+SOURCE = "hsa_source"
+
+# The DuckDB types whose sums are integers, like kernels.group_sum
+INTEGER_TYPES = [
+    "BOOLEAN",
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "UHUGEINT",
+]
+
+
+def import_duckdb():
+    """Import duckdb, which is an optional dependency."""
+    try:
+        import duckdb
+    except ImportError as error:
+        raise ImportError("The duckdb backend requires duckdb: pip install duckdb") from error
+    return duckdb
+
+
+def is_parquet_path(data) -> bool:
+    """Check if the data is the path of a Parquet file (or a glob of Parquet files)."""
+    return isinstance(data, (str, os.PathLike)) and str(data).endswith(streaming.PARQUET_SUFFIXES)
+
+
+def quote(name: str) -> str:
+    """Quote an identifier, ie: a column name with spaces."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def source_sql(data) -> str:
+    """The FROM clause of the data, a Parquet path is scanned directly."""
+    if is_parquet_path(data):
+        return "read_parquet('" + str(data).replace("'", "''") + "')"
+    return SOURCE
+
+
+def to_arrow(data: pd.DataFrame):
+    """
+    Return the data as an Arrow table where pyarrow is installed, which DuckDB scans ~3x faster than
+    the object columns of a pandas DataFrame.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return data
+    return pa.Table.from_pandas(data, preserve_index=False)
+
+
+def connect(data, connection=None):
+    """
+    Return a DuckDB connection, with a pandas DataFrame registered as SOURCE.
+
+    Parameters:
+    - data: A pandas DataFrame, or the path of a Parquet file.
+    - connection (duckdb.DuckDBPyConnection, optional): The connection to use. Defaults to a new in-memory one.
+    """
+    duckdb = import_duckdb()
+    if connection is None:
+        connection = duckdb.connect()
+    if not is_parquet_path(data):
+        connection.register(SOURCE, to_arrow(data))
+    return connection
+
+
+def get_columns(data, connection=None) -> List[str]:
+    """The columns of a pandas DataFrame or a Parquet file, without reading its rows."""
+    if not is_parquet_path(data):
+        return list(data.columns)
+    description = connect(data, connection).execute(f"DESCRIBE SELECT * FROM {source_sql(data)}").fetchall()
+    return [row[0] for row in description]
+
+
+def get_types(data, connection) -> Dict[str, str]:
+    """The DuckDB type of each column of the data, registered on the connection (see connect)."""
+    description = connection.execute(f"DESCRIBE SELECT * FROM {source_sql(data)}").fetchall()
+    return {row[0]: row[1] for row in description}
+
+
+def is_integer_sum(column: str, stat: str, data_types: Dict[str, str]) -> bool:
+    """Check if a statistic is the sum of an integer or boolean column, which is summed as a BIGINT."""
+    return stat == "sum" and data_types.get(column) in INTEGER_TYPES
+
+
+def stat_sql(column: str, stat: str, is_integer: bool = False) -> str:
+    """
+    The SQL aggregation of a sufficient statistic of a column, see: metrics.STAT_AGG_FUNCS.
+
+    The centered statistics (csum & csumsq) are centered on the mean of every row, like rollup.compute_shifts,
+    & sums of groups without values are 0 like the pandas kernels. The sums of integer columns (is_integer)
+    are BIGINTs & the min & max keep the type of the column (see: stat_values), other stats are DOUBLEs.
+    """
+    values = f"CAST({quote(column)} AS {'BIGINT' if is_integer else 'DOUBLE'})"
+    centered = f"({values} - {quote('shift__' + column)})"
+    if stat == "count":
+        expr = f"COUNT({quote(column)})"
+    elif stat == "sum":
+        expr = f"COALESCE(SUM({values}), 0)"
+    elif stat == "csum":
+        expr = f"COALESCE(SUM({centered}), 0)"
+    elif stat == "csumsq":
+        expr = f"COALESCE(SUM({centered} * {centered}), 0)"
+    elif stat in ["min", "max"]:
+        expr = f"{stat.upper()}({quote(column)})"
+    else:
+        raise ValueError(f"Unknown sufficient statistic: {stat}")
+    return f"{expr} AS {quote(metrics.stat_name(column, stat))}"
+
+
+def build_query(
+    data,
+    combinations: List[List[str]],
+    metric_specs: Dict[str, metrics.Metric],
+    data_types: Dict[str, str],
+) -> Tuple[str, List[str]]:
+    """
+    Build the GROUPING SETS query of every combination.
+
+    Like rollup.rollup_combos, the data is aggregated once at its finest cut (keeping the groups with
+    missing values), and the grouping sets re-aggregate that cut instead of the raw rows.
+
+    Parameters:
+    - data: A pandas DataFrame, or the path of a Parquet file.
+    - combinations (List[List[str]]): The combinations to compute.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - data_types (Dict[str, str]): The DuckDB type of each column of the data (see get_types), any other
+      grouping column (ie: 'Overall') is virtual.
+
+    Returns:
+    - Tuple[str, List[str]]: The query, & the columns of the data it groups by.
+    """
+    group_cols = [col for col in lists.unique([col for combo in combinations for col in combo]) if col in data_types]
+    stats = metrics.statistics(metric_specs)
+    centered_cols = lists.unique([column for column, stat in stats if stat in ["csum", "csumsq"]])
+
+    source = source_sql(data)
+    if centered_cols:
+        shifts = ", ".join(f"AVG(CAST({quote(col)} AS DOUBLE)) AS {quote('shift__' + col)}" for col in centered_cols)
+        source = f"{source}, (SELECT {shifts} FROM {source}) AS shifts"
+
+    base_select = [quote(col) for col in group_cols] + ["COUNT(*) AS n_rows"]
+    base_select += [stat_sql(column, stat, is_integer_sum(column, stat, data_types)) for column, stat in stats]
+    base = f"SELECT {', '.join(base_select)} FROM {source}"
+
+    rollup_select = [quote(col) for col in group_cols]
+    integer_cols = ["n_rows"] + [
+        metrics.stat_name(column, stat)
+        for column, stat in stats
+        if stat == "count" or is_integer_sum(column, stat, data_types)
+    ]
+    for column, func in rollup.stat_rollup_funcs(metric_specs).items():
+        expr = f"{func.upper()}({quote(column)})"
+        # Sums of counts & of integers would be HUGEINT, which pandas reads as floats
+        if column in integer_cols:
+            expr = f"CAST({expr} AS BIGINT)"
+        rollup_select.append(f"{expr} AS {quote(column)}")
+    query = f"SELECT {', '.join(rollup_select)}, "
+
+    if not group_cols:
+        return query + f"0 AS grouping_id FROM ({base}) AS base", group_cols
+
+    grouping_sets = ", ".join(
+        "(" + ", ".join(quote(col) for col in combo if col in data_types) + ")" for combo in combinations
+    )
+    base += f" GROUP BY {', '.join(quote(col) for col in group_cols)}"
+    query += f"GROUPING({', '.join(quote(col) for col in group_cols)}) AS grouping_id FROM ({base}) AS base"
+    return query + f" GROUP BY GROUPING SETS ({grouping_sets})", group_cols
+
+
+def column_bit(col: str, group_cols: List[str]) -> int:
+    """The bit of a group column in a GROUPING() id, the first column is the most significant bit."""
+    return 1 << (len(group_cols) - 1 - group_cols.index(col))
+
+
+def grouping_id(combo: List[str], group_cols: List[str]) -> int:
+    """The GROUPING() id of a combination: the bits of the group columns that aren't part of it."""
+    return sum(column_bit(col, group_cols) for col in group_cols if col not in combo)
+
+
+def drop_nullable(values: pd.Series) -> pd.Series:
+    """
+    Return the values with their NumPy dtype, once the groups without them are dropped.
+
+    The columns that aren't grouped in every grouping set are missing for some rows of the result,
+    so DuckDB returns them with a nullable dtype, ie: Int64 instead of the int64 of the data.
+    """
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and hasattr(values.dtype, "numpy_dtype"):
+        if values.dtype.kind in "iub" and not values.hasnans:
+            return values.astype(values.dtype.numpy_dtype)
+    return values
+
+
+def stat_values(values: pd.Series) -> pd.Series:
+    """
+    Return the min or max of a column like the pandas rollup (see rollup.to_values): with the dtype of
+    numeric columns, as floats otherwise (ie: booleans).
+    """
+    values = drop_nullable(values)
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in "iuf":
+        return values
+    return values.astype(float)
+
+
+def run_combos(
+    data,
+    combinations: List[List[str]],
+    metric_specs: Dict[str, metrics.Metric],
+    connection=None,
+) -> Tuple[List[pd.DataFrame], Dict[str, encoding.EncodedColumn]]:
+    """
+    Compute every combination with a single GROUPING SETS query on an in-process DuckDB.
+
+    Parameters:
+    - data: The raw data, a pandas DataFrame or the path of a Parquet file.
+    - combinations (List[List[str]]): The combinations to compute.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - connection (duckdb.DuckDBPyConnection, optional): The connection to run the query on, ie: with a
+      memory_limit & temp_directory to spill to. Defaults to a new in-memory one.
+
+    Returns:
+    - Tuple[List[pd.DataFrame], Dict[str, encoding.EncodedColumn]]: The output for each combination,
+      in the order of combinations, & the labels of each grouping column (with no codes).
+    """
+    connection = connect(data, connection)
+    data_types = get_types(data, connection)
+    data_cols = list(data_types)
+    query, group_cols = build_query(data, combinations, metric_specs, data_types)
+    result = connection.execute(query).df()
+
+    # Every grouping column is part of a combination with a single target column (or 'Overall' for the
+    # time_period & groups), so its labels are the values of the groups it is part of
+    encoded = {}
+    for col in lists.unique([col for combo in combinations for col in combo]):
+        if col not in data_cols:
+            # 'Overall' is a virtual column, see: encoding.encode_columns
+            encoded[col] = encoding.constant_column("Overall", 0)
+            continue
+        values = result.loc[(result["grouping_id"].to_numpy() & column_bit(col, group_cols)) == 0, col]
+        labels = pd.Index(drop_nullable(values.dropna()).unique()).sort_values()
+        encoded[col] = encoding.EncodedColumn(codes=np.empty(0, dtype=np.int64), labels=labels)
+
+    min_max_cols = [
+        metrics.stat_name(column, stat) for column, stat in metrics.statistics(metric_specs) if stat in ["min", "max"]
+    ]
+    result_ids = result["grouping_id"].to_numpy()
+    outputs = []
+    for combo in combinations:
+        partial = result[result_ids == grouping_id(combo, group_cols)]
+        partial = partial.assign(**{col: "Overall" for col in combo if col not in data_cols})
+        # Rows with a missing value in the combination are dropped, like pandas' groupby
+        partial = partial.dropna(subset=combo).sort_values(combo).reset_index(drop=True)
+        partial = partial.assign(**{col: drop_nullable(partial[col]) for col in combo})
+        partial = partial.assign(**{col: stat_values(partial[col]) for col in min_max_cols})
+        output = partial[combo + ["n_rows"]]
+        outputs.append(pd.concat([output, metrics.finalize(partial, metric_specs)], axis=1))
+    return outputs, encoded
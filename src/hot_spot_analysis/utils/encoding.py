@@ -0,0 +1,158 @@
+"""
+Functions to integer-code the grouping columns once, and to build the group keys of
+combinations from those codes without re-hashing the original values.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Above this many possible keys per row, group keys are densified by sorting rather than by counting
+DENSE_KEY_SPACE_FACTOR = 4
+# Mixed-radix keys are densified before they could overflow int64
+MAX_KEY_SPACE = 2**62
+
+
+@dataclass
+class EncodedColumn:
+    """The integer codes of a column & the labels they stand for.
+
+    Attributes:
+    -----------
+    codes : np.ndarray
+        The code of each row, -1 for missing values.
+    labels : pd.Index
+        The sorted unique values of the column, ie: labels[code] is the value of a row.
+    """
+
+    codes: np.ndarray
+    labels: pd.Index
+
+    @property
+    def radix(self) -> int:
+        """The number of distinct codes, including one for missing values."""
+        return len(self.labels) + 1
+
+    def decode(self, codes: np.ndarray) -> pd.Index:
+        """Decode codes back to the values of the column, -1 is decoded to a missing value."""
+        return self.labels.take(codes, allow_fill=True)
+
+    def to_categorical(self, name: str, index: pd.Index) -> pd.Series:
+        """Return the column as a categorical series, which pandas can group by without hashing the values."""
+        return pd.Series(pd.Categorical.from_codes(self.codes, categories=self.labels), index=index, name=name)
+
+
+def compact_dtype(n_labels: int) -> np.dtype:
+    """Return the smallest signed integer dtype that can hold the codes of n_labels labels, and -1."""
+    return np.min_scalar_type(-(n_labels + 1))
+
+
+def encode_column(values: pd.Series) -> EncodedColumn:
+    """
+    Factorize a column into compact integer codes and its sorted labels.
+
+    Parameters:
+    - values (pd.Series): The column to encode.
+
+    Returns:
+    - EncodedColumn: The codes & labels of the column.
+    """
+    codes, labels = pd.factorize(values, sort=True)
+    return EncodedColumn(codes=codes.astype(compact_dtype(len(labels))), labels=pd.Index(labels))
+
+
+def constant_column(value, n_rows: int) -> EncodedColumn:
+    """
+    Encode a column holding a single value, without materializing the column.
+
+    Parameters:
+    - value: The value of every row.
+    - n_rows (int): The number of rows.
+
+    Returns:
+    - EncodedColumn: The codes (all 0) & the single label of the column.
+    """
+    return EncodedColumn(codes=np.zeros(n_rows, dtype=compact_dtype(1)), labels=pd.Index([value]))
+
+
+def encode_columns(data: pd.DataFrame, columns: List[str]) -> Dict[str, EncodedColumn]:
+    """
+    Factorize each of the columns once.
+
+    The 'Overall' column is virtual: unless the data has such a column, it is encoded as the
+    constant 'Overall' rather than read from the data.
+
+    Parameters:
+    - data (pd.DataFrame): The data to encode.
+    - columns (List[str]): The columns to encode.
+
+    Returns:
+    - Dict[str, EncodedColumn]: The encoded columns keyed by column name.
+    """
+    return {
+        column: (
+            constant_column("Overall", len(data))
+            if column == "Overall" and column not in data.columns
+            else encode_column(data[column])
+        )
+        for column in columns
+    }
+
+
+def densify(keys: np.ndarray, key_space: int) -> Tuple[np.ndarray, int]:
+    """
+    Map integer keys to dense group ids 0..n_groups-1 that preserve the order of the keys.
+
+    Parameters:
+    - keys (np.ndarray): Non-negative integer keys, all below key_space.
+    - key_space (int): The number of possible keys.
+
+    Returns:
+    - Tuple[np.ndarray, int]: The group id of each key & the number of groups.
+    """
+    if key_space <= DENSE_KEY_SPACE_FACTOR * len(keys) + 1024:
+        present = np.flatnonzero(np.bincount(keys, minlength=key_space))
+        remap = np.zeros(key_space, dtype=np.int64)
+        remap[present] = np.arange(len(present))
+        return remap[keys], len(present)
+
+    uniques, group_ids = np.unique(keys, return_inverse=True)
+    return group_ids.reshape(-1), len(uniques)
+
+
+def group_ids(codes_list: List[np.ndarray], radices: List[int]) -> Tuple[np.ndarray, int, List[np.ndarray]]:
+    """
+    Build the group of each row from the mixed-radix key of its codes.
+
+    The groups are numbered in the lexicographic order of the codes (first column first),
+    which matches the sorted order of a pandas groupby on the decoded values.
+
+    Parameters:
+    - codes_list (List[np.ndarray]): The codes of each grouping column, -1 for missing values.
+    - radices (List[int]): The radix of each grouping column (see EncodedColumn.radix).
+
+    Returns:
+    - Tuple[np.ndarray, int, List[np.ndarray]]: The group id of each row, the number of groups
+      & the codes of each grouping column for each group.
+    """
+    n_rows = len(codes_list[0])
+    keys = np.zeros(n_rows, dtype=np.int64)
+    key_space = 1
+
+    for codes, radix in zip(codes_list, radices):
+        if key_space * radix > MAX_KEY_SPACE:
+            keys, key_space = densify(keys, key_space)
+        keys = keys * radix + (codes.astype(np.int64) + 1)
+        key_space *= radix
+
+    row_group_ids, n_groups = densify(keys, key_space)
+
+    group_codes = []
+    for codes in codes_list:
+        codes_of_group = np.empty(n_groups, dtype=codes.dtype)
+        codes_of_group[row_group_ids] = codes
+        group_codes.append(codes_of_group)
+
+    return row_group_ids, n_groups, group_codes
@@ -1,5 +1,8 @@
 import json
 
+import numpy as np
+import pandas as pd
+
 
 def pop_keys(dictionary: dict, keys: list) -> dict:
     """
@@ -41,3 +44,32 @@ def json_to_dict(series_of_json: list) -> list:
     - list: A list of dictionaries.
     """
     return [json.loads(s) for s in series_of_json]
+
+
+def values_to_str(values: pd.Series) -> np.ndarray:
+    """
+    Convert values to strings in bulk, by only converting each unique value once.
+
+    Parameters:
+    - values (pd.Series): The values to convert.
+
+    Returns:
+    - np.ndarray: An object array holding str(value) for each value, missing values are kept as None.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques_str = np.array([str(unique) for unique in uniques] + [None], dtype=object)
+    return uniques_str[codes]
+
+
+def columns_to_dicts(keys: list, columns: list) -> list:
+    """
+    Build one dictionary per row from columns of values, in a single pass.
+
+    Parameters:
+    - keys (list): The key of each column.
+    - columns (list): The columns of values, one array per key.
+
+    Returns:
+    - list: A list of dictionaries, ie: [{keys[0]: columns[0][0], keys[1]: columns[1][0]}, ...]
+    """
+    return [dict(zip(keys, row_values)) for row_values in zip(*columns)]
@@ -1,5 +1,10 @@
+from typing import Callable, Optional
+
+import numpy as np
 import pandas as pd
 
+from hot_spot_analysis.utils import objectives, profiling
+
 """
 Functions meant to check the content, values or attributes of a data object.
 """
@@ -47,6 +52,25 @@ def return_data(dataframe: pd.DataFrame = pd.DataFrame(None)) -> pd.DataFrame:
         return dataframe
 
 
+def project_columns(dataframe: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """
+    Select columns of a DataFrame without copying their values.
+
+    The projection shares its columns with the input, so it must be treated as read-only.
+
+    Parameters:
+    - dataframe (pd.DataFrame): Input DataFrame.
+    - columns (list): The columns to keep, in order.
+
+    Returns:
+    - pd.DataFrame: The columns of the input DataFrame, or the input itself if every column is kept.
+    """
+    if list(dataframe.columns) == list(columns):
+        return dataframe
+    # Unlike dataframe[columns], building from the series doesn't consolidate (copy) them into new blocks
+    return pd.DataFrame({column: dataframe[column] for column in columns}, copy=False)
+
+
 def add_groups_to_combos(group_vars: list, combos: list[list]) -> list[list]:
     """
     Adds group variables to each combination in a list of combinations.
@@ -59,3 +83,57 @@ def add_groups_to_combos(group_vars: list, combos: list[list]) -> list[list]:
     - list[list]: List of combinations with group variables added.
     """
     return [group_vars + combo for combo in combos]
+
+
+def run_objective_function(
+    data: pd.DataFrame,
+    data_keys: dict,
+    combo: list,
+    objective_function: Callable,
+    rows: Optional[np.ndarray] = None,
+    profiler: Optional[profiling.Profiler] = None,
+) -> pd.DataFrame:
+    """
+    Group the data by a combination, and run the objective function on the groups.
+
+    Parameters:
+    - data (pd.DataFrame): The data to group.
+    - data_keys (dict): The grouping key (a series aligned with data) of each combo column.
+    - combo (list): The columns of the combination.
+    - objective_function (Callable): The function to run on the grouped data frame.
+    - rows (np.ndarray, optional): A boolean mask of the rows to group. Defaults to every row.
+    - profiler (profiling.Profiler, optional): Records the groupby, objective & merge events of the combination.
+
+    Returns:
+    - pd.DataFrame: One row per group with the combo columns, n_rows & the objective function outputs.
+    """
+    if profiler is None:
+        profiler = profiling.Profiler()
+
+    combo_keys = [data_keys[col] for col in combo]
+    if rows is not None and not rows.all():
+        data = data[rows]
+        combo_keys = [key[rows] for key in combo_keys]
+
+    with profiler.phase("groupby", combo, rows_in=len(data)) as event:
+        df_grp_by_combo = data.groupby(combo_keys, observed=True)
+        event.n_groups = df_grp_by_combo.ngroups
+
+    with profiler.phase("objective", combo, rows_in=len(data)) as event:
+        if isinstance(objective_function, objectives.ObjectiveSet):
+            # Every function of the set shares the groups, & is timed on its own
+            df_combo_output = objective_function(df_grp_by_combo, profiler, combo)
+        else:
+            df_combo_output = objective_function(df_grp_by_combo)
+        event.rows_out = len(df_combo_output)
+
+    with profiler.phase("merge", combo, rows_in=len(df_combo_output)) as event:
+        # The data is grouped by key series, so pandas doesn't exclude the combo columns from whole frame
+        # reductions (ie: g.mean()) like data.groupby(combo) does: drop them where they are also index levels
+        key_columns = [col for col in combo if col in df_combo_output.columns and col in df_combo_output.index.names]
+        df_combo_output = df_combo_output.drop(columns=key_columns)
+        df_grp_nrows = df_grp_by_combo.size().reset_index(name="n_rows")  # type: ignore
+        df_output = df_grp_nrows.merge(df_combo_output, on=combo)
+        event.rows_out = len(df_output)
+
+    return df_output
@@ -0,0 +1,124 @@
+"""
+Functions to append the HSA output of new time periods to an existing HSA output.
+
+Every combination includes the time_period columns, so the cuts of new time periods are
+independent of the existing ones: only the new data is run, and its output is merged in.
+The appended data is kept as chunks with their own codes, which are only merged (see
+merge_encoded) once the whole data is needed again, so an append scales with its new rows.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding
+
+
+def check_schema(data: pd.DataFrame, new_data: pd.DataFrame):
+    """
+    Check that the new data has the same columns & dtypes as the data.
+
+    Parameters:
+    - data (pd.DataFrame): The data HSA was run on.
+    - new_data (pd.DataFrame): The data to append.
+
+    Raises:
+    - ValueError: If the columns or their dtypes differ.
+    """
+    if list(data.columns) != list(new_data.columns):
+        raise ValueError(
+            "The new data must have the same columns as the data HSA was run on."
+            + f"\n\n\tColumns: {', '.join(map(str, data.columns))}"
+            + f"\n\tNew columns: {', '.join(map(str, new_data.columns))}"
+        )
+
+    dtype_changes = [
+        f"{col}: {data[col].dtype} -> {new_data[col].dtype}"
+        for col in data.columns
+        if data[col].dtype != new_data[col].dtype
+    ]
+    if dtype_changes:
+        raise ValueError(
+            "The new data must have the same dtypes as the data HSA was run on.\n\n\t" + "\n\t".join(dtype_changes)
+        )
+
+
+def check_new_periods(periods: pd.DataFrame, new_periods: pd.DataFrame):
+    """
+    Check that none of the new time periods already have an HSA output.
+
+    Parameters:
+    - periods (pd.DataFrame): The time_period columns of the existing HSA output.
+    - new_periods (pd.DataFrame): The time_period columns of the new data.
+
+    Raises:
+    - ValueError: If any of the new time periods already have an output.
+    """
+    existing = pd.MultiIndex.from_frame(periods.astype(object).drop_duplicates())
+    overlap = pd.MultiIndex.from_frame(new_periods.astype(object).drop_duplicates()).intersection(existing)
+    if len(overlap) > 0:
+        msg_overlap = ", ".join(str(period if len(period) > 1 else period[0]) for period in overlap[:10])
+        raise ValueError(f"The new data can only hold new time periods, these already have an output: {msg_overlap}")
+
+
+def merge_labels(labels: List[pd.Index]) -> pd.Index:
+    """The sorted union of the labels of chunks of a column."""
+    return pd.Index(labels[0].append(labels[1:]).unique().sort_values())
+
+
+def merge_encoded(encoded_chunks: List[encoding.EncodedColumn]) -> encoding.EncodedColumn:
+    """
+    Merge the codes of chunks of a column over their sorted labels.
+
+    Parameters:
+    - encoded_chunks (List[encoding.EncodedColumn]): The encoded column of each chunk of the data, in order.
+
+    Returns:
+    - encoding.EncodedColumn: The encoded column of the chunks, one after the other.
+    """
+    labels = merge_labels([encoded.labels for encoded in encoded_chunks])
+    codes = []
+    for encoded in encoded_chunks:
+        # A trailing -1 maps the missing code (-1) onto itself
+        label_codes = np.append(labels.get_indexer(encoded.labels), -1)
+        codes.append(label_codes[encoded.codes])
+    codes = np.concatenate(codes).astype(encoding.compact_dtype(len(labels)))
+    return encoding.EncodedColumn(codes=codes, labels=labels)
+
+
+def sort_order(compact_df: pd.DataFrame, key_cols: List[str]) -> np.ndarray:
+    """Return the order of the rows by combo_id, then by the codes of the key columns (see compact.build_compact_df)."""
+    sort_keys = [compact_df[col].cat.codes.to_numpy() for col in reversed(key_cols)]
+    return np.lexsort(sort_keys + [compact_df["combo_id"].to_numpy()])
+
+
+def append_compact(
+    compact_df: pd.DataFrame,
+    new_compact_df: pd.DataFrame,
+    labels: Dict[str, pd.Index],
+    key_cols: List[str],
+) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Append the compact HSA output of new time periods, keeping the rows in order.
+
+    Parameters:
+    - compact_df (pd.DataFrame): The compact HSA output.
+    - new_compact_df (pd.DataFrame): The compact HSA output of the new time periods.
+    - labels (Dict[str, pd.Index]): The merged labels of the key columns, which are their categories.
+    - key_cols (List[str]): The time_period, grouped_by & target columns.
+
+    Returns:
+    - Tuple[pd.DataFrame, np.ndarray]: The appended compact HSA output, & the order of the rows of
+      compact_df followed by new_compact_df.
+    """
+    compact_dfs = []
+    for df in [compact_df, new_compact_df]:
+        df = df.copy()
+        for col in key_cols:
+            df[col] = df[col].cat.set_categories(labels[col])
+        compact_dfs.append(df)
+
+    df_appended = pd.concat(compact_dfs, ignore_index=True)
+    order = sort_order(df_appended, key_cols)
+    return df_appended.iloc[order].reset_index(drop=True), order
@@ -0,0 +1,113 @@
+"""
+Bincount style aggregation kernels over dense group ids (see encoding.group_ids).
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# From this many adjacent columns with the same reduction (ie: the cells of a sketch), they are reduced as a block
+BLOCK_MIN_COLUMNS = 16
+
+
+def group_count(group_ids: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Count the non-missing values of each group."""
+    return np.bincount(group_ids, weights=~np.isnan(values), minlength=n_groups).astype(np.int64)
+
+
+def group_sum(group_ids: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Sum the non-missing values of each group, integer sums are exact below 2**53."""
+    if np.issubdtype(values.dtype, np.integer) or np.issubdtype(values.dtype, np.bool_):
+        return np.bincount(group_ids, weights=values, minlength=n_groups).astype(np.int64)
+    return np.bincount(group_ids, weights=np.nan_to_num(values, nan=0.0), minlength=n_groups)
+
+
+def group_min(group_ids: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Min of the non-missing values of each group, NaN when a group has no values."""
+    if np.issubdtype(values.dtype, np.integer):
+        output = np.full(n_groups, np.iinfo(values.dtype).max, dtype=values.dtype)
+        np.minimum.at(output, group_ids, values)
+        return output
+    output = np.full(n_groups, np.nan)
+    np.fmin.at(output, group_ids, values)
+    return output
+
+
+def group_max(group_ids: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Max of the non-missing values of each group, NaN when a group has no values."""
+    if np.issubdtype(values.dtype, np.integer):
+        output = np.full(n_groups, np.iinfo(values.dtype).min, dtype=values.dtype)
+        np.maximum.at(output, group_ids, values)
+        return output
+    output = np.full(n_groups, np.nan)
+    np.fmax.at(output, group_ids, values)
+    return output
+
+
+KERNELS = {
+    "count": group_count,
+    "sum": group_sum,
+    "min": group_min,
+    "max": group_max,
+}
+
+
+def group_reduce(func: str, group_ids: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Reduce values to one value per group with a bincount style kernel.
+
+    Parameters:
+    - func (str): The reduction, either: 'count', 'sum', 'min' or 'max'.
+    - group_ids (np.ndarray): The dense group id of each value.
+    - values (np.ndarray): The values to reduce.
+    - n_groups (int): The number of groups.
+
+    Returns:
+    - np.ndarray: One reduced value per group.
+    """
+    return KERNELS[func](group_ids, values, n_groups)
+
+
+# How the rows of a block are reduced, see: group_reduce_block
+BLOCK_UFUNCS = {
+    "sum": np.add,
+    "min": np.fmin,
+    "max": np.fmax,
+}
+
+
+def column_blocks(funcs: Dict[str, str], dtypes: Dict[str, np.dtype]) -> List[Tuple[List[str], str]]:
+    """Split the columns into runs of adjacent columns with the same reduction & dtype, in order."""
+    blocks: List[Tuple[List[str], str]] = []
+    previous = None
+    for column, func in funcs.items():
+        if previous is not None and (funcs[previous], dtypes[previous]) == (func, dtypes[column]):
+            blocks[-1][0].append(column)
+        else:
+            blocks.append(([column], func))
+        previous = column
+    return blocks
+
+
+def group_reduce_block(func: str, group_ids: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Reduce the rows of a 2D block of columns to one row per group, sorting the rows by group once.
+
+    Parameters:
+    - func (str): The reduction, either: 'sum', 'min' or 'max'.
+    - group_ids (np.ndarray): The dense group id of each row, every group has a row.
+    - values (np.ndarray): The (n_rows, n_columns) block of values to reduce.
+    - n_groups (int): The number of groups.
+
+    Returns:
+    - np.ndarray: The (n_groups, n_columns) reduced block, with the dtype of values.
+    """
+    if len(group_ids) == 0:
+        return np.zeros((n_groups, values.shape[1]), dtype=values.dtype)
+    order = np.argsort(group_ids, kind="stable")
+    sorted_ids = group_ids[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_ids[1:] != sorted_ids[:-1]]))
+    # The blocks of a DataFrame are column major (values.T is contiguous), so the columns are reduced
+    # along their rows without a copy to row major
+    columns = np.take(values.T, order, axis=1)
+    return BLOCK_UFUNCS[func].reduceat(columns, starts, axis=1).T
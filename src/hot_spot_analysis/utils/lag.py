@@ -0,0 +1,119 @@
+"""
+Functions to lag the HSA output by time_period.
+
+Each series (a combination & the values of its cut, other than the time_period) is keyed by
+an integer id, the rows are sorted once by (series, time_period), and every lag is then an
+index lookup into that order.
+"""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding
+
+LAG_BY = ["rows", "time_period"]
+
+
+def dense_ids(codes_list: List[np.ndarray]) -> np.ndarray:
+    """Return the dense id of the key of each row, numbered in the order of the codes."""
+    radices = [int(codes.max(initial=-1)) + 2 for codes in codes_list]
+    row_ids, _, _ = encoding.group_ids(codes_list, radices)
+    return row_ids
+
+
+def period_positions(codes_list: List[np.ndarray], n_labels: List[int]) -> np.ndarray:
+    """
+    Return the position of the time_period of each row among every period of the labels.
+
+    The periods are numbered by the codes of their labels (first column first), like a mixed-radix
+    number, so a period without any row of the output still takes its position. The labels are the
+    values observed in the data, so a period absent from the whole data has no position.
+
+    Parameters:
+    - codes_list (List[np.ndarray]): The codes of each time_period column.
+    - n_labels (List[int]): The number of labels of each time_period column.
+
+    Returns:
+    - np.ndarray: The position of the period of each row, in time order.
+    """
+    positions = np.zeros(len(codes_list[0]), dtype=np.int64)
+    for codes, n_column_labels in zip(codes_list, n_labels):
+        positions = positions * n_column_labels + codes
+    return positions
+
+
+def lag_sources(
+    series_ids: np.ndarray,
+    period_ids: np.ndarray,
+    lag_iterations: List[int],
+    lag_by: str = "rows",
+) -> List[np.ndarray]:
+    """
+    Find the row each row is lagged from, for every lag.
+
+    Parameters:
+    - series_ids (np.ndarray): The series of each row.
+    - period_ids (np.ndarray): The time_period of each row, numbered in time order (see period_positions).
+    - lag_iterations (List[int]): The lags, negative lags look forward.
+    - lag_by (str, optional): Either 'rows', to lag by the previous rows of each series,
+      or 'time_period', to lag by the previous time periods (missing periods give no row). Defaults to 'rows'.
+
+    Returns:
+    - List[np.ndarray]: For each lag, the row each row is lagged from, -1 when there is none.
+    """
+    if lag_by not in LAG_BY:
+        raise ValueError(f"'lag_by' must be either: {LAG_BY}")
+
+    n_rows = len(series_ids)
+    order = np.lexsort((period_ids, series_ids))
+    sorted_series = series_ids[order]
+    sorted_periods = period_ids[order]
+
+    sources = []
+    for lag_i in lag_iterations:
+        if lag_by == "rows":
+            positions = np.arange(n_rows) - lag_i
+        else:
+            # Rows are sorted by (series, period), so the lagged period of the same series can be binary searched
+            n_periods = int(period_ids.max(initial=0)) + 1 + abs(lag_i)
+            sorted_keys = sorted_series.astype(np.int64) * n_periods + sorted_periods
+            positions = np.searchsorted(sorted_keys, sorted_keys - lag_i)
+
+        in_range = (positions >= 0) & (positions < n_rows)
+        positions = np.where(in_range, positions, 0)
+        is_match = in_range & (sorted_series[positions] == sorted_series)
+        if lag_by == "time_period":
+            is_match &= sorted_periods[positions] == sorted_periods - lag_i
+
+        source = np.full(n_rows, -1, dtype=np.int64)
+        source[order] = np.where(is_match, order[positions], -1)
+        sources.append(source)
+    return sources
+
+
+def lag_columns(
+    df: pd.DataFrame,
+    lag_cols: List[str],
+    lag_iterations: List[int],
+    sources: List[np.ndarray],
+) -> pd.DataFrame:
+    """
+    Add a '{column}_lag{i}' column per lag for each of lag_cols.
+
+    Parameters:
+    - df (pd.DataFrame): The HSA output.
+    - lag_cols (List[str]): The columns to lag.
+    - lag_iterations (List[int]): The lags.
+    - sources (List[np.ndarray]): The row each row is lagged from, for each lag (see lag_sources).
+
+    Returns:
+    - pd.DataFrame: df with the lagged columns, rows without a lagged row are missing.
+    """
+    lagged = {}
+    for lag_i, source in zip(lag_iterations, sources):
+        for col in lag_cols:
+            values = pd.api.extensions.take(df[col].array, source, allow_fill=True)
+            lagged[f"{col}_lag{lag_i}"] = pd.Series(values, index=df.index)
+    return pd.concat([df, pd.DataFrame(lagged, index=df.index)], axis=1)
@@ -0,0 +1,138 @@
+"""
+Functions to search the lattice of combinations for the top hot spots, best-first.
+
+A cut at depth d+1 (ie: d+1 target columns) is a subset of the rows of each of its parent cuts
+at depth d, so only the children of the most promising cuts of each depth are computed, on the
+rows of those cuts. When the score can't grow from a cut to its children (n_rows, counts & sums
+of non-negative values), a cut that can't beat the k-th best score has no child that can either,
+and pruning it keeps the search exact.
+"""
+
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, metrics
+
+Score = Union[str, Callable[[pd.DataFrame], Union[pd.Series, np.ndarray]]]
+
+
+def score_cuts(df: pd.DataFrame, score: Score) -> np.ndarray:
+    """
+    Score the cuts of a combination, missing scores are never among the top hot spots.
+
+    Parameters:
+    - df (pd.DataFrame): The output of a combination.
+    - score (Score): A column of the output (ie: 'n_rows' or a metric), or a function of the output.
+
+    Returns:
+    - np.ndarray: The score of each cut, missing scores are -inf.
+    """
+    if isinstance(score, str):
+        if score not in df.columns:
+            raise ValueError(f"'score' must be a column of the output: {', '.join(map(str, df.columns))}")
+        scores = df[score]
+    else:
+        scores = score(df)
+
+    scores = pd.Series(scores).to_numpy(dtype=float, na_value=np.nan)
+    if len(scores) != len(df):
+        raise ValueError("'score' must return one score per cut of the output.")
+    return np.where(np.isnan(scores), -np.inf, scores)
+
+
+def is_antimonotone(score: Score, objective_function, data: pd.DataFrame) -> bool:
+    """
+    Check if the score of a cut is never above the score of its parent cuts.
+
+    Parameters:
+    - score (Score): The score of the cuts.
+    - objective_function: The objective function, only metric specs can be checked.
+    - data (pd.DataFrame): The data, the values of a sum must all be non-negative.
+
+    Returns:
+    - bool: True for n_rows, counts & sums of non-negative values, False otherwise.
+    """
+    if score == "n_rows":
+        return True
+    if not isinstance(score, str) or not metrics.is_metric_specs(objective_function):
+        return False
+
+    metric = objective_function.get(score)
+    if isinstance(metric, metrics.Count):
+        return True
+    if isinstance(metric, metrics.Sum):
+        return bool((data[metric.column].dropna() >= 0).all())
+    return False
+
+
+def child_targets(parent_targets: List[tuple], target_cols: List[str]) -> List[tuple]:
+    """The target columns of the children of each parent, in the order of target_cols & without duplicates."""
+    children = {}
+    for targets in parent_targets:
+        for col in target_cols:
+            if col not in targets:
+                children[tuple(c for c in target_cols if c in targets or c == col)] = None
+    return list(children)
+
+
+def group_rows(
+    data_codes: Dict[str, encoding.EncodedColumn],
+    combo: List[str],
+    groups: pd.DataFrame,
+) -> np.ndarray:
+    """
+    Flag the rows of some of the groups of a combination.
+
+    Parameters:
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+    - combo (List[str]): The columns of the combination.
+    - groups (pd.DataFrame): The groups, with the (decoded) combo columns.
+
+    Returns:
+    - np.ndarray: A boolean mask of the rows of the groups.
+    """
+    row_group_ids, n_groups, group_codes = encoding.group_ids(
+        [data_codes[col].codes for col in combo],
+        [data_codes[col].radix for col in combo],
+    )
+    group_index = pd.MultiIndex.from_arrays(group_codes)
+    wanted = pd.MultiIndex.from_arrays(
+        [data_codes[col].labels.get_indexer(pd.Index(groups[col].to_numpy())) for col in combo]
+    )
+
+    group_positions = group_index.get_indexer(wanted)
+    is_wanted = np.zeros(n_groups, dtype=bool)
+    is_wanted[group_positions[group_positions >= 0]] = True
+    return is_wanted[row_group_ids]
+
+
+def kth_best(scores: List[np.ndarray], k: int) -> Optional[float]:
+    """The k-th best score, or None when there are fewer than k scored cuts."""
+    all_scores = np.concatenate(scores) if scores else np.empty(0)
+    all_scores = all_scores[np.isfinite(all_scores)]
+    if len(all_scores) < k:
+        return None
+    return float(np.partition(all_scores, len(all_scores) - k)[len(all_scores) - k])
+
+
+def select_top(dfs: List[pd.DataFrame], scores: List[np.ndarray], k: int) -> List[np.ndarray]:
+    """
+    Select the k best cuts across the output of several combinations, ties keep their order.
+
+    Parameters:
+    - dfs (List[pd.DataFrame]): The output of each combination.
+    - scores (List[np.ndarray]): The score of each cut of each output (see score_cuts).
+    - k (int): The number of cuts to select.
+
+    Returns:
+    - List[np.ndarray]: The positions of the selected cuts of each output, in order.
+    """
+    combo_ids = np.concatenate([np.full(len(df), combo_i) for combo_i, df in enumerate(dfs)] + [np.empty(0, int)])
+    positions = np.concatenate([np.arange(len(df)) for df in dfs] + [np.empty(0, int)])
+    all_scores = np.concatenate(scores + [np.empty(0)])
+
+    order = np.argsort(-all_scores, kind="stable")
+    order = np.sort(order[np.isfinite(all_scores[order])][:k])
+    return [positions[order[combo_ids[order] == combo_i]] for combo_i in range(len(dfs))]
@@ -0,0 +1,317 @@
+"""
+Declarative, decomposable metric specs.
+
+Each metric declares the sufficient statistics it needs (ie: sum, count, sum of squares),
+so HSA can compute them once per group, merge them across combinations, and finalize
+the metric with vectorized NumPy instead of calling back into Python per combination.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import lists, sketches
+
+# How each sufficient statistic is computed from the (centered) raw values of a group.
+STAT_AGG_FUNCS = {
+    "count": "count",
+    "sum": "sum",
+    "csum": "sum",
+    "csumsq": "sum",
+    "min": "min",
+    "max": "max",
+}
+
+# How each sufficient statistic is merged across groups.
+STAT_ROLLUP_FUNCS = {
+    "count": "sum",
+    "sum": "sum",
+    "csum": "sum",  # sum of the values centered on a per-column shift
+    "csumsq": "sum",  # sum of squares of the values centered on a per-column shift
+    "min": "min",
+    "max": "max",
+    "hll": "max",  # each HyperLogLog register, see: sketches.py
+    "qbins": "sum",  # each bin count of a quantile histogram, see: sketches.py
+}
+
+# The sketch statistics & their number of columns, each column is merged with its STAT_ROLLUP_FUNCS.
+SKETCH_SIZES = {
+    "hll": 2**sketches.HLL_PRECISION,
+    "qbins": sketches.QUANTILE_BINS,
+}
+
+
+def stat_name(column: str, stat: str) -> str:
+    """Name of the column holding the sufficient statistic 'stat' of 'column'."""
+    return f"{column}__{stat}"
+
+
+def stat_columns(column: str, stat: str) -> List[str]:
+    """Names of the columns holding the sufficient statistic 'stat' of 'column', a column per cell of a sketch."""
+    if stat in SKETCH_SIZES:
+        return [f"{stat_name(column, stat)}_{i}" for i in range(SKETCH_SIZES[stat])]
+    return [stat_name(column, stat)]
+
+
+@dataclass(frozen=True)
+class Metric:
+    """Base class of the decomposable metrics.
+
+    Attributes:
+    -----------
+    column : str
+        The column the metric is computed over.
+    """
+
+    column: str
+
+    def statistics(self) -> List[Tuple[str, str]]:
+        """The (column, stat) sufficient statistics the metric needs."""
+        raise NotImplementedError
+
+    def finalize(self, stats: Dict[str, np.ndarray]) -> np.ndarray:
+        """Compute the metric from its merged sufficient statistics (keyed by stat_name)."""
+        raise NotImplementedError
+
+    def bounds(self, stats: Dict[str, np.ndarray]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """The lower & upper bound of an estimated metric, None for exact metrics."""
+        return None
+
+    def _stat(self, stats: Dict[str, np.ndarray], stat: str, column: str = None) -> np.ndarray:  # type: ignore
+        return np.asarray(stats[stat_name(column or self.column, stat)])
+
+
+@dataclass(frozen=True)
+class Sum(Metric):
+    def statistics(self):
+        return [(self.column, "sum")]
+
+    def finalize(self, stats):
+        return self._stat(stats, "sum")
+
+
+@dataclass(frozen=True)
+class Count(Metric):
+    """Count of the non-missing values of the column."""
+
+    def statistics(self):
+        return [(self.column, "count")]
+
+    def finalize(self, stats):
+        return self._stat(stats, "count")
+
+
+@dataclass(frozen=True)
+class Mean(Metric):
+    def statistics(self):
+        return [(self.column, "sum"), (self.column, "count")]
+
+    def finalize(self, stats):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._stat(stats, "sum") / self._stat(stats, "count")
+
+
+@dataclass(frozen=True)
+class Var(Metric):
+    ddof: int = 1
+
+    def statistics(self):
+        return [(self.column, "count"), (self.column, "csum"), (self.column, "csumsq")]
+
+    def finalize(self, stats):
+        count = self._stat(stats, "count").astype(float)
+        csum = self._stat(stats, "csum")
+        csumsq = self._stat(stats, "csumsq")
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = (csumsq - csum**2 / count) / (count - self.ddof)
+        var = np.where(count - self.ddof > 0, np.maximum(var, 0), np.nan)
+        return var
+
+
+@dataclass(frozen=True)
+class Std(Var):
+    def finalize(self, stats):
+        return np.sqrt(super().finalize(stats))
+
+
+@dataclass(frozen=True)
+class Min(Metric):
+    def statistics(self):
+        return [(self.column, "min")]
+
+    def finalize(self, stats):
+        return self._stat(stats, "min")
+
+
+@dataclass(frozen=True)
+class Max(Metric):
+    def statistics(self):
+        return [(self.column, "max")]
+
+    def finalize(self, stats):
+        return self._stat(stats, "max")
+
+
+@dataclass(frozen=True)
+class RatioOfSums(Metric):
+    """Ratio of the sum of 'column' over the sum of 'denominator'."""
+
+    denominator: str = None  # type: ignore
+
+    def statistics(self):
+        return [(self.column, "sum"), (self.denominator, "sum")]
+
+    def finalize(self, stats):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._stat(stats, "sum") / self._stat(stats, "sum", self.denominator)
+
+
+@dataclass(frozen=True)
+class Distinct(Metric):
+    """Estimated number of distinct values of the column, from HyperLogLog registers (see: sketches.py).
+
+    The estimates have a standard error of ~3.3%, bounds() is the ~95% interval.
+    """
+
+    def statistics(self):
+        return [(self.column, "hll")]
+
+    def finalize(self, stats):
+        return sketches.estimate_distinct(self._stat(stats, "hll"))[0]
+
+    def bounds(self, stats):
+        return sketches.estimate_distinct(self._stat(stats, "hll"))[1:]
+
+
+@dataclass(frozen=True)
+class Quantile(Metric):
+    """Estimated quantile q of the column, from a histogram over fixed logarithmic bins (see: sketches.py).
+
+    The counts of the bins are exact, so bounds() always holds the quantile of pandas' linear interpolation.
+    """
+
+    q: float = 0.5
+
+    def statistics(self):
+        return [(self.column, "qbins"), (self.column, "min"), (self.column, "max")]
+
+    def _estimate(self, stats):
+        group_min, group_max = self._stat(stats, "min"), self._stat(stats, "max")
+        return sketches.estimate_quantile(self._stat(stats, "qbins"), group_min, group_max, self.q)
+
+    def finalize(self, stats):
+        return self._estimate(stats)[0]
+
+    def bounds(self, stats):
+        return self._estimate(stats)[1:]
+
+
+# Named aggregation funcs (ie: pd.NamedAgg("tip", "mean")) & the metric they map to.
+NAMED_AGG_METRICS = {
+    "sum": Sum,
+    "count": Count,
+    "mean": Mean,
+    "var": Var,
+    "std": Std,
+    "min": Min,
+    "max": Max,
+}
+
+
+def is_metric_specs(objective_function) -> bool:
+    """
+    Check if the objective function is a dict of metric specs, ie: {name: Mean("tip")}.
+
+    Parameters:
+    - objective_function: The objective function supplied to HotSpotAnalyzer.
+
+    Returns:
+    - bool: True if the objective function is a dict of metric specs, False otherwise.
+    """
+    return isinstance(objective_function, dict)
+
+
+def to_metric(name: str, metric) -> Metric:
+    """
+    Convert a metric spec, a pd.NamedAgg or a (column, func) tuple to a Metric.
+
+    Parameters:
+    - name (str): The output name of the metric, used in error messages.
+    - metric: The metric spec, pd.NamedAgg or (column, func) tuple.
+
+    Returns:
+    - Metric: The metric spec.
+
+    Raises:
+    - ValueError: If the metric is malformed or is not decomposable.
+    """
+    if isinstance(metric, Metric):
+        return metric
+
+    if isinstance(metric, pd.NamedAgg):
+        metric = (metric.column, metric.aggfunc)
+    if not isinstance(metric, tuple) or len(metric) != 2:
+        raise ValueError(f"Metric '{name}' must be a Metric, a pd.NamedAgg or a (column, func) tuple.")
+
+    column, func = metric
+    if func not in NAMED_AGG_METRICS:
+        raise ValueError(
+            f"Metric '{name}' uses '{func}', which is not decomposable. Valid funcs: {', '.join(NAMED_AGG_METRICS)}"
+        )
+    return NAMED_AGG_METRICS[func](column)
+
+
+def validate_metrics(metrics: dict) -> Dict[str, Metric]:
+    """
+    Validate the metric specs and return them as {name: Metric}.
+
+    Parameters:
+    - metrics (dict): The metric specs, pd.NamedAgg or (column, func) tuples keyed by output name.
+
+    Returns:
+    - Dict[str, Metric]: The validated metric specs.
+    """
+    return {name: to_metric(name, metric) for name, metric in metrics.items()}
+
+
+def statistics(metrics: Dict[str, Metric]) -> List[Tuple[str, str]]:
+    """
+    The unique (column, stat) sufficient statistics required by the metrics.
+
+    Parameters:
+    - metrics (Dict[str, Metric]): The validated metric specs.
+
+    Returns:
+    - List[Tuple[str, str]]: The sufficient statistics, in order of first use.
+    """
+    return lists.unique([stat for metric in metrics.values() for stat in metric.statistics()])
+
+
+def finalize(stats: pd.DataFrame, metrics: Dict[str, Metric]) -> pd.DataFrame:
+    """
+    Finalize every metric from a frame of merged sufficient statistics.
+
+    Parameters:
+    - stats (pd.DataFrame): One row per group, with a column per sufficient statistic (or sketch cell).
+    - metrics (Dict[str, Metric]): The validated metric specs.
+
+    Returns:
+    - pd.DataFrame: One row per group, with a column per metric, & '<name>_lower' & '<name>_upper'
+      columns after them for the bounds of estimated metrics (ie: Distinct & Quantile).
+    """
+    sketch_stats = [(column, stat) for column, stat in statistics(metrics) if stat in SKETCH_SIZES]
+    sketch_cols = set(col for column, stat in sketch_stats for col in stat_columns(column, stat))
+    stat_arrays = {column: stats[column].to_numpy() for column in stats.columns if column not in sketch_cols}
+    # The cells of each sketch are read as a single (n_groups, size) array
+    for column, stat in sketch_stats:
+        stat_arrays[stat_name(column, stat)] = stats[stat_columns(column, stat)].to_numpy()
+
+    output = {name: metric.finalize(stat_arrays) for name, metric in metrics.items()}
+    for name, metric in metrics.items():
+        metric_bounds = metric.bounds(stat_arrays)
+        if metric_bounds is not None:
+            output[f"{name}_lower"], output[f"{name}_upper"] = metric_bounds
+    return pd.DataFrame(output, index=stats.index)
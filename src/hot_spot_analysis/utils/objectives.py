@@ -0,0 +1,94 @@
+"""
+A named collection of objective functions, run on the same grouped data frame of each combination.
+
+HotSpotAnalyzer turns a dict of functions (ie: {"revenue": revenue_func, "latency": latency_func}) into
+an ObjectiveSet, so the data is prepared, the combinations are built & each combination is grouped
+(and its n_rows counted) once for every function, instead of once per HotSpotAnalyzer. The outputs
+of the functions are joined column-wise, and each function is timed as its own 'objective:<name>'
+phase (see HotSpotAnalyzer.profile).
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from hot_spot_analysis.utils import profiling
+
+
+def is_objective_set(objective_function) -> bool:
+    """
+    Check if the objective function is a dict of objective functions, ie: {name: func}, rather than metric specs.
+
+    Parameters:
+    - objective_function: The objective function supplied to HotSpotAnalyzer.
+
+    Returns:
+    - bool: True for a non-empty dict whose values are all callables, False otherwise.
+    """
+    return (
+        isinstance(objective_function, dict)
+        and len(objective_function) > 0
+        and all(callable(func) for func in objective_function.values())
+    )
+
+
+def key_names(grouped) -> List[str]:
+    """The names of the grouping keys of a grouped data frame."""
+    keys = grouped.keys if isinstance(grouped.keys, list) else [grouped.keys]
+    return [getattr(key, "name", key) for key in keys]
+
+
+@dataclass(frozen=True)
+class ObjectiveSet:
+    """Objective functions run on the same grouped data frame, with their outputs joined column-wise.
+
+    Attributes:
+    -----------
+    functions : dict[str, Callable]
+        The objective functions by name, each run on a grouped data frame like a single objective function.
+    """
+
+    functions: Dict[str, Callable]
+
+    def __call__(
+        self,
+        grouped,
+        profiler: Optional[profiling.Profiler] = None,
+        combination: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Run every function on a grouped data frame, and join their outputs on the groups.
+
+        Parameters:
+        - grouped (DataFrameGroupBy): The grouped data frame of a combination.
+        - profiler (profiling.Profiler, optional): Records an 'objective:<name>' event for each function.
+        - combination (List[str], optional): The combination of the events.
+
+        Returns:
+        - pd.DataFrame: The columns of every output, indexed by the groups.
+
+        Raises:
+        - ValueError: If the outputs of several functions share a column.
+        """
+        if profiler is None:
+            profiler = profiling.Profiler()
+
+        names = key_names(grouped)
+        outputs = []
+        for name, func in self.functions.items():
+            with profiler.phase(f"objective:{name}", combination, rows_in=len(grouped.obj)) as event:
+                output = func(grouped)
+                event.rows_out = len(output)
+            if isinstance(output, pd.Series):
+                output = output.to_frame(name)
+            elif all(col in output.columns for col in names):
+                # Outputs with the groups as columns (ie: as_index=False) are joined on them too
+                output = output.set_index(names)
+            outputs.append(output)
+
+        columns = [col for output in outputs for col in output.columns]
+        duplicated = sorted(set(col for col in columns if columns.count(col) > 1))
+        if duplicated:
+            raise ValueError(f"The objective functions must output distinct columns, found several: {duplicated}")
+        return pd.concat(outputs, axis=1)
@@ -0,0 +1,231 @@
+"""
+Functions to run the objective function over the combinations in a pool of processes.
+
+The columns of the data are written once to memory-mapped .npy files, so every worker maps
+the same pages instead of receiving its own pickled copy of the DataFrame.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, grouped_df, profiling
+
+# Memory-mapped files are written to RAM backed storage when it is available
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# The nullable arrays, which are shared as their values & their mask of missing values
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+# The frames a worker has already mapped, keyed by SharedFrame.frame_id
+_attached_frames: Dict[str, Tuple[pd.DataFrame, Dict[str, pd.Series]]] = {}
+
+
+@dataclass
+class SharedFrame:
+    """A DataFrame whose columns are stored in memory-mapped .npy files.
+
+    Attributes:
+    -----------
+    frame_id : str
+        A unique id, so workers only map each frame once.
+    directory : str
+        The directory holding the .npy files.
+    columns : list[str]
+        The columns of the data, in order.
+    labels : dict[str, pd.Index]
+        The labels of the columns stored as integer codes (ie: strings & categoricals).
+    masked_dtypes : dict[str, pd.api.extensions.ExtensionDtype]
+        The dtypes of the nullable columns (ie: Int64), stored as their values & their mask.
+    pickled : list[str]
+        The columns of other extension dtypes (ie: datetimes with a time zone), stored as pickles.
+    key_labels : dict[str, pd.Index]
+        The labels of the grouping keys, which are stored as integer codes.
+    """
+
+    frame_id: str
+    directory: str
+    columns: List[str]
+    labels: Dict[str, pd.Index] = field(default_factory=dict)
+    masked_dtypes: Dict[str, pd.api.extensions.ExtensionDtype] = field(default_factory=dict)
+    pickled: List[str] = field(default_factory=list)
+    key_labels: Dict[str, pd.Index] = field(default_factory=dict)
+
+    def path(self, kind: str, position: int = 0, suffix: str = ".npy") -> str:
+        """Path of the file of the column ('column'), its mask ('mask'), grouping key ('key') or index at position."""
+        return os.path.join(self.directory, f"{kind}_{position}{suffix}")
+
+
+def resolve_n_jobs(n_jobs: int) -> int:
+    """Return the number of workers for n_jobs, where -1 means one worker per CPU."""
+    if n_jobs < 0:
+        return max(os.cpu_count() or 1, 1)
+    return max(n_jobs, 1)
+
+
+def share_frame(data: pd.DataFrame, data_codes: Dict[str, encoding.EncodedColumn]) -> SharedFrame:
+    """
+    Write the columns of the data & the grouping codes to memory-mapped .npy files.
+
+    Numeric, boolean & datetime columns are written as is, nullable columns (ie: Int64) as
+    their values & their mask. String & categorical columns are written as integer
+    codes, and workers rebuild them as categoricals over the same labels. Columns of other
+    extension dtypes & the index are pickled.
+
+    Parameters:
+    - data (pd.DataFrame): The data to share.
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+
+    Returns:
+    - SharedFrame: A handle that is cheap to pickle & send to the workers.
+    """
+    directory = tempfile.mkdtemp(prefix="hsa_shared_", dir=SHARED_DIR)
+    shared = SharedFrame(frame_id=uuid.uuid4().hex, directory=directory, columns=list(data.columns))
+
+    for column_i, column in enumerate(shared.columns):
+        values = data[column]
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biufcmM":
+            np.save(shared.path("column", column_i), values.to_numpy())
+        elif isinstance(values.array, MASKED_ARRAYS):
+            # The values under the mask are arbitrary, ie: 0
+            np.save(shared.path("column", column_i), values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0))
+            np.save(shared.path("mask", column_i), values.isna().to_numpy())
+            shared.masked_dtypes[column] = values.dtype
+        elif values.dtype == object or isinstance(values.dtype, (pd.StringDtype, pd.CategoricalDtype)):
+            encoded_column = encoding.encode_column(values)
+            np.save(shared.path("column", column_i), encoded_column.codes)
+            shared.labels[column] = encoded_column.labels
+        else:
+            with open(shared.path("column", column_i, ".pkl"), "wb") as file:
+                pickle.dump(values.array, file)
+            shared.pickled.append(column)
+
+    with open(shared.path("index", suffix=".pkl"), "wb") as file:
+        pickle.dump(data.index, file)
+
+    for key_i, (column, encoded_column) in enumerate(data_codes.items()):
+        np.save(shared.path("key", key_i), encoded_column.codes)
+        shared.key_labels[column] = encoded_column.labels
+
+    return shared
+
+
+def attach_frame(shared: SharedFrame) -> Tuple[pd.DataFrame, Dict[str, pd.Series]]:
+    """
+    Map a shared frame into this process without copying its columns.
+
+    Parameters:
+    - shared (SharedFrame): The shared frame (see share_frame).
+
+    Returns:
+    - Tuple[pd.DataFrame, Dict[str, pd.Series]]: The data & the grouping key of each grouping column.
+    """
+    if shared.frame_id in _attached_frames:
+        return _attached_frames[shared.frame_id]
+
+    data_columns = {}
+    for column_i, column in enumerate(shared.columns):
+        if column in shared.pickled:
+            with open(shared.path("column", column_i, ".pkl"), "rb") as file:
+                data_columns[column] = pickle.load(file)
+            continue
+        values = np.load(shared.path("column", column_i), mmap_mode="r")
+        if column in shared.labels:
+            values = pd.Categorical.from_codes(values, categories=shared.labels[column])
+        elif column in shared.masked_dtypes:
+            mask = np.load(shared.path("mask", column_i), mmap_mode="r")
+            values = shared.masked_dtypes[column].construct_array_type()(values, mask)
+        data_columns[column] = values
+    with open(shared.path("index", suffix=".pkl"), "rb") as file:
+        index = pickle.load(file)
+    data = pd.DataFrame(data_columns, index=index, copy=False)
+
+    data_keys = {}
+    for key_i, (column, labels) in enumerate(shared.key_labels.items()):
+        codes = np.load(shared.path("key", key_i), mmap_mode="r")
+        data_keys[column] = encoding.EncodedColumn(codes=codes, labels=labels).to_categorical(column, data.index)
+
+    # Only keep the most recent frame mapped
+    _attached_frames.clear()
+    _attached_frames[shared.frame_id] = (data, data_keys)
+    return data, data_keys
+
+
+def release_frame(shared: SharedFrame):
+    """Delete the memory-mapped files of a shared frame."""
+    _attached_frames.pop(shared.frame_id, None)
+    shutil.rmtree(shared.directory, ignore_errors=True)
+
+
+def run_shared_combo(
+    shared: SharedFrame,
+    objective_function: Callable,
+    combo: List[str],
+    rows: Optional[np.ndarray] = None,
+) -> Tuple[pd.DataFrame, List[profiling.Event]]:
+    """Run the objective function on one combination of a shared frame, this runs in the workers.
+
+    The output is returned with the events of the combination (see grouped_df.run_objective_function),
+    which the workers can't record on the profiler of the parent process.
+    """
+    data, data_keys = attach_frame(shared)
+    profiler = profiling.Profiler()
+    output = grouped_df.run_objective_function(data, data_keys, combo, objective_function, rows=rows, profiler=profiler)
+    return output, profiler.events
+
+
+def run_combos(
+    data: pd.DataFrame,
+    data_codes: Dict[str, encoding.EncodedColumn],
+    combinations: List[List[str]],
+    objective_function: Callable,
+    n_jobs: int = -1,
+    executor: Optional[Executor] = None,
+    row_masks: Optional[List[Optional[np.ndarray]]] = None,
+    profiler: Optional[profiling.Profiler] = None,
+) -> List[pd.DataFrame]:
+    """
+    Run the objective function on every combination in a pool of processes.
+
+    Parameters:
+    - data (pd.DataFrame): The data to group.
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+    - combinations (List[List[str]]): The combinations to run.
+    - objective_function (Callable): The function to run on each grouped data frame, it must be picklable.
+    - n_jobs (int, optional): The number of processes, -1 uses all CPUs. Defaults to -1.
+    - executor (Executor, optional): An executor to use instead of a new ProcessPoolExecutor.
+    - row_masks (List[np.ndarray], optional): A boolean mask of the rows to group, for each combination.
+      Defaults to every row.
+    - profiler (profiling.Profiler, optional): Records the events of each combination sent back by the workers,
+      in the order of combinations. Their peak_rss_delta is the one of the worker.
+
+    Returns:
+    - List[pd.DataFrame]: The output of each combination, in the order of combinations.
+    """
+    shared = share_frame(data, data_codes)
+    if row_masks is None:
+        row_masks = [None] * len(combinations)
+    task_args = ([shared] * len(combinations), [objective_function] * len(combinations), combinations, row_masks)
+    try:
+        # Executor.map yields the results in the order of the combinations, whatever order they finish in
+        if executor is not None:
+            results = list(executor.map(run_shared_combo, *task_args))
+        else:
+            with ProcessPoolExecutor(max_workers=resolve_n_jobs(n_jobs)) as pool:
+                results = list(pool.map(run_shared_combo, *task_args))
+    finally:
+        release_frame(shared)
+
+    if profiler is not None:
+        for _, events in results:
+            for event in events:
+                profiler.record(event)
+    return [output for output, _ in results]
@@ -0,0 +1,186 @@
+"""
+Sort-based, shared-prefix rollups of the combinations (PipeSort style scheduling).
+
+The combinations are covered by chains of nested combinations, ie: [a] < [a, b] < [a, b, c]. Only
+the largest combination of a chain is rolled up with group ids, by its columns in order of appearance
+(a, b, c), which sorts its groups by those columns (see encoding.group_ids). Every other combination
+of the chain is a prefix of that sort, so its groups are runs of equal codes in the sorted groups of
+the next larger combination: they are reduced by scanning the run boundaries rather than by building
+the group ids of each combination.
+
+The chains are built from maximum matchings between consecutive levels of combinations, which for
+the combinations of create_combos gives as many chains (ie: sorts) as the largest level, C(n, n/2)
+for a full lattice of n target columns, instead of a pass per combination.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, lists
+
+# Reduce the partial results of a run of rows, see: metrics.STAT_ROLLUP_FUNCS
+REDUCEAT_FUNCS = {
+    "sum": np.add,
+    "min": np.fmin,
+    "max": np.fmax,
+}
+
+
+def combo_cols(combo: List[str]) -> frozenset:
+    """The columns a combination is sorted by, 'Overall' is constant and never splits a run."""
+    return frozenset(col for col in combo if col != "Overall")
+
+
+def is_prefix(lower: List[str], upper: List[str]) -> bool:
+    """Check if the columns of a combination are the first columns of a larger one, 'Overall' aside."""
+    lower_cols = [col for col in lower if col != "Overall"]
+    return lower_cols == [col for col in upper if col != "Overall"][: len(lower_cols)]
+
+
+def match_level(lower: List[List[str]], upper: List[List[str]]) -> Dict[int, int]:
+    """
+    Match the combinations of a level to the combinations of the next level that contain them.
+
+    Prefixes are matched first where possible, so the sort of a chain orders the columns of its
+    combinations like the combinations do, and their groups don't need to be sorted again.
+
+    Parameters:
+    - lower (List[List[str]]): The combinations of the lower level.
+    - upper (List[List[str]]): The combinations of the upper level.
+
+    Returns:
+    - Dict[int, int]: A maximum matching, from the index in upper to the index in lower.
+    """
+    candidates = [
+        sorted(
+            [lower_i for lower_i, combo in enumerate(lower) if combo_cols(combo) < combo_cols(upper_combo)],
+            key=lambda lower_i: not is_prefix(lower[lower_i], upper_combo),
+        )
+        for upper_combo in upper
+    ]
+    matched: Dict[int, int] = {}  # lower -> upper
+
+    def augment(upper_i: int, visited: set) -> bool:
+        for lower_i in candidates[upper_i]:
+            if lower_i in visited:
+                continue
+            visited.add(lower_i)
+            if lower_i not in matched or augment(matched[lower_i], visited):
+                matched[lower_i] = upper_i
+                return True
+        return False
+
+    for upper_i in range(len(upper)):
+        augment(upper_i, set())
+    return {upper_i: lower_i for lower_i, upper_i in matched.items()}
+
+
+def chain_cover(combinations: List[List[str]]) -> List[List[int]]:
+    """
+    Cover the combinations with chains of nested combinations, each chain is rolled up from a single sort.
+
+    Parameters:
+    - combinations (List[List[str]]): The combinations to cover.
+
+    Returns:
+    - List[List[int]]: The chains, each a list of combination indices from the smallest combination up.
+    """
+    cols = [combo_cols(combo) for combo in combinations]
+    levels: Dict[int, List[int]] = {}
+    for combo_i, combo_set in enumerate(cols):
+        levels.setdefault(len(combo_set), []).append(combo_i)
+
+    chains: List[List[int]] = []
+    chain_of: Dict[int, int] = {}  # combo index -> index of its chain
+    previous: List[int] = []
+    for size in sorted(levels):
+        level = levels[size]
+        matching = match_level(
+            [combinations[combo_i] for combo_i in previous], [combinations[combo_i] for combo_i in level]
+        )
+        for upper_i, combo_i in enumerate(level):
+            if upper_i in matching:
+                chain_i = chain_of[previous[matching[upper_i]]]
+            else:
+                chain_i = len(chains)
+                chains.append([])
+            chains[chain_i].append(combo_i)
+            chain_of[combo_i] = chain_i
+        previous = level
+    return chains
+
+
+def sort_order(chain: List[List[str]]) -> List[str]:
+    """The columns of a chain in order of appearance, so each combination of the chain is a prefix."""
+    return lists.unique([col for combo in chain for col in combo])
+
+
+def reorder(
+    partial: Dict[str, np.ndarray],
+    encoded: Dict[str, encoding.EncodedColumn],
+    combo: List[str],
+    order: List[str],
+) -> Dict[str, np.ndarray]:
+    """
+    Sort the groups of a combination by its columns, where the sort_order of its chain orders them differently.
+
+    Each row is a group, so the group ids of the combination (see encoding.group_ids) are the position
+    of each row in the lexicographic order of its codes, without sorting them.
+    """
+    if combo == [col for col in order if col in combo]:
+        return partial
+    codes = [partial[col] for col in combo]
+    row_group_ids, n_groups, _ = encoding.group_ids(codes, [encoded[col].radix for col in combo])
+    positions = np.empty(n_groups, dtype=np.int64)
+    positions[row_group_ids] = np.arange(n_groups)
+    return {column: values[positions] for column, values in partial.items()}
+
+
+def rollup_chain(
+    top: pd.DataFrame,
+    encoded: Dict[str, encoding.EncodedColumn],
+    chain: List[List[str]],
+    rollup_funcs: Dict[str, str],
+) -> List[pd.DataFrame]:
+    """
+    Roll up every combination of a chain from the partial results of its largest combination.
+
+    Parameters:
+    - top (pd.DataFrame): Partial results of the largest combination of the chain, with the codes of its
+      columns sorted in the sort_order of the chain (see rollup.rollup), missing groups included.
+    - encoded (Dict[str, encoding.EncodedColumn]): The encoded combination columns.
+    - chain (List[List[str]]): Nested combinations, from the smallest up.
+    - rollup_funcs (Dict[str, str]): How each partial result is re-aggregated (see rollup.stat_rollup_funcs).
+
+    Returns:
+    - List[pd.DataFrame]: One row per group of each combination with its codes, n_rows & the sufficient
+      statistics, in the lexicographic order of its codes like rollup.rollup, missing groups included.
+    """
+    order = sort_order(chain)
+    current = {column: top[column].to_numpy() for column in order + list(rollup_funcs)}
+
+    # From the top down, each combination is reduced from the sorted groups of the next larger one
+    outputs = [(chain[-1], current)]
+    for combo in reversed(chain[:-1]):
+        run_starts = np.zeros(len(current["n_rows"]), dtype=bool)
+        run_starts[:1] = True
+        for col in combo_cols(combo):
+            codes = current[col]
+            run_starts[1:] |= codes[1:] != codes[:-1]
+        starts = np.flatnonzero(run_starts)
+
+        reduced = {col: current[col][starts] for col in order if col in current}
+        for column, func in rollup_funcs.items():
+            values = current[column]
+            reduced[column] = REDUCEAT_FUNCS[func].reduceat(values, starts) if len(starts) else values[:0]
+        # 'Overall' & the columns of larger combinations are kept, the smaller combinations only read their own
+        current = reduced
+        outputs.append((combo, current))
+
+    partials = []
+    for combo, partial in reversed(outputs):
+        partial = reorder({column: partial[column] for column in combo + list(rollup_funcs)}, encoded, combo, order)
+        partials.append(pd.DataFrame(partial))
+    return partials
@@ -0,0 +1,161 @@
+"""
+A Polars backend that runs every combination of decomposable metric specs as a lazy group-by query.
+
+The queries of all the combinations (& of the labels of the grouping columns) are collected at once
+with pl.collect_all, so they share a single scan of the data and run on Polars' multi-threaded engine.
+Each query aggregates the sufficient statistics of the metrics (see metrics.py), which are finalized
+like the pandas rollup (see rollup.finalize), so the output matches the pandas backend.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, lists, metrics, rollup
+
+
+def is_polars_frame(data) -> bool:
+    """Check if the data is a Polars DataFrame or LazyFrame, without importing polars."""
+    return type(data).__module__.split(".")[0] == "polars"
+
+
+def import_polars():
+    """Import polars, which is an optional dependency."""
+    try:
+        import polars as pl
+    except ImportError as error:
+        raise ImportError("The polars backend requires polars: pip install polars") from error
+    return pl
+
+
+def to_lazy(data):
+    """
+    Return the data as a Polars LazyFrame.
+
+    Parameters:
+    - data: A pandas DataFrame, or a Polars DataFrame or LazyFrame.
+
+    Returns:
+    - pl.LazyFrame: The data, pandas DataFrames are converted (ie: copied) to Polars.
+    """
+    pl = import_polars()
+    if isinstance(data, pl.LazyFrame):
+        return data
+    if isinstance(data, pl.DataFrame):
+        return data.lazy()
+    return pl.from_pandas(data).lazy()
+
+
+def to_pandas(data) -> pd.DataFrame:
+    """Return a Polars DataFrame or LazyFrame as a pandas DataFrame, ie: to run it on the pandas backend."""
+    if hasattr(data, "collect"):
+        data = data.collect()
+    return data.to_pandas()
+
+
+def get_columns(data) -> List[str]:
+    """The columns of a Polars DataFrame or LazyFrame."""
+    return data.collect_schema().names()
+
+
+def centered_name(column: str) -> str:
+    """Name of the column holding the values of 'column' centered on its shift, see: rollup.compute_shifts."""
+    return f"{column}__centered"
+
+
+def stat_expr(column: str, stat: str, dtype=None):
+    """
+    The Polars aggregation of a sufficient statistic of a column at the finest cut, see: metrics.STAT_AGG_FUNCS.
+
+    The centered statistics (csum & csumsq) read the centered column of the metric column, see: centered_name.
+    Like the pandas rollup (see rollup.to_values), the min & max of a numeric column keep its dtype (the
+    Polars dtype of the column), the sum of an integer or boolean column is an Int64, & both are floats
+    otherwise.
+    """
+    pl = import_polars()
+    values = pl.col(column).cast(pl.Float64)
+    if stat == "count":
+        expr = pl.col(column).count().cast(pl.Int64)
+    elif stat == "sum":
+        is_integer = dtype is not None and (dtype.is_integer() or dtype == pl.Boolean)
+        expr = (pl.col(column).cast(pl.Int64) if is_integer else values).sum()
+    elif stat == "csum":
+        expr = pl.col(centered_name(column)).sum()
+    elif stat == "csumsq":
+        expr = (pl.col(centered_name(column)) ** 2).sum()
+    elif stat in ["min", "max"]:
+        expr = getattr(pl.col(column) if dtype is not None and dtype.is_numeric() else values, stat)()
+    else:
+        raise ValueError(f"Unknown sufficient statistic: {stat}")
+    return expr.alias(metrics.stat_name(column, stat))
+
+
+def rollup_expr(column: str, func: str):
+    """The Polars re-aggregation of a partial result, see: rollup.stat_rollup_funcs."""
+    pl = import_polars()
+    return getattr(pl.col(column), func)().alias(column)
+
+
+def run_combos(
+    data,
+    combinations: List[List[str]],
+    metric_specs: Dict[str, metrics.Metric],
+) -> Tuple[List[pd.DataFrame], Dict[str, encoding.EncodedColumn]]:
+    """
+    Compute every combination with lazy Polars group-by queries, collected at once.
+
+    Like rollup.rollup_combos, the data is aggregated once at its finest cut (keeping the groups with
+    missing values), and every combination re-aggregates that cached cut instead of the raw rows.
+
+    Parameters:
+    - data: The raw data, a pandas DataFrame or a Polars DataFrame or LazyFrame.
+    - combinations (List[List[str]]): The combinations to compute.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+
+    Returns:
+    - Tuple[List[pd.DataFrame], Dict[str, encoding.EncodedColumn]]: The output for each combination,
+      in the order of combinations, & the labels of each grouping column (with no codes).
+    """
+    pl = import_polars()
+    lazy = to_lazy(data)
+    data_cols = get_columns(lazy)
+    base_cols = lists.unique([col for combo in combinations for col in combo])
+    # 'Overall' is a virtual column, see: encoding.encode_columns
+    virtual_cols = [col for col in base_cols if col not in data_cols]
+
+    # The values are centered on the mean of every row before grouping, like rollup.compute_shifts
+    stats = metrics.statistics(metric_specs)
+    centered_cols = lists.unique([column for column, stat in stats if stat in ["csum", "csumsq"]])
+    centered_exprs = [
+        (pl.col(column).cast(pl.Float64) - pl.col(column).cast(pl.Float64).mean()).alias(centered_name(column))
+        for column in centered_cols
+    ]
+
+    label_cols = [col for col in base_cols if col in data_cols]
+    schema = lazy.collect_schema()
+    base_exprs = [pl.len().cast(pl.Int64).alias("n_rows")]
+    base_exprs += [stat_expr(column, stat, schema[column]) for column, stat in stats]
+    centered = lazy.with_columns(centered_exprs)
+    base = centered.group_by(label_cols).agg(base_exprs) if label_cols else centered.select(base_exprs)
+    base = base.with_columns([pl.lit("Overall").alias(col) for col in virtual_cols]).cache()
+
+    rollup_exprs = [rollup_expr(column, func) for column, func in rollup.stat_rollup_funcs(metric_specs).items()]
+    combo_queries = [base.group_by(combo).agg(rollup_exprs).drop_nulls(combo).sort(combo) for combo in combinations]
+
+    label_queries = [base.select(pl.col(col).drop_nulls().unique().sort()) for col in label_cols]
+
+    # A single collect runs the queries in parallel, and shares the cached finest cut across them
+    frames = pl.collect_all(combo_queries + label_queries)
+
+    encoded = {col: encoding.constant_column("Overall", 0) for col in virtual_cols}
+    for col, frame in zip(label_cols, frames[len(combinations) :]):
+        labels = pd.Index(frame.to_series().to_pandas()).rename(None)
+        encoded[col] = encoding.EncodedColumn(codes=np.empty(0, dtype=np.int64), labels=labels)
+
+    outputs = []
+    for combo, frame in zip(combinations, frames[: len(combinations)]):
+        partial = frame.to_pandas()
+        output = partial[combo + ["n_rows"]]
+        outputs.append(pd.concat([output, metrics.finalize(partial, metric_specs)], axis=1))
+    return outputs, encoded
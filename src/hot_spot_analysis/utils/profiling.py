@@ -0,0 +1,142 @@
+"""
+Structured timing & memory events of each phase of HSA, see: HotSpotAnalyzer.profile.
+
+Each phase (ie: build_data, or the groupby of a combination) is recorded as an Event with its wall
+time, rows in & out, number of groups and the growth of the peak RSS of the process. Callbacks are
+called with each event as it is recorded, ie: to ship them to a metrics system.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterator, List, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+
+# The columns of an event that are summed over the events of a phase
+COUNT_COLS = ["rows_in", "rows_out", "n_groups"]
+
+
+@dataclass
+class Event:
+    """The timing & memory of a phase of HSA.
+
+    Attributes:
+    -----------
+    phase : str
+        The name of the phase, ie: 'build_data', 'groupby', 'objective' or 'lag'.
+    combination : list[str], optional
+        The combination of the phase, for the phases run once per combination.
+    wall_time : float
+        The wall time of the phase in seconds.
+    rows_in : int, optional
+        The number of rows the phase read.
+    rows_out : int, optional
+        The number of rows the phase output.
+    n_groups : int, optional
+        The number of groups of the combination.
+    peak_rss_delta : int, optional
+        The growth of the peak RSS of the process during the phase in bytes, missing where unavailable.
+    """
+
+    phase: str
+    combination: Optional[List[str]] = None
+    wall_time: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    n_groups: Optional[int] = None
+    peak_rss_delta: Optional[int] = None
+
+
+def peak_rss() -> Optional[int]:
+    """The peak resident set size of the process in bytes, None where the resource module is missing."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+@dataclass
+class Profiler:
+    """Records the events of a run, and calls the callbacks with each of them.
+
+    Attributes:
+    -----------
+    callbacks : list[Callable[[Event], None]]
+        The functions called with each event as it is recorded.
+    events : list[Event]
+        The events recorded so far, in order.
+    """
+
+    callbacks: List[Callable[[Event], None]] = field(default_factory=list)
+    events: List[Event] = field(default_factory=list)
+
+    @contextmanager
+    def phase(
+        self,
+        phase: str,
+        combination: Optional[List[str]] = None,
+        rows_in: Optional[int] = None,
+    ) -> Iterator[Event]:
+        """
+        Time a phase, the event it yields can be updated with the rows_out & n_groups of the phase.
+
+        Parameters:
+        - phase (str): The name of the phase.
+        - combination (List[str], optional): The combination of the phase.
+        - rows_in (int, optional): The number of rows the phase reads.
+
+        Returns:
+        - Iterator[Event]: The event of the phase, recorded once the phase ends.
+        """
+        event = Event(phase=phase, combination=combination, rows_in=rows_in)
+        rss_start = peak_rss()
+        start = time.perf_counter()
+        yield event
+
+        event.wall_time = time.perf_counter() - start
+        rss_end = peak_rss()
+        if rss_start is not None and rss_end is not None:
+            event.peak_rss_delta = rss_end - rss_start
+        self.record(event)
+
+    def record(self, event: Event):
+        """Record an event, and call the callbacks with it."""
+        self.events.append(event)
+        for callback in self.callbacks:
+            callback(event)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the events as a DataFrame, one row per event."""
+        df = pd.DataFrame([asdict(event) for event in self.events], columns=list(Event.__dataclass_fields__))
+        df["wall_time"] = df["wall_time"].astype(float)
+        return df.astype({col: "Int64" for col in COUNT_COLS + ["peak_rss_delta"]})
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summarize the events by phase, in the order the phases first ran.
+
+        Returns:
+        - pd.DataFrame: One row per phase with its number of events, total & max wall time, total rows
+          in & out, total groups and max peak RSS delta. Totals are missing where no event had a value.
+        """
+        grouped = self.to_frame().groupby("phase", sort=False)
+        summary = pd.concat(
+            [
+                grouped.size().rename("events"),
+                grouped["wall_time"].sum(),
+                grouped["wall_time"].max().rename("max_wall_time"),
+                grouped[COUNT_COLS].sum(min_count=1),
+                grouped["peak_rss_delta"].max(),
+            ],
+            axis=1,
+        )
+        return summary.reset_index()
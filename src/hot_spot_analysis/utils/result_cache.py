@@ -0,0 +1,270 @@
+"""
+A persistent on-disk cache of the output of each combination.
+
+Entries are Parquet files keyed by a hash of the data, the combination & the objective function,
+so re-running HSA on unchanged inputs reads each combination back instead of recomputing it.
+The least recently used entries are evicted once the cache grows past its size limit.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import types
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+ENTRY_SUFFIX = ".parquet"
+
+
+def hash_data(data: pd.DataFrame, columns: List[str]) -> str:
+    """
+    Fast content hash of columns of the data, with their names & dtypes.
+
+    Parameters:
+    - data (pd.DataFrame): The data.
+    - columns (List[str]): The columns to hash.
+
+    Returns:
+    - str: The hex digest of the columns.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(len(data)).encode())
+    for column in columns:
+        digest.update(f"{column}:{data[column].dtype}".encode())
+        digest.update(pd.util.hash_pandas_object(data[column], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# Values whose repr is their definition, & that are hashed as such
+PLAIN_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+
+def update_digest(digest, value, globals_: Optional[dict] = None, seen: Optional[set] = None):
+    """
+    Add the definition of a value to a digest: functions by their code, & everything they depend on.
+
+    Functions are hashed by their code, constants, defaults, closure values & the globals their code
+    reads (functions of the same module & plain values), bound methods with the state of their instance,
+    partials with their arguments, & objects by their type & attributes, recursively.
+
+    Parameters:
+    - digest: The hashlib digest to update.
+    - value: The value to hash.
+    - globals_ (dict, optional): The globals of the function whose code is hashed, for the names it reads.
+    - seen (set, optional): The ids of the functions & objects already hashed, for recursive definitions.
+
+    Raises:
+    - TypeError: If the value can't be hashed deterministically, ie: an object that can't be pickled.
+    """
+    seen = set() if seen is None else seen
+    if isinstance(value, PLAIN_TYPES):
+        digest.update(f"{type(value).__name__}:{value!r}".encode())
+        return
+    if isinstance(value, (tuple, list, set, frozenset)):
+        items = sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value
+        digest.update(f"{type(value).__name__}[".encode())
+        for item in items:
+            update_digest(digest, item, globals_, seen)
+        digest.update(b"]")
+        return
+    if isinstance(value, dict):
+        digest.update(b"dict{")
+        for key, item in sorted(value.items(), key=lambda key_item: repr(key_item[0])):
+            update_digest(digest, key, globals_, seen)
+            update_digest(digest, item, globals_, seen)
+        digest.update(b"}")
+        return
+    if isinstance(value, types.CodeType):
+        digest.update(value.co_code)
+        digest.update(repr(value.co_names).encode())
+        update_digest(digest, value.co_consts, globals_, seen)
+        # The globals the code reads, ie: helper functions & module level constants
+        for name in value.co_names:
+            if globals_ is not None and name in globals_:
+                global_value = globals_[name]
+                if isinstance(global_value, types.FunctionType) and global_value.__globals__ is not globals_:
+                    # Functions of other modules (ie: libraries) are hashed by their name, not their code
+                    digest.update(f"global:{name}={global_value.__module__}.{global_value.__qualname__}".encode())
+                elif isinstance(global_value, (types.FunctionType, functools.partial) + PLAIN_TYPES):
+                    digest.update(f"global:{name}".encode())
+                    update_digest(digest, global_value, globals_, seen)
+        return
+    if isinstance(value, types.ModuleType):
+        digest.update(f"module:{value.__name__}".encode())
+        return
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+        return
+    if isinstance(value, np.ndarray):
+        digest.update(f"{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+        return
+
+    if id(value) in seen:
+        digest.update(b"<recursive>")
+        return
+    seen.add(id(value))
+
+    if isinstance(value, functools.partial):
+        digest.update(b"partial")
+        update_digest(digest, value.func, globals_, seen)
+        update_digest(digest, value.args, globals_, seen)
+        update_digest(digest, value.keywords, globals_, seen)
+    elif isinstance(value, types.MethodType):
+        # A bound method also depends on the state of its instance
+        update_digest(digest, value.__func__, globals_, seen)
+        update_digest(digest, value.__self__, globals_, seen)
+    elif isinstance(value, types.FunctionType):
+        digest.update(f"{value.__module__}.{value.__qualname__}".encode())
+        update_digest(digest, value.__code__, value.__globals__, seen)
+        update_digest(digest, value.__defaults__, value.__globals__, seen)
+        update_digest(digest, value.__kwdefaults__, value.__globals__, seen)
+        for cell in value.__closure__ or []:
+            update_digest(digest, cell.cell_contents, value.__globals__, seen)
+    elif isinstance(value, (type, types.BuiltinFunctionType)) or callable(value) and not hasattr(value, "__dict__"):
+        # Classes & builtins (ie: numpy ufuncs) are defined by their name
+        digest.update(f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', repr(value))}".encode())
+    elif hasattr(value, "__dict__"):
+        # Objects (ie: metric specs, or the instance of a bound method) by their type, methods & attributes
+        value_type = type(value)
+        digest.update(f"{value_type.__module__}.{value_type.__qualname__}".encode())
+        call = getattr(value_type, "__call__", None)
+        if isinstance(call, types.FunctionType):
+            update_digest(digest, call, globals_, seen)
+        update_digest(digest, vars(value), globals_, seen)
+    else:
+        try:
+            digest.update(pickle.dumps(value))
+        except Exception as error:
+            raise TypeError(f"Can't hash a value of type {type(value).__name__}") from error
+
+
+def hash_objective_function(objective_function: Union[Callable, dict]) -> Optional[str]:
+    """
+    Hash the definition of an objective function, ie: metric specs or the code of a function.
+
+    The code, constants, defaults & closure values of a function are hashed, with the helper functions
+    & constants it reads from its module, the state of the instance of a bound method & the arguments
+    of a partial (see update_digest), so editing any of them gives a new hash.
+
+    Parameters:
+    - objective_function (Union[Callable, dict]): The metric specs, the function, or an ObjectiveSet.
+
+    Returns:
+    - Optional[str]: The hex digest of the definition, None if it can't be hashed deterministically, in
+      which case the output of the objective function can't be cached.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        update_digest(digest, objective_function)
+    except TypeError:
+        return None
+    return digest.hexdigest()
+
+
+def combo_key(data_hash: str, combo: List[str], objective_function_hash: str) -> str:
+    """The cache key of a combination, from the hashes of the data & the objective function."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("|".join([data_hash, objective_function_hash] + combo).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """A directory of Parquet files, one per cached combination output.
+
+    Attributes:
+    -----------
+    directory : str
+        The directory holding the cache entries.
+    max_bytes : int
+        The size of the cache, past which the least recently used entries are evicted.
+    hits : int
+        The number of entries read back.
+    misses : int
+        The number of lookups without an entry.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], max_bytes: int = 2**30):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as error:
+            raise ImportError("The result cache stores Parquet files, install pyarrow: pip install pyarrow") from error
+
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        """Path of the entry of a key."""
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Read an entry back, or None when there is no entry for the key."""
+        path = self.path(key)
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # The modification time is the last use, which eviction goes by
+        os.utime(path)
+        self.hits += 1
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        """
+        Write an entry, atomically so concurrent runs never read a partial file.
+
+        Returns:
+        - bool: False when the output can't be stored as Parquet (ie: mixed object columns), so isn't cached.
+        """
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(handle)
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.path(key))
+        except (ValueError, TypeError, NotImplementedError):
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
+
+    def entries(self) -> List[os.DirEntry]:
+        """The entries of the cache, least recently used first."""
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(ENTRY_SUFFIX)]
+        return sorted(entries, key=lambda entry: entry.stat().st_mtime_ns)
+
+    def size(self) -> int:
+        """The size of the cache in bytes."""
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+        - int: The number of evicted entries.
+        """
+        entries = self.entries()
+        sizes = np.array([entry.stat().st_size for entry in entries], dtype=np.int64)
+        # Keep the most recently used entries that fit, ie: evict the oldest until the rest fit
+        remaining = sizes[::-1].cumsum()[::-1]
+        n_evicted = int(np.sum(remaining > self.max_bytes))
+        for entry in entries[:n_evicted]:
+            os.remove(entry.path)
+        return n_evicted
+
+    def clear(self):
+        """Remove every entry, and reset the hit & miss counts."""
+        for entry in self.entries():
+            os.remove(entry.path)
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,337 @@
+"""
+Roll-up engine: aggregate the data once at its finest cut, then derive every
+coarser combination by re-aggregating those partial results.
+
+Grouping columns are integer-coded once (see encoding.py), partial results hold the codes
+of each group, and every aggregation is a bincount style kernel over those codes. The codes
+are only decoded back to their values for the final output of each combination.
+"""
+
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, kernels, lists, metrics, pipesort, sketches
+
+# 'lattice' rolls up each combination from its smallest computed parent, 'pipesort' rolls up chains of
+# nested combinations from a single sort each (see pipesort.py)
+SCHEDULES = ["lattice", "pipesort"]
+
+
+def compute_shifts(data: pd.DataFrame, metric_specs: Dict[str, metrics.Metric]) -> Dict[str, float]:
+    """
+    Compute the shift each centered statistic is taken around, which keeps the variance accurate.
+
+    Parameters:
+    - data (pd.DataFrame): The raw data.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+
+    Returns:
+    - Dict[str, float]: The shift for each column with a centered statistic.
+    """
+    centered_columns = [column for column, stat in metrics.statistics(metric_specs) if stat in ["csum", "csumsq"]]
+    return {column: float(data[column].mean()) for column in lists.unique(centered_columns)}
+
+
+def stat_rollup_funcs(metric_specs: Dict[str, metrics.Metric]) -> Dict[str, str]:
+    """
+    How each column of the partial results is re-aggregated when rolling up.
+
+    Parameters:
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+
+    Returns:
+    - Dict[str, str]: The rollup func for n_rows & each sufficient statistic.
+    """
+    rollup_funcs = {"n_rows": "sum"}
+    for column, stat in metrics.statistics(metric_specs):
+        for stat_column in metrics.stat_columns(column, stat):
+            rollup_funcs[stat_column] = metrics.STAT_ROLLUP_FUNCS[stat]
+    return rollup_funcs
+
+
+def to_values(series: pd.Series) -> np.ndarray:
+    """Return a metric column as a NumPy array the kernels can reduce, missing values become NaN."""
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biuf":
+        return series.to_numpy()
+    return series.to_numpy(dtype=float, na_value=np.nan)
+
+
+def aggregate_base(
+    data: pd.DataFrame,
+    encoded: Dict[str, encoding.EncodedColumn],
+    group_cols: List[str],
+    metric_specs: Dict[str, metrics.Metric],
+    shifts: Dict[str, float],
+) -> pd.DataFrame:
+    """
+    Aggregate the raw data once into sufficient statistics at the finest cut of group_cols.
+
+    Missing values are kept as their own groups so that coarser cuts, which may not
+    include the column with the missing value, still account for those rows.
+
+    Parameters:
+    - data (pd.DataFrame): The raw data.
+    - encoded (Dict[str, encoding.EncodedColumn]): The encoded group_cols.
+    - group_cols (List[str]): Every column used by any combination.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - shifts (Dict[str, float]): The shift of each centered column (see compute_shifts).
+
+    Returns:
+    - pd.DataFrame: One row per group with the codes of group_cols, n_rows & the sufficient statistics.
+    """
+    row_group_ids, n_groups, group_codes = encoding.group_ids(
+        [encoded[col].codes for col in group_cols],
+        [encoded[col].radix for col in group_cols],
+    )
+
+    base = dict(zip(group_cols, group_codes))
+    base["n_rows"] = np.bincount(row_group_ids, minlength=n_groups).astype(np.int64)
+
+    for column, stat in metrics.statistics(metric_specs):
+        if stat == "hll":
+            registers = sketches.group_registers(row_group_ids, data[column], n_groups)
+            base.update(zip(metrics.stat_columns(column, stat), registers.T))
+            continue
+
+        values = to_values(data[column])
+        if stat == "qbins":
+            counts = sketches.group_histograms(row_group_ids, values, n_groups)
+            base.update(zip(metrics.stat_columns(column, stat), counts.T))
+            continue
+        if stat == "csum":
+            values = values - shifts[column]
+        elif stat == "csumsq":
+            values = (values - shifts[column]) ** 2
+
+        func = metrics.STAT_AGG_FUNCS[stat]
+        base[metrics.stat_name(column, stat)] = kernels.group_reduce(func, row_group_ids, values, n_groups)
+
+    return pd.DataFrame(base)
+
+
+def rollup(
+    partial: pd.DataFrame,
+    encoded: Dict[str, encoding.EncodedColumn],
+    combo: List[str],
+    rollup_funcs: Dict[str, str],
+    dropna: bool = True,
+) -> pd.DataFrame:
+    """
+    Re-aggregate partial sufficient statistics to a coarser combination.
+
+    Parameters:
+    - partial (pd.DataFrame): Partial results at a cut finer than combo (see aggregate_base).
+    - encoded (Dict[str, encoding.EncodedColumn]): The encoded combo columns.
+    - combo (List[str]): The columns of the coarser combination.
+    - rollup_funcs (Dict[str, str]): How each partial result is re-aggregated (see stat_rollup_funcs).
+    - dropna (bool, optional): Whether to drop groups with missing values in combo. Defaults to True.
+
+    Returns:
+    - pd.DataFrame: One row per group of combo with the combo codes, n_rows & the sufficient statistics.
+    """
+    partial_group_ids, n_groups, group_codes = encoding.group_ids(
+        [partial[col].to_numpy() for col in combo],
+        [encoded[col].radix for col in combo],
+    )
+
+    output = dict(zip(combo, group_codes))
+    blocks = []
+    for columns, func in kernels.column_blocks(rollup_funcs, partial.dtypes.to_dict()):
+        if len(columns) >= kernels.BLOCK_MIN_COLUMNS:
+            # ie: the cells of a sketch, reduced together & kept as a single block rather than column by column
+            block = kernels.group_reduce_block(func, partial_group_ids, partial[columns].to_numpy(), n_groups)
+            blocks.append(pd.DataFrame(block, columns=columns))
+            continue
+        for column in columns:
+            output[column] = kernels.group_reduce(func, partial_group_ids, partial[column].to_numpy(), n_groups)
+    output = pd.concat([pd.DataFrame(output)] + blocks, axis=1) if blocks else pd.DataFrame(output)
+
+    if dropna:
+        output = drop_missing(output, combo)
+    return output
+
+
+def drop_missing(partial: pd.DataFrame, combo: List[str]) -> pd.DataFrame:
+    """Drop the groups with a missing value (code -1) in any of the combo columns."""
+    has_missing = np.zeros(len(partial), dtype=bool)
+    for col in combo:
+        has_missing |= partial[col].to_numpy() < 0
+    return partial[~has_missing].reset_index(drop=True)
+
+
+def finalize(
+    partial: pd.DataFrame,
+    encoded: Dict[str, encoding.EncodedColumn],
+    combo: List[str],
+    metric_specs: Dict[str, metrics.Metric],
+) -> pd.DataFrame:
+    """
+    Decode the combo columns, and finalize the metrics of a combination from its sufficient statistics.
+
+    Parameters:
+    - partial (pd.DataFrame): Sufficient statistics of the combination (see rollup).
+    - encoded (Dict[str, encoding.EncodedColumn]): The encoded combo columns.
+    - combo (List[str]): The columns of the combination.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+
+    Returns:
+    - pd.DataFrame: One row per group of combo with the combo columns, n_rows & the metrics.
+    """
+    output = pd.DataFrame({col: encoded[col].decode(partial[col].to_numpy()) for col in combo})
+    output["n_rows"] = partial["n_rows"].to_numpy()
+    return pd.concat([output, metrics.finalize(partial, metric_specs)], axis=1)
+
+
+def aggregate_combo(
+    data: pd.DataFrame,
+    encoded: Dict[str, encoding.EncodedColumn],
+    combo: List[str],
+    metric_specs: Dict[str, metrics.Metric],
+    shifts: Dict[str, float],
+    rows: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    Compute a single combination straight from the raw data, or from a subset of its rows.
+
+    Parameters:
+    - data (pd.DataFrame): The raw data.
+    - encoded (Dict[str, encoding.EncodedColumn]): The encoded combo columns.
+    - combo (List[str]): The columns of the combination.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - shifts (Dict[str, float]): The shift of each centered column (see compute_shifts).
+    - rows (np.ndarray, optional): A boolean mask of the rows to aggregate. Defaults to every row.
+
+    Returns:
+    - pd.DataFrame: One row per group of combo with the combo columns, n_rows & the metrics.
+    """
+    if rows is not None:
+        # Only the metric columns of the rows are copied
+        metric_cols = lists.unique([column for column, _ in metrics.statistics(metric_specs)])
+        data = data.loc[rows, metric_cols]
+        encoded = {
+            col: encoding.EncodedColumn(codes=encoded[col].codes[rows], labels=encoded[col].labels) for col in combo
+        }
+
+    partial = aggregate_base(data, encoded, combo, metric_specs, shifts)
+    return finalize(drop_missing(partial, combo), encoded, combo, metric_specs)
+
+
+def rollup_combos(
+    data: pd.DataFrame,
+    combinations: List[List[str]],
+    metric_specs: Dict[str, metrics.Metric],
+    encoded: Optional[Dict[str, encoding.EncodedColumn]] = None,
+    schedule: str = "lattice",
+) -> List[pd.DataFrame]:
+    """
+    Compute every combination from a single pass over the raw data.
+
+    The raw data is aggregated once at the finest cut, and each combination is then
+    rolled up from the smallest already computed combination that contains it.
+
+    Parameters:
+    - data (pd.DataFrame): The raw data.
+    - combinations (List[List[str]]): The combinations to compute.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - encoded (Dict[str, encoding.EncodedColumn], optional): The encoded combination columns.
+      Defaults to encoding them from data.
+    - schedule (str, optional): How the combinations are rolled up, see rollup_base. Defaults to 'lattice'.
+
+    Returns:
+    - List[pd.DataFrame]: The output for each combination, in the order of combinations.
+    """
+    base_cols = lists.unique([col for combo in combinations for col in combo])
+    if encoded is None:
+        encoded = encoding.encode_columns(data, base_cols)
+
+    base = aggregate_base(data, encoded, base_cols, metric_specs, compute_shifts(data, metric_specs))
+    return rollup_base(base, encoded, combinations, metric_specs, schedule)
+
+
+def rollup_base(
+    base: pd.DataFrame,
+    encoded: Dict[str, encoding.EncodedColumn],
+    combinations: List[List[str]],
+    metric_specs: Dict[str, metrics.Metric],
+    schedule: str = "lattice",
+) -> List[pd.DataFrame]:
+    """
+    Roll up every combination from the partial results at the finest cut.
+
+    Each combination is rolled up from the smallest already computed combination that contains it.
+    With the 'pipesort' schedule, only the largest combination of each chain of nested combinations
+    is (see pipesort.chain_cover), and the rest of the chain is reduced from a scan of its sorted groups.
+
+    Parameters:
+    - base (pd.DataFrame): Partial results at the finest cut, including missing groups (see aggregate_base).
+    - encoded (Dict[str, encoding.EncodedColumn]): The encoded combination columns.
+    - combinations (List[List[str]]): The combinations to compute.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - schedule (str, optional): How the combinations are rolled up, one of SCHEDULES. Defaults to 'lattice'.
+
+    Returns:
+    - List[pd.DataFrame]: The output for each combination, in the order of combinations.
+    """
+    if schedule not in SCHEDULES:
+        raise ValueError(f"schedule must be one of {SCHEDULES}, not: {schedule}")
+    rollup_funcs = stat_rollup_funcs(metric_specs)
+
+    computed: Dict[frozenset, pd.DataFrame] = {}
+    outputs: Dict[int, pd.DataFrame] = {}
+
+    if schedule == "pipesort":
+        # Chains with the finest combinations first, so that coarser ones can be rolled up from them
+        chains = sorted(pipesort.chain_cover(combinations), key=lambda chain: -len(combinations[chain[-1]]))
+    else:
+        # Finest combinations first, so that coarser ones can be rolled up from them
+        chains = [[combo_i] for combo_i in sorted(range(len(combinations)), key=lambda i: -len(combinations[i]))]
+
+    for chain in chains:
+        chain_combos = [combinations[combo_i] for combo_i in chain]
+        order = pipesort.sort_order(chain_combos)
+
+        parents = [df for cols, df in computed.items() if set(order) <= cols]
+        parent = min(parents, key=len) if parents else base
+
+        # Keep missing groups in the partial results, as coarser combinations still need them
+        top = rollup(parent, encoded, order, rollup_funcs, dropna=False)
+        partials = pipesort.rollup_chain(top, encoded, chain_combos, rollup_funcs) if len(chain) > 1 else [top]
+        for combo_i, combo, partial in zip(chain, chain_combos, partials):
+            computed[frozenset(combo)] = partial
+            outputs[combo_i] = finalize(drop_missing(partial, combo), encoded, combo, metric_specs)
+
+    return [outputs[combo_i] for combo_i in range(len(combinations))]
+
+
+def iter_rollup_combos(
+    data: pd.DataFrame,
+    combinations: List[List[str]],
+    metric_specs: Dict[str, metrics.Metric],
+    encoded: Optional[Dict[str, encoding.EncodedColumn]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the output of each combination, holding only the finest cut & the current combination in memory.
+
+    Unlike rollup_combos, each combination is rolled up from the finest cut rather than from the
+    smallest combination containing it, so no other combination is kept.
+
+    Parameters:
+    - data (pd.DataFrame): The raw data.
+    - combinations (List[List[str]]): The combinations to compute.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - encoded (Dict[str, encoding.EncodedColumn], optional): The encoded combination columns.
+      Defaults to encoding them from data.
+
+    Returns:
+    - Iterator[pd.DataFrame]: The output for each combination, in the order of combinations.
+    """
+    base_cols = lists.unique([col for combo in combinations for col in combo])
+    if encoded is None:
+        encoded = encoding.encode_columns(data, base_cols)
+
+    base = aggregate_base(data, encoded, base_cols, metric_specs, compute_shifts(data, metric_specs))
+    rollup_funcs = stat_rollup_funcs(metric_specs)
+    for combo in combinations:
+        yield finalize(rollup(base, encoded, combo, rollup_funcs), encoded, combo, metric_specs)
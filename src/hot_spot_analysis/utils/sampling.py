@@ -0,0 +1,222 @@
+"""
+Functions for approximate HSA runs on a random sample of the rows, with confidence intervals.
+
+The rows are sampled without replacement within strata (the time_period & grouped_by values, which
+are part of every combination), so each stratum keeps its share of the sample and every cut lies in
+a single stratum. The sampled rows of a stratum stand for N / n rows (Horvitz-Thompson weights), which
+scale n_rows, Count & Sum metrics back up, and the variance of each estimate follows from the sampled
+values of the cut (a domain of its stratum):
+
+    Var(sum of z) = N^2 * (1 - n / N) / n * s^2(z)
+
+where z is the value of the rows of the cut (0 for the other rows of the stratum) & s^2 their sample
+variance. Means are estimated as a ratio of the two, and their variance by linearization. Other metrics
+are computed on the sample as is: Var, Std & RatioOfSums are consistent estimates, Min & Max are not.
+"""
+
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, metrics
+
+# The sample_fraction of approximate=True
+DEFAULT_SAMPLE_FRACTION = 0.1
+# The name of the hidden metric specs holding the moments of the sampled values of a column
+MOMENT_PREFIX = "sample_moment__"
+
+
+@dataclass
+class Strata:
+    """The strata of a sample, ie: the groups of the time_period & grouped_by columns.
+
+    Attributes:
+    -----------
+    columns : list[str]
+        The columns the rows are stratified by, empty for a uniform sample of every row.
+    index : pd.MultiIndex
+        The codes of the columns for each stratum.
+    population : np.ndarray
+        The number of rows of each stratum (N).
+    sample : np.ndarray
+        The number of sampled rows of each stratum (n).
+    """
+
+    columns: List[str]
+    index: pd.MultiIndex
+    population: np.ndarray
+    sample: np.ndarray
+
+    def lookup(self, df: pd.DataFrame, data_codes: Dict[str, encoding.EncodedColumn]) -> Tuple[np.ndarray, np.ndarray]:
+        """The population & sample sizes of the stratum of each row of a combination output."""
+        if not self.columns:
+            return np.repeat(self.population, len(df)), np.repeat(self.sample, len(df))
+        codes = [data_codes[col].labels.get_indexer(df[col]) for col in self.columns]
+        strata_i = self.index.get_indexer(pd.MultiIndex.from_arrays(codes))
+        return self.population[strata_i], self.sample[strata_i]
+
+
+def sample_rows(
+    data_codes: Dict[str, encoding.EncodedColumn],
+    strata_cols: List[str],
+    sample_fraction: float,
+    random_state: Optional[int] = None,
+) -> Tuple[np.ndarray, Strata]:
+    """
+    Sample a fraction of the rows of each stratum, without replacement.
+
+    Every stratum keeps at least one row, so no time period or group is missing from the sample.
+
+    Parameters:
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+    - strata_cols (List[str]): The columns to stratify by, ie: the time_period & grouped_by columns.
+    - sample_fraction (float): The fraction of the rows to sample, in (0, 1].
+    - random_state (int, optional): The seed of the sample. Defaults to a random sample.
+
+    Returns:
+    - Tuple[np.ndarray, Strata]: The sorted positions of the sampled rows, & the strata of the sample.
+    """
+    n_rows = len(next(iter(data_codes.values())).codes)
+    if strata_cols:
+        codes_list = [data_codes[col].codes for col in strata_cols]
+        radices = [data_codes[col].radix for col in strata_cols]
+        strata_ids, n_strata, strata_codes = encoding.group_ids(codes_list, radices)
+        index = pd.MultiIndex.from_arrays(strata_codes, names=strata_cols)
+    else:
+        strata_ids, n_strata = np.zeros(n_rows, dtype=np.int64), 1
+        index = pd.MultiIndex.from_arrays([[0]])
+
+    population = np.bincount(strata_ids, minlength=n_strata)
+    sample = np.minimum(np.maximum(np.round(population * sample_fraction), 1), population).astype(np.int64)
+
+    # Shuffle the rows within each stratum, & keep the first n of each
+    rng = np.random.default_rng(random_state)
+    order = np.lexsort((rng.random(n_rows), strata_ids))
+    stratum_starts = np.concatenate([[0], np.cumsum(population)[:-1]])
+    ordered_strata = strata_ids[order]
+    rank = np.arange(n_rows) - stratum_starts[ordered_strata]
+    rows = np.sort(order[rank < sample[ordered_strata]])
+    return rows, Strata(columns=strata_cols, index=index, population=population, sample=sample)
+
+
+def take_rows(data_codes: Dict[str, encoding.EncodedColumn], rows: np.ndarray) -> Dict[str, encoding.EncodedColumn]:
+    """The encoded columns of the sampled rows, with the labels of every row."""
+    return {
+        col: encoding.EncodedColumn(codes=encoded_col.codes[rows], labels=encoded_col.labels)
+        for col, encoded_col in data_codes.items()
+    }
+
+
+def estimable_metrics(metric_specs: Dict[str, metrics.Metric]) -> Dict[str, metrics.Metric]:
+    """The metrics that are estimated with a confidence interval: Sum, Count & Mean."""
+    return {
+        name: metric
+        for name, metric in metric_specs.items()
+        if type(metric) in (metrics.Sum, metrics.Count, metrics.Mean)
+    }
+
+
+def add_moment_specs(metric_specs: Dict[str, metrics.Metric]) -> Dict[str, metrics.Metric]:
+    """
+    Add the metric specs the variance of the estimates needs to the metric specs.
+
+    For each column of an estimable metric, its count, sum & the sum of squares around its mean
+    in each cut (a Var with ddof=0, times the count), which share the sufficient statistics of the run.
+    """
+    moment_specs = {}
+    for metric in estimable_metrics(metric_specs).values():
+        moment_specs[f"{MOMENT_PREFIX}{metric.column}__count"] = metrics.Count(metric.column)
+        moment_specs[f"{MOMENT_PREFIX}{metric.column}__sum"] = metrics.Sum(metric.column)
+        moment_specs[f"{MOMENT_PREFIX}{metric.column}__var"] = metrics.Var(metric.column, ddof=0)
+    return {**metric_specs, **moment_specs}
+
+
+def total_variance(population: np.ndarray, sample: np.ndarray, z_sum: np.ndarray, z_sumsq: np.ndarray) -> np.ndarray:
+    """
+    The variance of the estimate of a total, from the sum & sum of squares of z over the sampled rows of a stratum.
+
+    Parameters:
+    - population (np.ndarray): The number of rows of the stratum of each cut (N).
+    - sample (np.ndarray): The number of sampled rows of the stratum of each cut (n).
+    - z_sum (np.ndarray): The sum of z over the sampled rows of each cut.
+    - z_sumsq (np.ndarray): The sum of squares of z over the sampled rows of each cut.
+
+    Returns:
+    - np.ndarray: The variance of each estimate, missing where it can't be estimated (n = 1 < N).
+    """
+    population = population.astype(float)
+    sample = sample.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s2 = np.maximum(z_sumsq - z_sum**2 / sample, 0) / (sample - 1)
+        variance = population**2 * (1 - sample / population) / sample * s2
+    # A stratum sampled in full has no sampling error
+    return np.where(sample >= population, 0.0, variance)
+
+
+def estimate(
+    df: pd.DataFrame,
+    strata: Strata,
+    data_codes: Dict[str, encoding.EncodedColumn],
+    metric_specs: Optional[Dict[str, metrics.Metric]],
+    confidence: float = 0.95,
+    max_relative_error: float = 0.1,
+) -> pd.DataFrame:
+    """
+    Scale the output of a combination on a sample back up, with a confidence interval for each estimate.
+
+    Parameters:
+    - df (pd.DataFrame): The output of the combination on the sampled rows, with the moment specs of
+      add_moment_specs for metric specs.
+    - strata (Strata): The strata of the sample.
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+    - metric_specs (Dict[str, metrics.Metric], optional): The metric specs of the run, None for an
+      objective function, whose outputs are kept as computed on the sample.
+    - confidence (float, optional): The confidence level of the intervals. Defaults to 0.95.
+    - max_relative_error (float, optional): The largest half width of an interval, relative to its
+      estimate, of a cut that isn't flagged as noisy. Defaults to 0.1.
+
+    Returns:
+    - pd.DataFrame: The output with the estimates, an n_sample_rows column, '<name>_lower' &
+      '<name>_upper' columns for n_rows & each estimable metric, & an is_noisy column.
+    """
+    z_value = NormalDist().inv_cdf(0.5 + confidence / 2)
+    population, sample = strata.lookup(df, data_codes)
+    weight = population / sample
+    n_sample_rows = df["n_rows"].to_numpy()
+
+    # name -> (estimate, variance, the sampled count its lower bound can't go below)
+    n_rows_variance = total_variance(population, sample, n_sample_rows, n_sample_rows)
+    estimates = {"n_rows": (n_sample_rows * weight, n_rows_variance, n_sample_rows)}
+    for name, metric in estimable_metrics(metric_specs or {}).items():
+        count = df[f"{MOMENT_PREFIX}{metric.column}__count"].to_numpy().astype(float)
+        values_sum = df[f"{MOMENT_PREFIX}{metric.column}__sum"].to_numpy()
+        sumsq = df[f"{MOMENT_PREFIX}{metric.column}__var"].to_numpy() * count  # around the mean of the cut
+        if isinstance(metric, metrics.Count):
+            estimates[name] = (count * weight, total_variance(population, sample, count, count), count)
+        elif isinstance(metric, metrics.Sum):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                sum_sumsq = np.where(count > 0, sumsq + values_sum**2 / count, 0.0)
+            variance = total_variance(population, sample, values_sum, sum_sumsq)
+            estimates[name] = (df[name].to_numpy() * weight, variance, None)
+        else:
+            # The mean of a cut is a ratio of totals: its residuals around the mean sum to 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                variance = total_variance(population, sample, np.zeros(len(df)), sumsq) / (count * weight) ** 2
+            estimates[name] = (df[name].to_numpy(), variance, None)
+
+    output = df.drop(columns=[col for col in df.columns if col.startswith(MOMENT_PREFIX)])
+    output.insert(list(output.columns).index("n_rows") + 1, "n_sample_rows", n_sample_rows)
+    is_noisy = np.zeros(len(df), dtype=bool)
+    for name, (values, variance, lowest) in estimates.items():
+        half_width = z_value * np.sqrt(variance)
+        lower = values - half_width if lowest is None else np.maximum(values - half_width, lowest)
+        output[name] = values
+        output[f"{name}_lower"] = lower
+        output[f"{name}_upper"] = values + half_width
+        with np.errstate(divide="ignore", invalid="ignore"):
+            is_noisy |= ~(half_width <= max_relative_error * np.abs(values))
+    output["is_noisy"] = is_noisy
+    return output
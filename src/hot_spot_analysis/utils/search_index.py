@@ -0,0 +1,133 @@
+"""
+An inverted index over the HSA output, so searches are set operations instead of a scan of every row.
+
+The keys & values of a row are those of its time_period_dict, grouped_by_dict & combo_dict,
+ie: the Overall cuts have the key 'Overall' with the value 'Overall'.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class SearchIndex:
+    """The rows of the HSA output holding each key, value & (key, value).
+
+    Attributes:
+    -----------
+    n_rows : int
+        The number of rows of the HSA output.
+    n_keys : np.ndarray
+        The number of keys of each row.
+    key_rows : dict[str, np.ndarray]
+        The sorted row ids holding each key.
+    key_value_rows : dict[tuple[str, str], np.ndarray]
+        The sorted row ids holding each (key, str(value)).
+    value_rows : dict[str, np.ndarray]
+        The sorted row ids holding each str(value), a row is repeated when several of its keys hold the value.
+    """
+
+    n_rows: int
+    n_keys: np.ndarray
+    key_rows: Dict[str, np.ndarray] = field(default_factory=dict)
+    key_value_rows: Dict[Tuple[str, str], np.ndarray] = field(default_factory=dict)
+    value_rows: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def rows_of(self, index: dict, term) -> np.ndarray:
+        """Return the row ids of a term, with no rows when the term isn't in the index."""
+        return index.get(term, np.empty(0, dtype=np.int64))
+
+    def search(self, search_terms: List[str], search_across: str, search_type: str) -> np.ndarray:
+        """
+        Search the keys or values of every row.
+
+        Parameters:
+        - search_terms (List[str]): The terms to search for.
+        - search_across (str): Either: 'keys' or 'values'.
+        - search_type (str): Either 'any' of the search_terms, or 'all' of them (& nothing else).
+
+        Returns:
+        - np.ndarray: A boolean mask of the matching rows.
+        """
+        index = self.key_rows if search_across == "keys" else self.value_rows
+
+        if search_type == "any":
+            mask = np.zeros(self.n_rows, dtype=bool)
+            for term in set(search_terms):
+                mask[self.rows_of(index, term)] = True
+            return mask
+
+        # 'all' requires the keys (or values) of a row to be exactly the search terms, duplicates included
+        mask = self.n_keys == len(search_terms)
+        for term, term_count in Counter(search_terms).items():
+            mask &= np.bincount(self.rows_of(index, term), minlength=self.n_rows) == term_count
+        return mask
+
+
+def group_rows(codes: np.ndarray) -> Dict[int, np.ndarray]:
+    """Return the sorted row ids of each non-negative code, with a single sort of the codes."""
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    stops = np.r_[starts[1:], len(codes)]
+    return {
+        int(sorted_codes[start]): order[start:stop] for start, stop in zip(starts, stops) if sorted_codes[start] >= 0
+    }
+
+
+def build_search_index(
+    compact_df: pd.DataFrame,
+    combinations_df: pd.DataFrame,
+    key_cols: List[str],
+    target_cols: List[str],
+) -> SearchIndex:
+    """
+    Build the search index of the compact HSA output (see compact.build_compact_df).
+
+    Parameters:
+    - compact_df (pd.DataFrame): The compact HSA output.
+    - combinations_df (pd.DataFrame): The combinations table (see compact.build_combinations_df).
+    - key_cols (List[str]): The time_period & grouped_by columns.
+    - target_cols (List[str]): The target columns.
+
+    Returns:
+    - SearchIndex: The row ids of every key, value & (key, value).
+    """
+    n_rows = len(compact_df)
+    combo_ids = compact_df["combo_id"].to_numpy()
+
+    combinations = combinations_df.set_index("combo_id")["combination"]
+    n_keys_of_combo = np.zeros(int(combinations.index.max()) + 1, dtype=np.int64)
+    for combo_id, combination in combinations.items():
+        n_keys_of_combo[combo_id] = len(key_cols) + len(combination)
+
+    search_index = SearchIndex(n_rows=n_rows, n_keys=n_keys_of_combo[combo_ids])
+
+    for col in key_cols + target_cols:
+        codes = compact_df[col].cat.codes.to_numpy()
+        labels = [str(label) for label in compact_df[col].cat.categories]
+        for code, rows in group_rows(codes).items():
+            search_index.key_value_rows[(col, labels[code])] = rows
+        col_rows = np.flatnonzero(codes >= 0)
+        if len(col_rows):
+            search_index.key_rows[col] = col_rows
+
+    # The Overall cuts hold the (virtual) key & value 'Overall'
+    overall_ids = [combo_id for combo_id, combination in combinations.items() if combination == ["Overall"]]
+    overall_rows = np.flatnonzero(np.isin(combo_ids, overall_ids))
+    if len(overall_rows):
+        search_index.key_rows["Overall"] = overall_rows
+        search_index.key_value_rows[("Overall", "Overall")] = overall_rows
+
+    value_rows: Dict[str, List[np.ndarray]] = {}
+    for (_, value), rows in search_index.key_value_rows.items():
+        value_rows.setdefault(value, []).append(rows)
+    search_index.value_rows = {
+        value: rows[0] if len(rows) == 1 else np.sort(np.concatenate(rows)) for value, rows in value_rows.items()
+    }
+
+    return search_index
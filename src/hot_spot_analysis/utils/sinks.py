@@ -0,0 +1,166 @@
+"""
+Sinks the HSA output is written to one combination at a time, see: HotSpotAnalyzer.iter_hsa.
+
+A sink has a write(df) method called with the output of each combination, and a close() method
+called once every combination has been written. Only the current combination is held in memory.
+"""
+
+import json
+import os
+from typing import Callable, Sequence, Union
+
+import pandas as pd
+
+DICT_COLS = ["time_period_dict", "grouped_by_dict", "combo_dict"]
+PARQUET_SUFFIXES = (".parquet", ".pq")
+CSV_SUFFIXES = (".csv", ".csv.gz")
+
+
+class CallbackSink:
+    """Calls a function with the output of each combination."""
+
+    def __init__(self, callback: Callable[[pd.DataFrame], None]):
+        self.callback = callback
+
+    def write(self, df: pd.DataFrame):
+        self.callback(df)
+
+    def close(self):
+        pass
+
+
+class CsvSink:
+    """Appends the output of each combination to a CSV file, the header is written with the first combination."""
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = path
+        self.has_header = False
+
+    def write(self, df: pd.DataFrame):
+        df.to_csv(self.path, mode="a" if self.has_header else "w", header=not self.has_header, index=False)
+        self.has_header = True
+
+    def close(self):
+        if not self.has_header:
+            # An output without rows still gives a file
+            open(self.path, "w").close()
+
+
+def require_pyarrow():
+    """Raise an ImportError if pyarrow, which writing Parquet files requires, isn't installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as error:
+        raise ImportError("Writing Parquet files requires pyarrow: pip install pyarrow") from error
+
+
+def to_table(df: pd.DataFrame):
+    """Convert an output to a pyarrow Table, with the dict columns as JSON strings."""
+    import pyarrow as pa
+
+    df = df.copy()
+    for col in DICT_COLS:
+        if col in df.columns:
+            df[col] = [json.dumps(value) for value in df[col]]
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class ParquetSink:
+    """Writes the output of each combination as a row group of a Parquet file.
+
+    The dict columns (combo_dict, grouped_by_dict & time_period_dict) are written as JSON strings,
+    as their keys differ from one combination to the next.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        require_pyarrow()
+        self.path = path
+        self.writer = None
+
+    def write(self, df: pd.DataFrame):
+        import pyarrow.parquet as pq
+
+        if df.empty:
+            return
+        table = to_table(df)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            # Columns that are all missing in a combination take the type of the first combination
+            table = table.cast(self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class PartitionedParquetSink:
+    """Writes the output of each combination to a directory of Parquet files, partitioned by columns.
+
+    The directory is hive partitioned (ie: interaction_count=2/part-0-0.parquet), so pd.read_parquet
+    reads it back whole & readers can skip the partitions they don't need. The dict columns are
+    written as JSON strings, like ParquetSink.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], partition_cols: Sequence[str] = ("interaction_count",)):
+        require_pyarrow()
+        if os.path.isdir(directory) and os.listdir(directory):
+            raise ValueError(f"The output directory must be empty, not to mix the output with its files: {directory}")
+
+        self.directory = directory
+        self.partition_cols = list(partition_cols)
+        self.schema = None
+        self.n_parts = 0
+
+    def write(self, df: pd.DataFrame):
+        import pyarrow.parquet as pq
+
+        if df.empty:
+            return
+        table = to_table(df)
+        if self.schema is None:
+            self.schema = table.schema
+        else:
+            # Columns that are all missing in a combination take the type of the first combination
+            table = table.cast(self.schema)
+        pq.write_to_dataset(
+            table,
+            root_path=self.directory,
+            partition_cols=self.partition_cols,
+            basename_template=f"part-{self.n_parts}-{{i}}.parquet",
+        )
+        self.n_parts += 1
+
+    def close(self):
+        pass
+
+
+Sink = Union[CallbackSink, CsvSink, ParquetSink, PartitionedParquetSink]
+
+
+def open_sink(sink: Union[str, os.PathLike, Callable[[pd.DataFrame], None], Sink]) -> Sink:
+    """
+    Open the sink of a path or a callback.
+
+    Parameters:
+    - sink: A path to a Parquet ('.parquet' or '.pq') or CSV ('.csv' or '.csv.gz') file, a function
+      called with the output of each combination, or an object with write(df) & close() methods.
+
+    Returns:
+    - Sink: The sink to write the output of each combination to.
+
+    Raises:
+    - ValueError: If the sink is a path to a file that isn't Parquet or CSV.
+    """
+    if hasattr(sink, "write") and hasattr(sink, "close"):
+        return sink  # type: ignore
+    if callable(sink):
+        return CallbackSink(sink)
+
+    path = os.fspath(sink)
+    if path.endswith(PARQUET_SUFFIXES):
+        return ParquetSink(path)
+    if path.endswith(CSV_SUFFIXES):
+        return CsvSink(path)
+    raise ValueError(f"A sink must be a callback or a path ending in: {', '.join(PARQUET_SUFFIXES + CSV_SUFFIXES)}")
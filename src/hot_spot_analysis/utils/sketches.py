@@ -0,0 +1,199 @@
+"""
+Mergeable sketches of distinct counts & quantiles, built per group with NumPy.
+
+Each sketch is a fixed number of integer columns per group, which merge across groups with a
+plain max or sum, so sketches are built once at the finest cut & rolled up to every coarser
+combination like the other sufficient statistics (see metrics.py & rollup.py):
+
+- HyperLogLog registers (merged with max) estimate the number of distinct values, with a
+  standard error of 1.04 / sqrt(2**HLL_PRECISION).
+- Histograms over fixed logarithmic bins (merged with sum) estimate quantiles, like DDSketch. The
+  bins don't depend on the data, so histograms of any chunks or runs merge, & the counts of the bins
+  are exact, so the bin of each order statistic is known & bounds the quantile.
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# The number of HyperLogLog registers is 2**HLL_PRECISION, ie: 1KB per group & a standard error of ~3.3%
+HLL_PRECISION = 10
+# The bins of a quantile histogram are within QUANTILE_RELATIVE_ACCURACY of any value whose magnitude is
+# between QUANTILE_MIN_MAGNITUDE & QUANTILE_MAX_MAGNITUDE, ie: 2075 bins of 2% from 1e-6 to 1e12
+QUANTILE_RELATIVE_ACCURACY = 0.02
+QUANTILE_MIN_MAGNITUDE = 1e-6
+QUANTILE_MAX_MAGNITUDE = 1e12
+
+
+def bit_length(values: np.ndarray) -> np.ndarray:
+    """The number of bits of each unsigned 64-bit value, 0 for 0."""
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        is_long = values >= np.uint64(1) << np.uint64(shift)
+        lengths[is_long] += shift
+        values[is_long] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+
+def hash_values(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hash each value to 64 bits, equal values always get the same hash.
+
+    Parameters:
+    - values (pd.Series): The values to hash, of any dtype.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: The hash of each value, & a boolean mask of the non-missing values.
+    """
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+    return hashes, values.notna().to_numpy()
+
+
+def group_registers(group_ids: np.ndarray, values: pd.Series, n_groups: int) -> np.ndarray:
+    """
+    Build the HyperLogLog registers of the values of each group.
+
+    The first HLL_PRECISION bits of the hash of a value pick its register, which keeps the largest
+    position of the first 1 bit in the rest of the hash.
+
+    Parameters:
+    - group_ids (np.ndarray): The dense group id of each value.
+    - values (pd.Series): The values, missing values are left out.
+    - n_groups (int): The number of groups.
+
+    Returns:
+    - np.ndarray: The registers of each group, a (n_groups, 2**HLL_PRECISION) uint8 array.
+    """
+    hashes, is_valid = hash_values(values)
+    hashes, group_ids = hashes[is_valid], group_ids[is_valid]
+
+    registers = np.zeros((n_groups, 2**HLL_PRECISION), dtype=np.uint8)
+    buckets = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.int64)
+    rest = hashes << np.uint64(HLL_PRECISION)
+    ranks = np.minimum(64 - bit_length(rest) + 1, 64 - HLL_PRECISION + 1).astype(np.uint8)
+    np.maximum.at(registers, (group_ids, buckets), ranks)
+    return registers
+
+
+def estimate_distinct(registers: np.ndarray, z_value: float = 1.96) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Estimate the number of distinct values of each group from its HyperLogLog registers.
+
+    Small counts are estimated by linear counting of the empty registers, like the original HyperLogLog.
+
+    Parameters:
+    - registers (np.ndarray): The registers of each group (see group_registers).
+    - z_value (float, optional): The number of standard errors of the bounds. Defaults to 1.96, ie: ~95%.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray, np.ndarray]: The estimate, lower & upper bound of each group. Each
+      non-empty register is a distinct value, which the lower bound never goes below.
+    """
+    n_registers = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / n_registers)
+    harmonic = np.sum(np.exp2(-registers.astype(np.float64)), axis=1)
+    estimate = alpha * n_registers**2 / harmonic
+
+    n_empty = np.sum(registers == 0, axis=1)
+    with np.errstate(divide="ignore"):
+        linear_counting = n_registers * np.log(n_registers / n_empty)
+    estimate = np.where((estimate <= 2.5 * n_registers) & (n_empty > 0), linear_counting, estimate)
+
+    relative_error = z_value * 1.04 / np.sqrt(n_registers)
+    n_filled = n_registers - n_empty
+    lower = np.maximum(estimate * (1 - relative_error), n_filled)
+    upper = np.maximum(estimate * (1 + relative_error), n_filled)
+    return np.maximum(estimate, n_filled), lower, upper
+
+
+def bin_edges() -> np.ndarray:
+    """
+    The edges of the quantile bins, the same for every column & chunk of data.
+
+    Each bin of a sign spans a factor of (1 + a) / (1 - a) (a = QUANTILE_RELATIVE_ACCURACY), so a value is
+    within a relative error of a of the middle of its bin, whatever its scale. The bin around 0 holds the
+    magnitudes below QUANTILE_MIN_MAGNITUDE.
+
+    Returns:
+    - np.ndarray: The edges, symmetric around 0. The first & last bins are open, so the magnitudes above
+      QUANTILE_MAX_MAGNITUDE fall in them.
+    """
+    gamma = (1 + QUANTILE_RELATIVE_ACCURACY) / (1 - QUANTILE_RELATIVE_ACCURACY)
+    n_bins = int(np.ceil(np.log(QUANTILE_MAX_MAGNITUDE / QUANTILE_MIN_MAGNITUDE) / np.log(gamma)))
+    positive = QUANTILE_MIN_MAGNITUDE * gamma ** np.arange(n_bins + 1)
+    return np.concatenate([-positive[::-1], positive])
+
+
+QUANTILE_EDGES = bin_edges()
+# The number of bins of a quantile histogram: a bin of each sign per factor, & the bin around 0
+QUANTILE_BINS = len(QUANTILE_EDGES) - 1
+
+
+def group_histograms(group_ids: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Count the values of each group in each quantile bin (see bin_edges).
+
+    Parameters:
+    - group_ids (np.ndarray): The dense group id of each value.
+    - values (np.ndarray): The values, NaN values are left out.
+    - n_groups (int): The number of groups.
+
+    Returns:
+    - np.ndarray: The counts of each group in each bin, a (n_groups, QUANTILE_BINS) int64 array.
+    """
+    is_valid = ~np.isnan(values)
+    bins = np.searchsorted(QUANTILE_EDGES[1:-1], values[is_valid], side="right")
+    flat_ids = group_ids[is_valid].astype(np.int64) * QUANTILE_BINS + bins
+    counts = np.bincount(flat_ids, minlength=n_groups * QUANTILE_BINS)
+    return counts.reshape(n_groups, QUANTILE_BINS).astype(np.int64)
+
+
+def estimate_quantile(
+    counts: np.ndarray,
+    group_min: np.ndarray,
+    group_max: np.ndarray,
+    q: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Estimate a quantile of each group from its histogram, like pandas' linear interpolation.
+
+    The quantile lies between two order statistics of the group, & each of them lies in the bin where the
+    cumulative count passes its rank, so the edges of those bins (within the min & max of the group) bound
+    the quantile. Within a bin, the values are interpolated as if evenly spread.
+
+    Parameters:
+    - counts (np.ndarray): The histogram of each group (see group_histograms).
+    - group_min (np.ndarray): The min of each group.
+    - group_max (np.ndarray): The max of each group.
+    - q (float): The quantile, in [0, 1].
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray, np.ndarray]: The estimate, lower & upper bound of each group, NaN for
+      groups without values.
+    """
+    cumulative = np.cumsum(counts, axis=1)
+    n_values = cumulative[:, -1]
+    position = (n_values - 1) * q
+
+    def order_statistic(rank: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The bin bounds of the order statistic of each group at rank, & its interpolated value."""
+        bins = np.minimum(np.sum(cumulative <= rank[:, None], axis=1), QUANTILE_BINS - 1)
+        rows = np.arange(len(counts))
+        low = np.clip(QUANTILE_EDGES[bins], group_min, group_max)
+        high = np.clip(QUANTILE_EDGES[bins + 1], group_min, group_max)
+        # The first & last bins are open, only the min & max of the group bound them
+        low = np.where(bins == 0, group_min, low)
+        high = np.where(bins == QUANTILE_BINS - 1, group_max, high)
+        start = cumulative[rows, bins] - counts[rows, bins]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = (rank - start + 0.5) / counts[rows, bins]
+        return low, high, low + np.clip(fraction, 0, 1) * (high - low)
+
+    lower, _, below = order_statistic(np.floor(position))
+    _, upper, above = order_statistic(np.ceil(position))
+    estimate = np.clip(below + (position - np.floor(position)) * (above - below), lower, upper)
+
+    is_empty = n_values == 0
+    return tuple(np.where(is_empty, np.nan, values) for values in (estimate, lower, upper))  # type: ignore
@@ -0,0 +1,232 @@
+"""
+Functions to aggregate data that doesn't fit in memory, one chunk at a time.
+
+Each chunk is aggregated into the sufficient statistics of its finest cut (see rollup.py), and
+those partial results are merged as the chunks arrive. Peak memory is bounded by the number of
+groups rather than the number of rows, and every combination is rolled up once at the end.
+"""
+
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding, lists, metrics, rollup
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+ChunkSource = Union[pd.DataFrame, str, os.PathLike, Iterable[Union[pd.DataFrame, str, os.PathLike]]]
+
+
+def read_file(path: Union[str, os.PathLike], chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV or Parquet file, in chunks of chunksize rows when it is set.
+
+    Parameters:
+    - path (str): The path of the file, Parquet files end in '.parquet' or '.pq', any other file is read as a CSV.
+    - chunksize (int, optional): The number of rows per chunk. Defaults to reading the whole file at once.
+
+    Returns:
+    - Iterator[pd.DataFrame]: The chunks of the file.
+    """
+    if not str(path).endswith(PARQUET_SUFFIXES):
+        if chunksize is None:
+            yield pd.read_csv(path)
+        else:
+            yield from pd.read_csv(path, chunksize=chunksize)
+        return
+
+    if chunksize is None:
+        yield pd.read_parquet(path)
+        return
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("Reading Parquet files in chunks requires pyarrow: pip install pyarrow") from error
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def iter_chunks(source: ChunkSource, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Iterate over the chunks of a source of data.
+
+    Parameters:
+    - source (ChunkSource): A DataFrame, a path to a CSV or Parquet file, or an iterable of DataFrames & paths.
+    - chunksize (int, optional): The number of rows per chunk when reading files. Defaults to whole files.
+
+    Returns:
+    - Iterator[pd.DataFrame]: The chunks of the source.
+    """
+    if isinstance(source, (pd.DataFrame, str, os.PathLike)):
+        source = [source]
+
+    for item in source:
+        if isinstance(item, pd.DataFrame):
+            yield item
+        elif isinstance(item, (str, os.PathLike)):
+            yield from read_file(item, chunksize)
+        else:
+            raise ValueError(f"Chunks must be DataFrames or paths to CSV/Parquet files, not: {type(item).__name__}")
+
+
+class StreamEncoder:
+    """Integer-codes a column chunk by chunk, with codes that are consistent across chunks.
+
+    Codes are given in the order the values first arrive, and are re-mapped to the sorted order
+    of the values (which encoding.encode_column gives) by finish().
+
+    Attributes:
+    -----------
+    labels : pd.Index
+        The values seen so far, labels[code] is the value of a code.
+    """
+
+    def __init__(self):
+        self.labels = pd.Index([])
+
+    def encode(self, values: pd.Series) -> encoding.EncodedColumn:
+        """Encode the values of a chunk, adding the values not seen before to the labels."""
+        chunk_codes, chunk_labels = pd.factorize(values)
+        if len(self.labels) == 0:
+            self.labels = pd.Index(chunk_labels)
+            label_codes = np.arange(len(chunk_labels))
+        else:
+            label_codes = self.labels.get_indexer(chunk_labels)
+            is_new = label_codes < 0
+            if is_new.any():
+                label_codes[is_new] = len(self.labels) + np.arange(is_new.sum())
+                self.labels = self.labels.append(pd.Index(chunk_labels[is_new]))
+
+        codes = np.where(chunk_codes >= 0, label_codes[chunk_codes] if len(label_codes) else -1, -1)
+        return encoding.EncodedColumn(codes=codes.astype(np.int64), labels=self.labels)
+
+    def finish(self) -> Tuple[pd.Index, np.ndarray]:
+        """Return the sorted labels, and the sorted code of each code."""
+        order = self.labels.argsort()
+        sorted_codes = np.empty(len(order), dtype=np.int64)
+        sorted_codes[order] = np.arange(len(order))
+        return self.labels[order], sorted_codes
+
+
+class StreamAggregator:
+    """Aggregates chunks of data into the merged partial results of their finest cut.
+
+    Attributes:
+    -----------
+    group_cols : list[str]
+        Every column used by any combination.
+    metric_specs : dict[str, metrics.Metric]
+        The validated metric specs.
+    shifts : dict[str, float]
+        The shift of each centered column, taken from the first chunk (see rollup.compute_shifts).
+    n_rows : int
+        The number of rows aggregated so far.
+    """
+
+    def __init__(self, group_cols: List[str], metric_specs: Dict[str, metrics.Metric]):
+        self.group_cols = group_cols
+        self.metric_specs = metric_specs
+        self.shifts: Optional[Dict[str, float]] = None
+        self.n_rows = 0
+        self.encoders = {col: StreamEncoder() for col in group_cols}
+        self.rollup_funcs = rollup.stat_rollup_funcs(metric_specs)
+        self.merged: Optional[pd.DataFrame] = None
+        self.pending: List[pd.DataFrame] = []
+
+    def encoded(self) -> Dict[str, encoding.EncodedColumn]:
+        """The labels seen so far of each column, with no codes, which rollup needs for the radix of each column."""
+        return {
+            col: encoding.EncodedColumn(codes=np.empty(0, dtype=np.int64), labels=encoder.labels)
+            for col, encoder in self.encoders.items()
+        }
+
+    def add(self, chunk: pd.DataFrame):
+        """Aggregate a chunk, and merge it into the partial results."""
+        if self.shifts is None:
+            # Any shift gives exact statistics, the mean of the first chunk keeps the variance accurate
+            shifts = rollup.compute_shifts(chunk, self.metric_specs)
+            self.shifts = {col: shift if np.isfinite(shift) else 0.0 for col, shift in shifts.items()}
+
+        encoded = {}
+        for col in self.group_cols:
+            if col == "Overall" and col not in chunk.columns:
+                values = pd.Series("Overall", index=chunk.index)
+            else:
+                values = chunk[col]
+            encoded[col] = self.encoders[col].encode(values)
+
+        self.pending.append(rollup.aggregate_base(chunk, encoded, self.group_cols, self.metric_specs, self.shifts))
+        self.n_rows += len(chunk)
+
+        # Merge once the pending partial results are as large as the merged ones, which keeps merging linear
+        merged_rows = 0 if self.merged is None else len(self.merged)
+        if sum(len(partial) for partial in self.pending) >= merged_rows:
+            self.merge()
+
+    def merge(self):
+        """Merge the pending partial results into the merged partial results."""
+        partials = ([] if self.merged is None else [self.merged]) + self.pending
+        if not partials:
+            return
+        self.pending = []
+        self.merged = rollup.rollup(
+            pd.concat(partials, ignore_index=True),
+            self.encoded(),
+            self.group_cols,
+            self.rollup_funcs,
+            dropna=False,
+        )
+
+    def finish(self) -> Tuple[pd.DataFrame, Dict[str, encoding.EncodedColumn]]:
+        """
+        Merge the remaining partial results, and re-map the codes to the sorted order of the values.
+
+        Returns:
+        - Tuple[pd.DataFrame, Dict[str, encoding.EncodedColumn]]: The partial results of the finest cut
+          (see rollup.aggregate_base) & the labels of each column.
+        """
+        self.merge()
+        if self.merged is None:
+            raise ValueError("There were no chunks of data to aggregate.")
+
+        base = self.merged.copy()
+        encoded = {}
+        for col, encoder in self.encoders.items():
+            labels, sorted_codes = encoder.finish()
+            codes = base[col].to_numpy()
+            base[col] = np.where(codes >= 0, sorted_codes[np.maximum(codes, 0)], -1)
+            encoded[col] = encoding.EncodedColumn(codes=np.empty(0, dtype=np.int64), labels=labels)
+        return base, encoded
+
+
+def rollup_chunks(
+    source: ChunkSource,
+    combinations: List[List[str]],
+    metric_specs: Dict[str, metrics.Metric],
+    chunksize: Optional[int] = None,
+    schedule: str = "lattice",
+) -> Tuple[List[pd.DataFrame], Dict[str, encoding.EncodedColumn]]:
+    """
+    Compute every combination from chunks of data, holding only the partial results in memory.
+
+    Parameters:
+    - source (ChunkSource): The chunks of data (see iter_chunks).
+    - combinations (List[List[str]]): The combinations to compute.
+    - metric_specs (Dict[str, metrics.Metric]): The validated metric specs.
+    - chunksize (int, optional): The number of rows per chunk when reading files. Defaults to whole files.
+    - schedule (str, optional): How the combinations are rolled up, see rollup.rollup_base. Defaults to 'lattice'.
+
+    Returns:
+    - Tuple[List[pd.DataFrame], Dict[str, encoding.EncodedColumn]]: The output for each combination,
+      in the order of combinations, & the labels of each column.
+    """
+    group_cols = lists.unique([col for combo in combinations for col in combo])
+    aggregator = StreamAggregator(group_cols, metric_specs)
+    for chunk in iter_chunks(source, chunksize):
+        aggregator.add(chunk)
+
+    base, encoded = aggregator.finish()
+    return rollup.rollup_base(base, encoded, combinations, metric_specs, schedule), encoded
@@ -0,0 +1,108 @@
+"""
+Functions to prune the groups of combinations below a minimum support (n_rows), Apriori style.
+
+A group at level k+1 (ie: k+1 target columns) has at most as many rows as each of its parent
+groups at level k, so when a parent group falls below the minimum support none of its child
+groups are computed, and a combination whose parent cuts are all pruned is skipped entirely.
+"""
+
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hot_spot_analysis.utils import encoding
+
+
+def target_sets(combinations: List[List[str]], key_cols: List[str]) -> List[FrozenSet[str]]:
+    """The target columns of each combination, ie: without the time_period, grouped_by & Overall columns."""
+    return [frozenset(col for col in combo if col not in key_cols and col != "Overall") for combo in combinations]
+
+
+def has_support(
+    data_codes: Dict[str, encoding.EncodedColumn],
+    combo: List[str],
+    rows: np.ndarray,
+    min_support: int,
+) -> np.ndarray:
+    """
+    Flag the rows whose group of a combination has at least min_support rows.
+
+    Parameters:
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+    - combo (List[str]): The columns of the combination.
+    - rows (np.ndarray): A boolean mask of the rows to count, ie: the rows of unpruned parent groups.
+    - min_support (int): The minimum number of rows of a group.
+
+    Returns:
+    - np.ndarray: A boolean mask of the rows whose group has the support, groups with a missing value have none.
+    """
+    row_ids = np.flatnonzero(rows)
+    supported = np.zeros(len(rows), dtype=bool)
+    if len(row_ids) == 0:
+        return supported
+
+    codes_list = [data_codes[col].codes[row_ids] for col in combo]
+    row_group_ids, n_groups, _ = encoding.group_ids(codes_list, [data_codes[col].radix for col in combo])
+    group_support = np.bincount(row_group_ids, minlength=n_groups) >= min_support
+
+    is_complete = np.ones(len(row_ids), dtype=bool)
+    for codes in codes_list:
+        is_complete &= codes >= 0
+    supported[row_ids] = group_support[row_group_ids] & is_complete
+    return supported
+
+
+def iter_level_masks(
+    data_codes: Dict[str, encoding.EncodedColumn],
+    combinations: List[List[str]],
+    key_cols: List[str],
+    min_support: int,
+) -> Iterator[Tuple[List[int], List[np.ndarray]]]:
+    """
+    Yield the combinations of each level, with the rows each of them has to be computed on.
+
+    Only the masks of the previous level are kept, so memory doesn't grow with the number of combinations.
+
+    Parameters:
+    - data_codes (Dict[str, encoding.EncodedColumn]): The encoded grouping columns.
+    - combinations (List[List[str]]): Every combination.
+    - key_cols (List[str]): The time_period & grouped_by columns.
+    - min_support (int): The minimum number of rows of a group.
+
+    Returns:
+    - Iterator[Tuple[List[int], List[np.ndarray]]]: For each level, the index of its combinations & a
+      boolean mask of the rows of each, ie: the rows whose parent groups all have the support.
+    """
+    targets = target_sets(combinations, key_cols)
+    index_of_targets = {combo_targets: combo_i for combo_i, combo_targets in enumerate(targets)}
+    n_rows = len(next(iter(data_codes.values())).codes)
+
+    supported: Dict[int, np.ndarray] = {}
+    for level in sorted(set(len(combo_targets) for combo_targets in targets)):
+        level_combo_ids = [combo_i for combo_i, combo_targets in enumerate(targets) if len(combo_targets) == level]
+
+        level_masks = []
+        level_supported = {}
+        for combo_i in level_combo_ids:
+            mask = np.ones(n_rows, dtype=bool)
+            for target in targets[combo_i]:
+                parent_i: Optional[int] = index_of_targets.get(targets[combo_i] - {target})
+                if parent_i in supported:
+                    mask &= supported[parent_i]
+            level_masks.append(mask)
+            level_supported[combo_i] = has_support(data_codes, combinations[combo_i], mask, min_support)
+
+        yield level_combo_ids, level_masks
+        supported = level_supported
+
+
+def empty_output(
+    combo: List[str],
+    data_codes: Dict[str, encoding.EncodedColumn],
+    template_df: pd.DataFrame,
+    template_combo: List[str],
+) -> pd.DataFrame:
+    """The output of a skipped combination, ie: no rows, with the columns of another combination's output."""
+    keys = pd.DataFrame({col: data_codes[col].labels[:0] for col in combo})
+    return pd.concat([keys, template_df.drop(columns=template_combo).iloc[:0]], axis=1)
@@ -0,0 +1,404 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, metrics
+
+
+def build_hsa(objective_function, data=None, **kwargs):
+    return HotSpotAnalyzer(
+        data=demo.tips().build_df(stack_count=3) if data is None else data,
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        interaction_limit=3,
+        objective_function=objective_function,
+        **kwargs,
+    )
+
+
+def test_named_aggregations_match_objective_function():
+    aggregations = {"total_tips": ("tip", "sum"), "max_tip_perc": ("tip_perc", "max")}
+
+    HSA_callable = build_hsa(lambda data: data.agg(**aggregations))
+    HSA_callable.run_hsa()
+
+    HSA_rollup = build_hsa(aggregations)
+    HSA_rollup.run_hsa()
+
+    pd.testing.assert_frame_equal(HSA_callable.export_hsa_output_df(), HSA_rollup.export_hsa_output_df())
+
+
+def test_metric_specs_match_objective_function():
+    HSA_callable = build_hsa(
+        lambda data: data.agg(
+            avg_tips=pd.NamedAgg("tip", "mean"),
+            var_tips=pd.NamedAgg("tip", "var"),
+            tips_per_bill=pd.NamedAgg("tip", "sum"),
+        )
+    )
+    HSA_callable.run_hsa()
+    df_expected = HSA_callable.export_hsa_output_df()
+
+    HSA_metrics = build_hsa(
+        {
+            "avg_tips": metrics.Mean("tip"),
+            "var_tips": metrics.Var("tip"),
+            "tips_per_bill": metrics.RatioOfSums("tip", "total_bill"),
+        }
+    )
+    HSA_metrics.run_hsa()
+    df_metrics = HSA_metrics.export_hsa_output_df()
+
+    # The callable computes the sum of tips, so we divide it by the sum of bills for the ratio
+    HSA_bills = build_hsa({"total_bill": metrics.Sum("total_bill")})
+    HSA_bills.run_hsa()
+    df_expected["tips_per_bill"] = df_expected["tips_per_bill"] / HSA_bills.export_hsa_output_df()["total_bill"]
+
+    pd.testing.assert_frame_equal(df_expected, df_metrics)
+
+
+def test_parallel_run_matches_serial_run():
+    tips = demo.tips()
+
+    HSA_serial = build_hsa(tips.calc_tip_stats)
+    HSA_serial.run_hsa()
+
+    HSA_parallel = build_hsa(tips.calc_tip_stats)
+    HSA_parallel.run_hsa(n_jobs=2)
+
+    HSA_executor = build_hsa(tips.calc_tip_stats)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        HSA_executor.run_hsa(executor=executor)
+
+    pd.testing.assert_frame_equal(HSA_serial.export_hsa_output_df(), HSA_parallel.export_hsa_output_df())
+    pd.testing.assert_frame_equal(HSA_serial.export_hsa_output_df(), HSA_executor.export_hsa_output_df())
+
+
+def sum_sizes(grouped):
+    output = grouped.agg(total_size=("size", "sum"))
+    output["first_row"] = grouped["size"].apply(lambda sizes: sizes.index.min())
+    return output
+
+
+def test_parallel_run_keeps_nullable_columns_and_index():
+    df_tips = demo.tips().build_df(stack_count=3)
+    df_tips["size"] = df_tips["size"].astype("Int64")
+    df_tips.loc[::5, "size"] = pd.NA
+    df_tips.index = df_tips.index * 10 + 7
+
+    HSA_serial = build_hsa(sum_sizes, data=df_tips)
+    HSA_serial.run_hsa()
+    HSA_parallel = build_hsa(sum_sizes, data=df_tips)
+    HSA_parallel.run_hsa(n_jobs=2)
+
+    df_output = HSA_parallel.export_hsa_output_df()
+    pd.testing.assert_frame_equal(HSA_serial.export_hsa_output_df(), df_output)
+    assert (df_output["first_row"] % 10 == 7).all()
+
+
+def test_compact_layout_matches_dict_layout():
+    tips = demo.tips()
+
+    HSA_dicts = build_hsa(tips.calc_tip_stats)
+    HSA_dicts.run_hsa()
+
+    HSA_compact = build_hsa(tips.calc_tip_stats, output_layout="compact")
+    HSA_compact.run_hsa()
+
+    assert "combo_id" in HSA_compact.export_hsa_output_df().columns
+    pd.testing.assert_frame_equal(HSA_dicts.export_hsa_output_df(), HSA_compact.export_hsa_output_df(as_dicts=True))
+
+    searches = [
+        {"search_terms": "day"},
+        {"search_terms": ["fake_ts", "day", "smoker"], "search_type": "all"},
+        {"search_terms": ["Sun", "Yes"], "search_across": "values"},
+    ]
+    for search in searches:
+        df_dicts = HSA_dicts.search_hsa_output(**search)
+        df_compact = HSA_compact.search_hsa_output(**search)
+        assert df_dicts.index.tolist() == df_compact.index.tolist()
+
+    df_dicts_lag = HSA_dicts.lag_hsa_by_time_period(1)
+    df_compact_lag = HSA_compact.lag_hsa_by_time_period(1)
+    for col in ["n_rows_lag1", "avg_tips_lag1"]:
+        pd.testing.assert_series_equal(df_dicts_lag[col].astype(float), df_compact_lag[col].astype(float))
+
+
+def test_search_index_matches_search_scan():
+    HSA = build_hsa(demo.tips().calc_tip_stats)
+    HSA.run_hsa()
+
+    searches = [
+        {"search_terms": ["Overall"]},
+        {"search_terms": ["fake_ts", "day", "size"], "search_type": "all", "interactions": 3},
+        {"search_terms": ["Sun", "2"], "search_across": "values", "n_row_minimum": 10},
+        {"search_terms": ["Sat", "No"], "search_across": "values", "interactions": [2, 3]},
+    ]
+    for search in searches:
+        # Passing hsa_df scans its rows, instead of using the index of hsa_output_df
+        df_scan = HSA.search_hsa_output(hsa_df=HSA.hsa_output_df, **search)
+        df_index = HSA.search_hsa_output(**search)
+        pd.testing.assert_frame_equal(df_scan, df_index)
+    assert HSA.hsa_search_index is not None
+
+
+def test_lag_follows_each_grouped_by_series():
+    tips = demo.tips()
+    HSA = HotSpotAnalyzer(
+        data=tips.build_df(stack_count=3).groupby(["sex"]),
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        interaction_limit=3,
+        objective_function=tips.calc_tip_stats,
+        output_layout="compact",
+    )
+    HSA.run_hsa()
+    df = HSA.export_hsa_output_df()
+
+    df_lag = HSA.lag_hsa_by_time_period([1, 2])
+    series_cols = ["combo_id", "sex", "day", "smoker", "size"]
+    df_grp = df.groupby(series_cols, observed=True, dropna=False, sort=False)
+    for lag_i in [1, 2]:
+        expected = df_grp["n_rows"].shift(lag_i).astype(float)
+        pd.testing.assert_series_equal(expected, df_lag[f"n_rows_lag{lag_i}"], check_names=False)
+
+
+def test_lag_by_time_period_skips_missing_periods():
+    HSA = build_hsa(demo.tips().calc_tip_stats, output_layout="compact")
+    HSA.run_hsa()
+
+    df_rows = HSA.lag_hsa_by_time_period(1)
+    df_periods = HSA.lag_hsa_by_time_period(1, lag_by="time_period")
+
+    # Lags by time_period only ever look back to the previous period
+    has_lag = df_periods["fake_ts_lag1"].notna()
+    assert (df_periods["fake_ts"][has_lag].astype(int) - df_periods["fake_ts_lag1"][has_lag].astype(int) == 1).all()
+    # & only differ from lags by rows where a series is missing a period
+    differs = df_rows["fake_ts_lag1"].notna() & ~has_lag
+    gaps = df_rows["fake_ts"][differs].astype(int) - df_rows["fake_ts_lag1"][differs].astype(int)
+    assert (gaps > 1).all()
+    pd.testing.assert_series_equal(df_rows["n_rows_lag1"][has_lag], df_periods["n_rows_lag1"][has_lag])
+
+    with pytest.raises(ValueError):
+        HSA.lag_hsa_by_time_period(1, lag_by="days")
+
+
+def test_lag_by_time_period_with_missing_periods():
+    df_tips = demo.tips().build_df(stack_count=3)
+
+    def lag_overall(data, **kwargs):
+        HSA = build_hsa({"n_tips": ("tip", "count")}, data=data, output_layout="compact", **kwargs)
+        HSA.run_hsa()
+        df_lagged = HSA.lag_hsa_by_time_period(1, lag_by="time_period")
+        return df_lagged[df_lagged["combo_id"] == 0].set_index("fake_ts")["fake_ts_lag1"]
+
+    # A period in the data without any output row (ie: dropped by min_support) is still a gap
+    df_sparse = pd.concat([df_tips[df_tips["fake_ts"] != 2], df_tips[df_tips["fake_ts"] == 2].head(1)])
+    lags = lag_overall(df_sparse, min_support=2)
+    assert lags.index.tolist() == [1, 3] and lags.isna().all()
+
+    # A period absent from the whole data isn't a period, the periods are the values of the data
+    lags = lag_overall(df_tips[df_tips["fake_ts"] != 2])
+    assert lags.astype(float).fillna(-1).tolist() == [-1, 1]
+
+
+def test_run_hsa_leaves_the_data_unchanged():
+    df_tips = demo.tips().build_df(stack_count=3)
+    columns = list(df_tips.columns)
+
+    HSA = HotSpotAnalyzer(
+        data=df_tips,
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        objective_function={"avg_tips": metrics.Mean("tip")},
+    )
+    HSA.run_hsa()
+
+    assert list(df_tips.columns) == columns
+    # Metric specs only keep the grouping & metric columns, without copying them
+    assert list(HSA.data_prep.columns) == [col for col in columns if col in ["fake_ts", "day", "smoker", "size", "tip"]]
+    assert np.shares_memory(HSA.data_prep["tip"].to_numpy(), df_tips["tip"].to_numpy())
+
+
+def test_quiet_run_records_profile(capsys):
+    events = []
+    HSA = build_hsa(demo.tips().calc_tip_stats, verbose=False, on_event=events.append)
+    HSA.run_hsa()
+    HSA.lag_hsa_by_time_period(1)
+    assert capsys.readouterr().out == ""
+
+    df_events = HSA.profile(by_phase=False)
+    assert len(df_events) == len(events)
+    # A groupby, objective & merge event per combination
+    assert (df_events["phase"] == "groupby").sum() == len(HSA.combinations)
+
+    summary = HSA.profile()
+    phases = ["build_data", "build_combos", "groupby", "objective", "merge", "assembly", "lag"]
+    assert summary["phase"].tolist() == phases
+    summary = summary.set_index("phase")
+    assert summary.loc["groupby", "n_groups"] == len(HSA.hsa_output_df)
+    assert summary.loc["assembly", "rows_out"] == len(HSA.hsa_output_df)
+
+
+def test_streaming_run_matches_in_memory_run():
+    metric_specs = {"avg_tips": metrics.Mean("tip"), "var_tips": metrics.Var("tip"), "max_tip": metrics.Max("tip")}
+
+    HSA_memory = build_hsa(metric_specs)
+    HSA_memory.run_hsa()
+
+    df_tips = demo.tips().build_df(stack_count=3).sample(frac=1, random_state=0)
+    HSA_stream = build_hsa(metric_specs)
+    HSA_stream.run_hsa_streaming(df_tips.iloc[start : start + 100] for start in range(0, len(df_tips), 100))
+
+    pd.testing.assert_frame_equal(HSA_memory.export_hsa_output_df(), HSA_stream.export_hsa_output_df())
+
+    with pytest.raises(ValueError):
+        build_hsa(demo.tips().calc_tip_stats).run_hsa_streaming([df_tips])
+
+
+def test_append_matches_full_run():
+    tips = demo.tips()
+    df_tips = tips.build_df(stack_count=3)
+
+    HSA_full = build_hsa(tips.calc_tip_stats)
+    HSA_full.run_hsa()
+    HSA_full.lag_hsa_by_time_period([1, 2])
+
+    HSA_append = HotSpotAnalyzer(
+        data=df_tips[df_tips["fake_ts"] < 3].copy(),
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        interaction_limit=3,
+        objective_function=tips.calc_tip_stats,
+    )
+    HSA_append.run_hsa()
+    HSA_append.lag_hsa_by_time_period([1, 2])
+    HSA_append.append(df_tips[df_tips["fake_ts"] == 3].copy())
+
+    pd.testing.assert_frame_equal(HSA_full.export_hsa_output_df(), HSA_append.export_hsa_output_df())
+    pd.testing.assert_frame_equal(HSA_full.hsa_lagged_df, HSA_append.hsa_lagged_df)
+
+    # The appended data is only concatenated once the whole data is read again
+    assert len(HSA_append._data_prep) < len(df_tips)
+    pd.testing.assert_frame_equal(HSA_append.query({"day": "Sat"}), HSA_full.query({"day": "Sat"}))
+    assert len(HSA_append._data_prep) == len(df_tips)
+    for col, encoded_col in HSA_full.data_codes.items():
+        assert HSA_append.data_codes[col].labels.equals(encoded_col.labels)
+        assert (HSA_append.data_codes[col].codes == encoded_col.codes).all()
+
+    # The same time periods, other columns & other groups are all refused
+    with pytest.raises(ValueError, match="new time periods"):
+        HSA_append.append(df_tips[df_tips["fake_ts"] == 3].copy())
+    with pytest.raises(ValueError, match="same columns"):
+        HSA_append.append(df_tips.drop(columns="time").assign(fake_ts=4))
+    with pytest.raises(ValueError, match="combinations differ"):
+        HSA_append.append(df_tips.assign(fake_ts=4).groupby(["sex"]))
+
+
+def test_cached_run_matches_run(tmp_path):
+    pytest.importorskip("pyarrow")
+    tips = demo.tips()
+
+    HSA = build_hsa(tips.calc_tip_stats)
+    HSA.run_hsa()
+
+    HSA_miss = build_hsa(tips.calc_tip_stats)
+    HSA_miss.run_hsa(cache=tmp_path)
+    HSA_hit = build_hsa(tips.calc_tip_stats)
+    HSA_hit.run_hsa(cache=tmp_path)
+
+    assert HSA_miss.cache_stats == {"hits": 0, "misses": 8}
+    assert HSA_hit.cache_stats == {"hits": 8, "misses": 0}
+    pd.testing.assert_frame_equal(HSA.export_hsa_output_df(), HSA_hit.export_hsa_output_df())
+
+    # Other data misses the cache
+    HSA_other = build_hsa({"avg_tips": metrics.Mean("tip")})
+    HSA_other.run_hsa(cache=tmp_path)
+    assert HSA_other.cache_stats == {"hits": 0, "misses": 8}
+
+
+def test_min_support_matches_filtered_run():
+    tips = demo.tips()
+    for objective_function in [tips.calc_tip_stats, {"avg_tips": metrics.Mean("tip")}]:
+        HSA = build_hsa(objective_function)
+        HSA.run_hsa()
+        df_expected = HSA.export_hsa_output_df()
+        df_expected = df_expected[df_expected["n_rows"] >= 12].reset_index(drop=True)
+
+        HSA_pruned = build_hsa(objective_function, min_support=12)
+        HSA_pruned.run_hsa()
+        pd.testing.assert_frame_equal(df_expected, HSA_pruned.export_hsa_output_df())
+
+    with pytest.raises(ValueError, match="min_support"):
+        build_hsa(tips.calc_tip_stats, min_support=-1)
+
+
+def test_find_top_hotspots_matches_sorted_run():
+    specs = {"total_tips": metrics.Sum("tip"), "avg_tips": metrics.Mean("tip")}
+    HSA = build_hsa(specs)
+    HSA.run_hsa()
+    df_full = HSA.export_hsa_output_df()
+    # The Overall cuts aren't hot spots
+    df_full = df_full[df_full["combo_dict"].map(lambda combo: "Overall" not in combo)]
+
+    # Sums of non-negative values can't grow from a cut to its children, so the search is exact
+    df_top = build_hsa(specs).find_top_hotspots("total_tips", k=10)
+    expected = df_full["total_tips"].sort_values(ascending=False).head(10).to_numpy()
+    assert df_top["score"].tolist() == pytest.approx(expected.tolist())
+    assert df_top["total_tips"].tolist() == pytest.approx(expected.tolist())
+
+    # Other scores are a beam search, which is exhaustive with a wide enough beam
+    def score(df):
+        return (df["avg_tips"] - 3).abs()
+
+    df_top = build_hsa(specs, output_layout="compact").find_top_hotspots(score, k=10, beam_width=10**6)
+    expected = score(df_full).sort_values(ascending=False).head(10).to_numpy()
+    assert df_top["score"].tolist() == pytest.approx(expected.tolist())
+    assert isinstance(df_top["combination"].iloc[0], list)
+
+    with pytest.raises(ValueError, match="'k' must be"):
+        build_hsa(specs).find_top_hotspots("total_tips", k=0)
+
+
+def test_iter_hsa_matches_run_hsa():
+    tips = demo.tips()
+    for objective_function, kwargs in [
+        (tips.calc_tip_stats, {}),
+        (tips.calc_tip_stats, {"min_support": 12}),
+        ({"avg_tips": metrics.Mean("tip")}, {"output_layout": "compact"}),
+    ]:
+        HSA = build_hsa(objective_function, **kwargs)
+        HSA.run_hsa()
+
+        df_iter = pd.concat(build_hsa(objective_function, **kwargs).iter_hsa())
+        pd.testing.assert_frame_equal(HSA.hsa_output_df, df_iter)
+
+
+def test_run_hsa_to_sink(tmp_path):
+    tips = demo.tips()
+    HSA = build_hsa(tips.calc_tip_stats)
+    HSA.run_hsa()
+
+    written = []
+    HSA_callback = build_hsa(tips.calc_tip_stats)
+    HSA_callback.run_hsa(sink=written.append)
+    assert len(written) == len(HSA.combinations)
+    assert HSA_callback.hsa_output_df.empty
+    pd.testing.assert_frame_equal(HSA.hsa_output_df, pd.concat(written))
+
+    path = tmp_path / "hsa_output.csv"
+    build_hsa(tips.calc_tip_stats, output_layout="compact").run_hsa(sink=path)
+    assert len(pd.read_csv(path)) == len(HSA.hsa_output_df)
+
+    with pytest.raises(ValueError, match="sink"):
+        build_hsa(tips.calc_tip_stats).run_hsa(sink=tmp_path / "hsa_output.txt")
+    with pytest.raises(ValueError, match="sink"):
+        build_hsa(tips.calc_tip_stats).run_hsa(sink=written.append, n_jobs=2)
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
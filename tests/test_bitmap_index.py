@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import bitmap_index, demo, encoding, metrics
+
+
+def test_bitmap_index_rows():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {"a": rng.integers(0, 3, 1000), "b": rng.integers(0, 100, 1000), "c": rng.choice(["x", "y"], 1000)}
+    )
+    df.loc[::7, "c"] = None
+    data_codes = encoding.encode_columns(df, ["a", "b", "c"])
+    index = bitmap_index.build_bitmap_index(data_codes, ["a", "b", "c"])
+
+    # Frequent values are bitmaps, rare values row ids
+    assert ("a", 0) in index.dense and ("b", 0) in index.sparse
+    for cut in [{"a": 1}, {"b": 5}, {"a": 2, "c": "y"}, {"a": 0, "b": 42, "c": "x"}, {"b": 5, "c": "x"}]:
+        expected = np.logical_and.reduce([(df[col] == value).to_numpy() for col, value in cut.items()])
+        np.testing.assert_array_equal(index.rows(cut), expected)
+
+    # Values match by their string too, and absent values have no rows
+    np.testing.assert_array_equal(index.rows({"a": "1"}), index.rows({"a": 1}))
+    assert not index.rows({"a": 7}).any()
+    assert index.rows({}).all()
+
+
+def test_query():
+    df_tips = demo.tips().build_df(stack_count=3)
+    for objective_function in [
+        {"avg_tips": metrics.Mean("tip"), "max_bill": metrics.Max("total_bill")},
+        lambda grouped: grouped.agg(avg_tips=("tip", "mean"), max_bill=("total_bill", "max")),
+    ]:
+        HSA = HotSpotAnalyzer(
+            data=df_tips,
+            target_cols=["day", "smoker", "size", "sex"],
+            time_period=["fake_ts"],
+            interaction_limit=2,
+            objective_function=objective_function,
+            verbose=False,
+        )
+        HSA.run_hsa()
+        is_cut = HSA.hsa_output_df["combo_dict"].map(lambda combo_dict: combo_dict == {"day": "Sat", "size": "4"})
+        expected = HSA.hsa_output_df[is_cut.to_numpy()].reset_index(drop=True)
+        pd.testing.assert_frame_equal(HSA.query({"day": "Sat", "size": 4}), expected, check_dtype=False)
+
+        # Cuts deeper than the interaction_limit are computed from their rows
+        output = HSA.query({"day": "Sat", "smoker": "Yes", "size": 4, "sex": "Male"})
+        is_row = (df_tips["day"] == "Sat") & (df_tips["smoker"] == "Yes") & (df_tips["size"] == 4)
+        is_row &= df_tips["sex"] == "Male"
+        expected = df_tips[is_row].groupby("fake_ts")["tip"].mean().to_numpy()
+        np.testing.assert_allclose(output["avg_tips"], expected)
+        assert (output["interaction_count"] == 5).all()
+        # A cut without rows has the columns of any other cut
+        empty_output = HSA.query({"day": "Mon"})
+        assert empty_output.empty
+        assert empty_output.columns.tolist() == output.columns.tolist()
+
+    with pytest.raises(ValueError):
+        HSA.query({"fake_ts": 1})
+    with pytest.raises(ValueError):
+        HSA.query({})
@@ -0,0 +1,76 @@
+import os
+
+import pandas as pd
+import pytest
+
+from hot_spot_analysis import cli
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, metrics
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def tips_csv(tmp_path):
+    path = tmp_path / "tips.csv"
+    demo.tips().build_df(stack_count=3).to_csv(path, index=False)
+    return str(path)
+
+
+def read_output(directory) -> pd.DataFrame:
+    df = pd.read_parquet(directory)
+    df["interaction_count"] = df["interaction_count"].astype(int)
+    return df.sort_values(["combo_id", "fake_ts", "day", "smoker"]).reset_index(drop=True)
+
+
+def test_parse_args():
+    assert cli.parse_bytes("512MB") == 512 * 10**6
+    assert cli.parse_bytes("1.5gb") == 1_500_000_000
+    assert cli.parse_metric("avg_tip=mean:tip") == ("avg_tip", metrics.Mean("tip"))
+
+    with pytest.raises(SystemExit):
+        cli.main(["tips.csv", "--target-cols", "day", "--metric", "tip=median:tip", "--output", "out"])
+
+
+def test_cli_matches_run_hsa(tips_csv, tmp_path):
+    HSA = HotSpotAnalyzer(
+        data=pd.read_csv(tips_csv),
+        target_cols=["day", "smoker"],
+        time_period=["fake_ts"],
+        objective_function={"avg_tip": metrics.Mean("tip")},
+        output_layout="compact",
+        verbose=False,
+    )
+    HSA.run_hsa()
+    expected = HSA.hsa_output_df[["combo_id", "fake_ts", "day", "smoker", "n_rows", "avg_tip"]]
+    expected = expected.sort_values(["combo_id", "fake_ts", "day", "smoker"]).reset_index(drop=True)
+
+    args = [tips_csv, "--target-cols", "day", "smoker", "--time-period", "fake_ts", "--metric", "avg_tip=mean:tip"]
+    cli.main(args + ["--output", str(tmp_path / "full")])
+    assert sorted(os.listdir(tmp_path / "full")) == [
+        "interaction_count=1",
+        "interaction_count=2",
+        "interaction_count=3",
+    ]
+
+    # Reading the input in chunks gives the same output
+    cli.main(args + ["--output", str(tmp_path / "chunks"), "--memory-budget", "10KB"])
+    for directory in ["full", "chunks"]:
+        df = read_output(tmp_path / directory)[expected.columns]
+        pd.testing.assert_frame_equal(df, expected, check_dtype=False, check_categorical=False)
+
+    # Chunked input runs in a single process without a cache, so those options are refused
+    for options in [["--n-jobs", "2"], ["--cache", str(tmp_path / "cache")]]:
+        for chunk_options in [["--chunksize", "100"], ["--memory-budget", "10KB"]]:
+            with pytest.raises(SystemExit):
+                cli.main(args + ["--output", str(tmp_path / "refused")] + options + chunk_options)
+
+    # The output directory must be empty, unless it is overwritten
+    with pytest.raises(ValueError, match="empty"):
+        cli.main(args + ["--output", str(tmp_path / "full")])
+    cli.main(args + ["--output", str(tmp_path / "full"), "--overwrite"])
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import compact, encoding
+
+
+def build_compact():
+    data = pd.DataFrame({"ts": [1, 1, 2, 2], "day": ["Sat", "Sun", "Sat", "Sun"], "Overall": "Overall"})
+    data_codes = encoding.encode_columns(data, ["ts", "day", "Overall"])
+    raw_output_dicts = [
+        {
+            "combination": ["ts", "Overall"],
+            "interaction_count": 0,
+            "df": pd.DataFrame({"ts": [1, 2], "Overall": "Overall", "n_rows": [2, 2]}),
+        },
+        {
+            "combination": ["ts", "day"],
+            "interaction_count": 1,
+            "df": data[["ts", "day"]].assign(n_rows=1),
+        },
+    ]
+    compact_df = compact.build_compact_df(raw_output_dicts, data_codes, ["ts"], ["day"])
+    combinations_df = compact.build_combinations_df([["ts", "Overall"], ["ts", "day"]], ["ts"])
+    return compact_df, combinations_df
+
+
+def test_build_compact_df():
+    compact_df, combinations_df = build_compact()
+    assert compact_df.columns.tolist() == ["combo_id", "interaction_count", "ts", "day", "n_rows"]
+    assert compact_df["day"].isna().tolist() == [True, True, False, False, False, False]
+    assert combinations_df["combination"].tolist() == [["Overall"], ["day"]]
+    assert combinations_df["interaction_count"].tolist() == [1, 2]
+
+
+def test_materialize_dicts():
+    compact_df, combinations_df = build_compact()
+    df = compact.materialize_dicts(compact_df, combinations_df, ["day"], ["ts"], [])
+    assert df.columns.tolist() == ["time_period_dict", "combo_dict", "n_rows", "interaction_count"]
+    assert df["combo_dict"].tolist()[:3] == [{"Overall": "Overall"}, {"Overall": "Overall"}, {"day": "Sat"}]
+    assert df["time_period_dict"].tolist()[:2] == [{"ts": "1"}, {"ts": "2"}]
+
+
+def test_search_mask():
+    compact_df, combinations_df = build_compact()
+    mask = compact.search_mask(compact_df, combinations_df, ["ts"], ["day"], ["day"], "keys", "any")
+    assert mask.tolist() == [False, False, True, True, True, True]
+    mask = compact.search_mask(compact_df, combinations_df, ["ts"], ["day"], ["1", "Overall"], "values", "all")
+    assert mask.tolist() == [True, False, False, False, False, False]
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,103 @@
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, duckdb_backend, metrics
+
+pytest.importorskip("duckdb")
+
+METRIC_SPECS = {
+    "avg_tips": metrics.Mean("tip"),
+    "var_tips": metrics.Var("tip"),
+    "n_tips": metrics.Count("tip"),
+    "max_bill": metrics.Max("total_bill"),
+    # Integer columns keep their dtype, like the pandas backend
+    "min_size": metrics.Min("size"),
+    "max_size": metrics.Max("size"),
+    "tips_per_bill": metrics.RatioOfSums("tip", "total_bill"),
+}
+
+
+def build_hsa(data, objective_function=METRIC_SPECS, **kwargs):
+    return HotSpotAnalyzer(
+        data=data,
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        interaction_limit=3,
+        objective_function=objective_function,
+        verbose=False,
+        **kwargs,
+    )
+
+
+def test_grouping_id():
+    group_cols = ["a", "b", "c"]
+    assert duckdb_backend.grouping_id(["a", "b", "c"], group_cols) == 0
+    assert duckdb_backend.grouping_id(["Overall", "c"], group_cols) == 0b110
+    assert duckdb_backend.grouping_id(["b"], group_cols) == 0b101
+
+
+def test_run_combos():
+    df = pd.DataFrame({"a": ["x", "y", "x", None], "b": [1, 1, 2, 2], "value": [1.0, 2.0, 3.0, 4.0]})
+    outputs, encoded = duckdb_backend.run_combos(
+        df,
+        [["Overall"], ["a"], ["a", "b"]],
+        metrics.validate_metrics({"total": metrics.Sum("value"), "avg": metrics.Mean("value")}),
+    )
+
+    assert encoded["a"].labels.tolist() == ["x", "y"]
+    assert encoded["b"].labels.tolist() == [1, 2]
+    assert encoded["Overall"].labels.tolist() == ["Overall"]
+    assert outputs[0].to_dict("list") == {"Overall": ["Overall"], "n_rows": [4], "total": [10.0], "avg": [2.5]}
+    # Rows missing a grouping column are dropped, like pandas' groupby
+    assert outputs[1].to_dict("list") == {"a": ["x", "y"], "n_rows": [2, 1], "total": [4.0, 2.0], "avg": [2.0, 2.0]}
+    assert outputs[2]["b"].dtype == "int64"
+    assert outputs[2][["a", "b"]].values.tolist() == [["x", 1], ["x", 2], ["y", 1]]
+
+
+@pytest.mark.parametrize("output_layout", ["dicts", "compact"])
+def test_duckdb_matches_pandas(output_layout):
+    df_tips = demo.tips().build_df(stack_count=3)
+    HSA_pandas = build_hsa(df_tips.groupby(["time"]), output_layout=output_layout, min_support=5)
+    HSA_pandas.run_hsa()
+
+    HSA_duckdb = build_hsa(df_tips.groupby(["time"]), output_layout=output_layout, min_support=5, backend="duckdb")
+    HSA_duckdb.run_hsa()
+
+    assert "duckdb" in HSA_duckdb.profile()["phase"].tolist()
+    pd.testing.assert_frame_equal(HSA_pandas.hsa_output_df, HSA_duckdb.hsa_output_df)
+
+
+def test_duckdb_sums_like_pandas():
+    # The sums of integer & boolean columns are integers on both backends
+    df_tips = demo.tips().build_df(stack_count=3)
+    df_tips["is_large"] = df_tips["total_bill"] > 20
+    specs = {"total_size": metrics.Sum("size"), "n_large": metrics.Sum("is_large"), "total_tips": metrics.Sum("tip")}
+    outputs = []
+    for backend in ["pandas", "duckdb"]:
+        HSA = build_hsa(df_tips, objective_function=specs, backend=backend)
+        HSA.run_hsa()
+        outputs.append(HSA.hsa_output_df)
+
+    pd.testing.assert_frame_equal(outputs[0], outputs[1], check_dtype=True)
+    assert outputs[1][["total_size", "n_large", "total_tips"]].dtypes.tolist() == ["int64", "int64", "float64"]
+
+
+def test_duckdb_reads_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    df_tips = demo.tips().build_df(stack_count=3)
+    df_tips.to_parquet(tmp_path / "tips.parquet")
+
+    HSA_pandas = build_hsa(df_tips)
+    HSA_pandas.run_hsa()
+
+    # A Parquet path is scanned by DuckDB, & picks the duckdb backend
+    HSA_duckdb = build_hsa(str(tmp_path / "tips.parquet"))
+    assert HSA_duckdb.backend == "duckdb"
+    HSA_duckdb.run_hsa()
+    pd.testing.assert_frame_equal(HSA_pandas.hsa_output_df, HSA_duckdb.hsa_output_df)
+
+    with pytest.raises(ValueError):
+        build_hsa(str(tmp_path / "tips.parquet"), backend="pandas").run_hsa()
+    with pytest.raises(ValueError):
+        HotSpotAnalyzer(str(tmp_path / "tips.parquet"), ["not_a_column"], objective_function=METRIC_SPECS).run_hsa()
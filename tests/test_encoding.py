@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import encoding
+
+
+def test_encode_column():
+    encoded = encoding.encode_column(pd.Series(["b", "a", None, "b"]))
+    assert encoded.codes.tolist() == [1, 0, -1, 1]
+    assert encoded.codes.dtype == np.int8
+    assert encoded.labels.tolist() == ["a", "b"]
+    assert encoded.radix == 3
+    assert encoded.decode(np.array([1, 0])).tolist() == ["b", "a"]
+
+
+def test_to_categorical():
+    df = pd.DataFrame({"A": [3, 1, 3]}, index=[10, 11, 12])
+    encoded = encoding.encode_column(df["A"])
+    categorical = encoded.to_categorical("A", df.index)
+    assert categorical.name == "A"
+    assert categorical.index.tolist() == [10, 11, 12]
+    assert categorical.tolist() == [3, 1, 3]
+
+
+def test_encode_columns_overall():
+    df = pd.DataFrame({"A": ["x", "y", "x"]})
+    encoded = encoding.encode_columns(df, ["Overall", "A"])
+    assert encoded["Overall"].codes.tolist() == [0, 0, 0]
+    assert encoded["Overall"].labels.tolist() == ["Overall"]
+    # The Overall column is virtual, the data isn't modified
+    assert list(df.columns) == ["A"]
+
+
+def test_group_ids():
+    codes_list = [np.array([1, 0, 1, 0, -1]), np.array([0, 1, 0, 0, 1])]
+    row_group_ids, n_groups, group_codes = encoding.group_ids(codes_list, [3, 3])
+
+    # Groups are numbered in the lexicographic order of the codes, missing values first
+    assert n_groups == 4
+    assert row_group_ids.tolist() == [3, 2, 3, 1, 0]
+    assert [codes.tolist() for codes in group_codes] == [[-1, 0, 0, 1], [1, 0, 1, 0]]
+
+
+def test_densify():
+    keys = np.array([7, 2, 7, 5])
+    assert encoding.densify(keys, 8)[0].tolist() == [2, 0, 2, 1]
+
+    # A key space far larger than the number of keys is densified by sorting
+    keys = np.array([2**40, 3, 2**40])
+    row_group_ids, n_groups = encoding.densify(keys, 2**41)
+    assert row_group_ids.tolist() == [1, 0, 1]
+    assert n_groups == 2
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
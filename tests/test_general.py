@@ -1,3 +1,5 @@
+import numpy as np
+import pandas as pd
 import pytest
 
 from hot_spot_analysis.utils import general
@@ -27,6 +29,18 @@ def test_json_to_dict():
     assert general.json_to_dict(series_of_json) == expected_output
 
 
+def test_values_to_str():
+    values = pd.Series([1, 2, 1, np.nan])
+    assert general.values_to_str(values).tolist() == ["1.0", "2.0", "1.0", None]
+    assert general.values_to_str(pd.Series(["a", "b"], dtype="category")).tolist() == ["a", "b"]
+
+
+def test_columns_to_dicts():
+    columns = [np.array(["1", "2"]), np.array(["x", "y"])]
+    expected_output = [{"a": "1", "b": "x"}, {"a": "2", "b": "y"}]
+    assert general.columns_to_dicts(["a", "b"], columns) == expected_output
+
+
 # Execute the tests
 if __name__ == "__main__":
     pytest.main()
@@ -1,4 +1,5 @@
 # %%
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -53,6 +54,15 @@ class TestDataFunctions:
         # Test return_data with non-grouped DataFrame
         assert grouped_df.return_data(df_non_grouped).equals(expected_output_non_grouped)
 
+    @staticmethod
+    def test_project_columns():
+        df = pd.DataFrame({"A": [1, 2, 3], "B": [4.0, 5.0, 6.0], "C": ["x", "y", "z"]})
+        df_projected = grouped_df.project_columns(df, ["A", "B"])
+
+        assert list(df_projected.columns) == ["A", "B"]
+        assert np.shares_memory(df_projected["B"].to_numpy(), df["B"].to_numpy())
+        assert grouped_df.project_columns(df, ["A", "B", "C"]) is df
+
     @staticmethod
     def test_add_groups_to_combos():
         # Define group_vars and combos test data
@@ -63,6 +73,16 @@ class TestDataFunctions:
         # Test add_groups_to_combos function
         assert grouped_df.add_groups_to_combos(group_vars, combos) == expected_output
 
+    @staticmethod
+    def test_run_objective_function_whole_frame_reducer():
+        df = pd.DataFrame({"ts": [1, 1, 2], "day": ["a", "b", "a"], "tip": [1.0, 2.0, 3.0]})
+        data_keys = {col: df[col].astype("category") for col in ["ts", "day"]}
+        output = grouped_df.run_objective_function(df, data_keys, ["ts"], lambda g: g.mean(numeric_only=True))
+
+        # The combo columns are keys, not metrics, like data.groupby(combo) would exclude them
+        assert list(output.columns) == ["ts", "n_rows", "tip"]
+        assert output["tip"].tolist() == [1.5, 3.0]
+
 
 # Execute the tests
 if __name__ == "__main__":
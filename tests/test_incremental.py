@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import encoding, incremental
+
+
+def test_check_schema():
+    data = pd.DataFrame({"a": [1], "b": ["x"]})
+    incremental.check_schema(data, pd.DataFrame({"a": [2], "b": ["y"]}))
+
+    with pytest.raises(ValueError, match="same columns"):
+        incremental.check_schema(data, pd.DataFrame({"a": [2]}))
+    with pytest.raises(ValueError, match="same dtypes"):
+        incremental.check_schema(data, pd.DataFrame({"a": [2.5], "b": ["y"]}))
+
+
+def test_check_new_periods():
+    periods = pd.DataFrame({"ts": [1, 1, 2]})
+    incremental.check_new_periods(periods, pd.DataFrame({"ts": [3, 4]}))
+
+    with pytest.raises(ValueError, match="already have an output: 2"):
+        incremental.check_new_periods(periods, pd.DataFrame({"ts": [2, 3]}))
+
+
+def test_merge_encoded():
+    encoded_chunks = [
+        encoding.encode_column(pd.Series(["b", "d", None])),
+        encoding.encode_column(pd.Series(["c", "b"])),
+        encoding.encode_column(pd.Series(["a"])),
+    ]
+
+    merged = incremental.merge_encoded(encoded_chunks)
+    assert merged.labels.tolist() == ["a", "b", "c", "d"]
+    assert merged.codes.tolist() == [1, 3, -1, 2, 1, 0]
+
+
+def test_sort_order():
+    compact_df = pd.DataFrame(
+        {
+            "combo_id": [1, 0, 0, 1],
+            "ts": pd.Categorical([2, 2, 1, 1]),
+            "day": pd.Categorical(["Sat", None, None, "Sun"]),
+        }
+    )
+    assert incremental.sort_order(compact_df, ["ts", "day"]).tolist() == [2, 1, 3, 0]
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
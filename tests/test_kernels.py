@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from hot_spot_analysis.utils import kernels
+
+
+def test_group_reduce():
+    group_ids = np.array([0, 1, 0, 1, 2])
+    values = np.array([1.0, 2.0, np.nan, 4.0, np.nan])
+
+    assert kernels.group_reduce("count", group_ids, values, 3).tolist() == [1, 2, 0]
+    assert kernels.group_reduce("sum", group_ids, values, 3).tolist() == [1.0, 6.0, 0.0]
+    np.testing.assert_array_equal(kernels.group_reduce("min", group_ids, values, 3), [1.0, 2.0, np.nan])
+    np.testing.assert_array_equal(kernels.group_reduce("max", group_ids, values, 3), [1.0, 4.0, np.nan])
+
+
+def test_group_reduce_integers():
+    group_ids = np.array([0, 1, 0])
+    values = np.array([5, 2, 3])
+
+    assert kernels.group_reduce("sum", group_ids, values, 2).dtype == np.int64
+    assert kernels.group_reduce("min", group_ids, values, 2).tolist() == [3, 2]
+    assert kernels.group_reduce("max", group_ids, values, 2).tolist() == [5, 2]
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import lag
+
+
+def test_dense_ids():
+    ids = lag.dense_ids([np.array([1, 0, 1, -1]), np.array([0, 2, 0, 1])])
+    assert ids.tolist() == [2, 1, 2, 0]
+
+
+def test_period_positions():
+    # Periods of 2 years & 3 weeks, numbered among all 6 even without a row of week 1 of year 1
+    positions = lag.period_positions([np.array([0, 0, 1, 1]), np.array([0, 2, 0, 2])], [2, 3])
+    assert positions.tolist() == [0, 2, 3, 5]
+
+
+def test_lag_sources_by_rows():
+    # Two series, the second is missing period 1 & its rows are out of order
+    series_ids = np.array([0, 0, 0, 1, 1])
+    period_ids = np.array([0, 1, 2, 2, 0])
+    lag_1, lag_2 = lag.lag_sources(series_ids, period_ids, [1, 2])
+    assert lag_1.tolist() == [-1, 0, 1, 4, -1]
+    assert lag_2.tolist() == [-1, -1, 0, -1, -1]
+
+
+def test_lag_sources_by_time_period():
+    series_ids = np.array([0, 0, 0, 1, 1])
+    period_ids = np.array([0, 1, 2, 2, 0])
+    lag_1, lag_2, lead_1 = lag.lag_sources(series_ids, period_ids, [1, 2, -1], lag_by="time_period")
+    assert lag_1.tolist() == [-1, 0, 1, -1, -1]
+    assert lag_2.tolist() == [-1, -1, 0, 4, -1]
+    assert lead_1.tolist() == [1, 2, -1, -1, -1]
+
+
+def test_lag_sources_invalid_lag_by():
+    with pytest.raises(ValueError):
+        lag.lag_sources(np.array([0]), np.array([0]), [1], lag_by="days")
+
+
+def test_lag_columns():
+    df = pd.DataFrame({"n_rows": [1, 2, 3], "tp": [{"ts": "1"}, {"ts": "2"}, {"ts": "3"}]})
+    df = lag.lag_columns(df, ["n_rows", "tp"], [1], [np.array([-1, 0, 1])])
+    assert df.columns.tolist() == ["n_rows", "tp", "n_rows_lag1", "tp_lag1"]
+    assert df["n_rows_lag1"].fillna(-1).tolist() == [-1, 1, 2]
+    assert df["tp_lag1"].tolist()[1:] == [{"ts": "1"}, {"ts": "2"}]
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
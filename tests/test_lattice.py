@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import encoding, lattice, metrics
+
+
+def test_score_cuts():
+    df = pd.DataFrame({"n_rows": [3, 1], "avg": [2.0, np.nan]})
+    assert lattice.score_cuts(df, "n_rows").tolist() == [3.0, 1.0]
+    assert lattice.score_cuts(df, "avg").tolist() == [2.0, -np.inf]
+    assert lattice.score_cuts(df, lambda d: -d["n_rows"]).tolist() == [-3.0, -1.0]
+
+    with pytest.raises(ValueError, match="column of the output"):
+        lattice.score_cuts(df, "total")
+    with pytest.raises(ValueError, match="one score per cut"):
+        lattice.score_cuts(df, lambda d: [1.0])
+
+
+def test_is_antimonotone():
+    data = pd.DataFrame({"tip": [1.0, 2.0], "delta": [-1.0, 2.0]})
+    specs = {"tips": metrics.Sum("tip"), "deltas": metrics.Sum("delta"), "n": metrics.Count("tip")}
+
+    assert lattice.is_antimonotone("n_rows", lambda d: d, data)
+    assert lattice.is_antimonotone("tips", specs, data)
+    assert lattice.is_antimonotone("n", specs, data)
+    # Sums of negative values & functions of the output can grow from a cut to its children
+    assert not lattice.is_antimonotone("deltas", specs, data)
+    assert not lattice.is_antimonotone(lambda d: d["tips"], specs, data)
+
+
+def test_child_targets():
+    children = lattice.child_targets([("A",), ("C",)], ["A", "B", "C"])
+    assert children == [("A", "B"), ("A", "C"), ("B", "C")]
+
+
+def test_group_rows():
+    df = pd.DataFrame({"A": ["x", "y", "x", "y"], "B": [1, 1, 2, 1]})
+    data_codes = encoding.encode_columns(df, ["A", "B"])
+    groups = pd.DataFrame({"A": ["y", "x"], "B": [1, 2]})
+    assert lattice.group_rows(data_codes, ["A", "B"], groups).tolist() == [False, True, True, True]
+
+
+def test_select_top():
+    dfs = [pd.DataFrame({"n_rows": [1, 2]}), pd.DataFrame({"n_rows": [3, 4, 5]})]
+    scores = [np.array([5.0, 1.0]), np.array([4.0, -np.inf, 5.0])]
+    selected = lattice.select_top(dfs, scores, 3)
+    assert [positions.tolist() for positions in selected] == [[0], [0, 2]]
+    assert lattice.kth_best(scores, 3) == 4.0
+    assert lattice.kth_best(scores, 5) is None
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import metrics
+
+
+def test_to_metric():
+    assert metrics.to_metric("avg", metrics.Mean("V")) == metrics.Mean("V")
+    assert metrics.to_metric("avg", pd.NamedAgg("V", "mean")) == metrics.Mean("V")
+    assert metrics.to_metric("total", ("V", "sum")) == metrics.Sum("V")
+
+    with pytest.raises(ValueError):
+        metrics.to_metric("med", ("V", "median"))
+    with pytest.raises(ValueError):
+        metrics.to_metric("total", "V")
+
+
+def test_statistics():
+    metric_specs = {"avg": metrics.Mean("V"), "total": metrics.Sum("V"), "ratio": metrics.RatioOfSums("V", "W")}
+    assert metrics.statistics(metric_specs) == [("V", "sum"), ("V", "count"), ("W", "sum")]
+
+
+def test_finalize():
+    stats = pd.DataFrame(
+        {
+            "V__sum": [6.0, 4.0],
+            "V__count": [3, 1],
+            "V__csum": [0.0, 0.0],
+            "V__csumsq": [2.0, 0.0],
+            "W__sum": [3.0, 0.0],
+        }
+    )
+    metric_specs = {
+        "avg": metrics.Mean("V"),
+        "var": metrics.Var("V"),
+        "std": metrics.Std("V"),
+        "ratio": metrics.RatioOfSums("V", "W"),
+    }
+    output = metrics.finalize(stats, metric_specs)
+
+    assert output["avg"].tolist() == [2.0, 4.0]
+    assert output["var"][0] == 1.0 and np.isnan(output["var"][1])
+    assert output["std"][0] == 1.0
+    assert output["ratio"].tolist() == [2.0, np.inf]
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, objectives, result_cache
+
+
+def avg_tips(grouped):
+    return grouped.agg(avg_tips=("tip", "mean"))
+
+
+def max_bill(grouped):
+    return grouped["total_bill"].max()
+
+
+def avg_size(grouped):
+    return grouped.agg(avg_size=("size", "mean")).reset_index()
+
+
+def build_hsa(objective_function):
+    return HotSpotAnalyzer(
+        data=demo.tips().build_df(stack_count=3),
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        objective_function=objective_function,
+        verbose=False,
+    )
+
+
+def test_is_objective_set():
+    assert objectives.is_objective_set({"avg_tips": avg_tips})
+    assert not objectives.is_objective_set({"avg_tips": ("tip", "mean")})
+    assert not objectives.is_objective_set({})
+    assert not objectives.is_objective_set(avg_tips)
+
+
+def test_objective_set_matches_single_function():
+    HSA = build_hsa({"tips": avg_tips, "max_bill": max_bill, "sizes": avg_size})
+    assert isinstance(HSA.objective_function, objectives.ObjectiveSet)
+    HSA.run_hsa()
+
+    HSA_single = build_hsa(
+        lambda grouped: grouped.agg(avg_tips=("tip", "mean"), max_bill=("total_bill", "max"), avg_size=("size", "mean"))
+    )
+    HSA_single.run_hsa()
+    pd.testing.assert_frame_equal(HSA.hsa_output_df, HSA_single.hsa_output_df)
+
+    # Each function is timed on its own, the groups & n_rows of each combination once for all
+    profile = HSA.profile().set_index("phase")
+    for name in ["tips", "max_bill", "sizes"]:
+        assert profile.loc[f"objective:{name}", "events"] == profile.loc["groupby", "events"]
+
+
+def test_objective_set_profile_in_parallel_and_cached_runs(tmp_path):
+    pytest.importorskip("pyarrow")
+    objective_set = {"tips": avg_tips, "max_bill": max_bill}
+
+    # The workers send the events of each function back
+    HSA = build_hsa(objective_set)
+    HSA.run_hsa(n_jobs=2)
+    profile = HSA.profile().set_index("phase")
+    for name in objective_set:
+        assert profile.loc[f"objective:{name}", "events"] == len(HSA.combinations)
+
+    # Only the combinations that aren't read back from the cache run
+    build_hsa(objective_set).run_hsa(cache=tmp_path)
+    HSA_cached = build_hsa(objective_set)
+    HSA_cached.run_hsa(cache=tmp_path)
+    assert HSA_cached.cache_stats["misses"] == 0
+    assert "objective:tips" not in HSA_cached.profile()["phase"].tolist()
+
+
+def test_objective_set_rejects_shared_columns():
+    objective_set = objectives.ObjectiveSet({"first": avg_tips, "second": avg_tips})
+    grouped = demo.tips().build_df(stack_count=1).groupby("day")
+    with pytest.raises(ValueError):
+        objective_set(grouped)
+
+
+def test_hash_objective_set():
+    first = objectives.ObjectiveSet({"tips": avg_tips, "max_bill": max_bill})
+    second = objectives.ObjectiveSet({"tips": avg_tips, "max_bill": avg_size})
+    assert result_cache.hash_objective_function(first) == result_cache.hash_objective_function(
+        objectives.ObjectiveSet({"tips": avg_tips, "max_bill": max_bill})
+    )
+    assert result_cache.hash_objective_function(first) != result_cache.hash_objective_function(second)
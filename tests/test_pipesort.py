@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import combos, demo, metrics, pipesort, rollup
+
+
+def build_combinations(n_cols, limit):
+    return [["Overall"]] + combos.create_combos([f"c{i}" for i in range(n_cols)], limit)
+
+
+@pytest.mark.parametrize("n_cols, limit, n_chains", [(4, 4, 6), (8, 4, 70), (6, 2, 15)])
+def test_chain_cover(n_cols, limit, n_chains):
+    combinations = build_combinations(n_cols, limit)
+    chains = pipesort.chain_cover(combinations)
+
+    # Every combination is in exactly one chain, & as many chains as the widest level are needed
+    assert sorted(combo_i for chain in chains for combo_i in chain) == list(range(len(combinations)))
+    assert len(chains) == n_chains
+    for chain in chains:
+        chain_cols = [pipesort.combo_cols(combinations[combo_i]) for combo_i in chain]
+        assert all(lower < upper for lower, upper in zip(chain_cols, chain_cols[1:]))
+
+
+def test_rollup_chain_matches_rollup():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({col: rng.integers(0, 4, 500) for col in ["a", "b", "c"]})
+    df["v"] = rng.normal(size=500)
+    df.loc[::7, "b"] = np.nan
+    metric_specs = metrics.validate_metrics(
+        {"avg": metrics.Mean("v"), "var": metrics.Var("v"), "top": metrics.Max("v")}
+    )
+    combinations = [["Overall"]] + combos.create_combos(["a", "b", "c"], 3)
+
+    lattice = rollup.rollup_combos(df, combinations, metric_specs)
+    chains = rollup.rollup_combos(df, combinations, metric_specs, schedule="pipesort")
+    for expected, output in zip(lattice, chains):
+        pd.testing.assert_frame_equal(expected, output)
+
+    with pytest.raises(ValueError):
+        rollup.rollup_combos(df, combinations, metric_specs, schedule="sorted")
+
+
+def test_hsa_rollup_schedule():
+    df_tips = demo.tips().build_df(stack_count=3)
+    outputs = []
+    for rollup_schedule in ["lattice", "pipesort"]:
+        HSA = HotSpotAnalyzer(
+            data=df_tips,
+            target_cols=["day", "smoker", "size", "sex"],
+            time_period=["fake_ts"],
+            objective_function={"avg_tips": metrics.Mean("tip"), "max_bill": metrics.Max("total_bill")},
+            verbose=False,
+            rollup_schedule=rollup_schedule,
+        )
+        HSA.run_hsa()
+        outputs.append(HSA.hsa_output_df)
+
+        # Streamed chunks are rolled up with the same schedule
+        HSA.run_hsa_streaming([df_tips.iloc[:500], df_tips.iloc[500:]])
+        pd.testing.assert_frame_equal(HSA.hsa_output_df, outputs[-1], check_dtype=False)
+    pd.testing.assert_frame_equal(outputs[0], outputs[1])
+
+    with pytest.raises(ValueError):
+        HotSpotAnalyzer(data=df_tips, target_cols=["day"], rollup_schedule="sorted")
@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, metrics, polars_backend
+
+pl = pytest.importorskip("polars")
+
+METRIC_SPECS = {
+    "avg_tips": metrics.Mean("tip"),
+    "var_tips": metrics.Var("tip"),
+    "n_tips": metrics.Count("tip"),
+    "max_bill": metrics.Max("total_bill"),
+    # Integer columns keep their dtype, like the pandas backend
+    "min_size": metrics.Min("size"),
+    "max_size": metrics.Max("size"),
+    "tips_per_bill": metrics.RatioOfSums("tip", "total_bill"),
+}
+
+
+def build_hsa(data, objective_function=METRIC_SPECS, **kwargs):
+    return HotSpotAnalyzer(
+        data=data,
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        interaction_limit=3,
+        objective_function=objective_function,
+        verbose=False,
+        **kwargs,
+    )
+
+
+def test_run_combos():
+    df = pd.DataFrame({"a": ["x", "y", "x", None], "value": [1.0, 2.0, 3.0, 4.0]})
+    outputs, encoded = polars_backend.run_combos(
+        pl.from_pandas(df).lazy(),
+        [["Overall"], ["a"]],
+        metrics.validate_metrics({"total": metrics.Sum("value"), "avg": metrics.Mean("value")}),
+    )
+
+    assert encoded["a"].labels.tolist() == ["x", "y"]
+    assert encoded["Overall"].labels.tolist() == ["Overall"]
+    assert outputs[0].to_dict("list") == {"Overall": ["Overall"], "n_rows": [4], "total": [10.0], "avg": [2.5]}
+    # Rows missing a grouping column are dropped, like pandas' groupby
+    assert outputs[1].to_dict("list") == {"a": ["x", "y"], "n_rows": [2, 1], "total": [4.0, 2.0], "avg": [2.0, 2.0]}
+
+
+def test_polars_sums_like_pandas():
+    # The sums of integer & boolean columns are integers on both backends
+    df_tips = demo.tips().build_df(stack_count=3)
+    df_tips["is_large"] = df_tips["total_bill"] > 20
+    specs = {"total_size": metrics.Sum("size"), "n_large": metrics.Sum("is_large"), "total_tips": metrics.Sum("tip")}
+    outputs = []
+    for backend in ["pandas", "polars"]:
+        HSA = build_hsa(df_tips, objective_function=specs, backend=backend)
+        HSA.run_hsa()
+        outputs.append(HSA.hsa_output_df)
+
+    pd.testing.assert_frame_equal(outputs[0], outputs[1], check_dtype=True)
+    assert outputs[1][["total_size", "n_large", "total_tips"]].dtypes.tolist() == ["int64", "int64", "float64"]
+
+
+@pytest.mark.parametrize("output_layout", ["dicts", "compact"])
+@pytest.mark.parametrize("frame", ["pandas", "polars", "lazy"])
+def test_polars_matches_pandas(output_layout, frame):
+    df_tips = demo.tips().build_df(stack_count=3)
+    HSA_pandas = build_hsa(df_tips, output_layout=output_layout, min_support=5)
+    HSA_pandas.run_hsa()
+
+    data = {"pandas": df_tips, "polars": pl.from_pandas(df_tips), "lazy": pl.from_pandas(df_tips).lazy()}[frame]
+    HSA_polars = build_hsa(data, output_layout=output_layout, min_support=5, backend="polars")
+    HSA_polars.run_hsa()
+
+    assert HSA_polars.backend == "polars"
+    assert "polars" in HSA_polars.profile()["phase"].tolist()
+    pd.testing.assert_frame_equal(HSA_pandas.hsa_output_df, HSA_polars.hsa_output_df)
+
+    # The output is searched & lagged like the output of the pandas backend
+    pd.testing.assert_frame_equal(HSA_pandas.lag_hsa_by_time_period(1), HSA_polars.lag_hsa_by_time_period(1))
+
+
+def test_backend_is_resolved_from_the_data():
+    df_tips = demo.tips().build_df(stack_count=1)
+    assert build_hsa(df_tips).backend == "pandas"
+    assert build_hsa(pl.from_pandas(df_tips)).backend == "polars"
+
+    # Polars data can run on the pandas backend, ie: with an objective function
+    HSA = build_hsa(pl.from_pandas(df_tips), backend="pandas")
+    HSA.objective_function = lambda data: data.agg(avg_tips=("tip", "mean"))
+    HSA.run_hsa()
+    assert len(HSA.hsa_output_df) > 0
+
+    with pytest.raises(ValueError):
+        build_hsa(df_tips, backend="spark")
+
+
+def test_polars_backend_rejects_unsupported_options():
+    df_tips = demo.tips().build_df(stack_count=1)
+
+    HSA = build_hsa(df_tips, backend="polars")
+    HSA.objective_function = lambda data: data.agg(avg_tips=("tip", "mean"))
+    with pytest.raises(ValueError):
+        HSA.run_hsa()
+
+    runs = [lambda HSA: HSA.run_hsa(n_jobs=2), lambda HSA: HSA.run_hsa(cache="cache"), lambda HSA: list(HSA.iter_hsa())]
+    for run in runs:
+        with pytest.raises(ValueError):
+            run(build_hsa(df_tips, backend="polars"))
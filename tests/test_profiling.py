@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import profiling
+
+
+def test_profiler_phase():
+    events = []
+    profiler = profiling.Profiler(callbacks=[events.append])
+    with profiler.phase("groupby", ["A"], rows_in=10) as event:
+        event.n_groups = 3
+
+    assert events == profiler.events
+    assert events[0].phase == "groupby"
+    assert events[0].combination == ["A"]
+    assert events[0].rows_in == 10
+    assert events[0].n_groups == 3
+    assert events[0].wall_time >= 0
+
+
+def test_profiler_summary():
+    profiler = profiling.Profiler()
+    assert profiler.summary().empty
+
+    for rows_in in [10, 20]:
+        with profiler.phase("objective", rows_in=rows_in) as event:
+            event.rows_out = rows_in // 10
+    with profiler.phase("lag"):
+        pass
+
+    summary = profiler.summary()
+    assert summary["phase"].tolist() == ["objective", "lag"]
+    assert summary["events"].tolist() == [2, 1]
+    assert summary["rows_in"].tolist() == [30, pd.NA]
+    assert summary["rows_out"].tolist() == [3, pd.NA]
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
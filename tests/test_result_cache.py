@@ -0,0 +1,125 @@
+import functools
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, metrics, result_cache
+
+pytest.importorskip("pyarrow")
+
+
+def test_hash_data():
+    data = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+    assert result_cache.hash_data(data, ["a", "b"]) == result_cache.hash_data(data.copy(), ["a", "b"])
+    assert result_cache.hash_data(data, ["a", "b"]) != result_cache.hash_data(data.assign(b=["x", "z"]), ["a", "b"])
+    # Columns that aren't hashed don't change the hash
+    assert result_cache.hash_data(data, ["a"]) == result_cache.hash_data(data.assign(b=["x", "z"]), ["a"])
+
+
+def test_hash_objective_function():
+    def build_function(aggregations):
+        return lambda data: data.agg(**aggregations)
+
+    sum_tips = build_function({"tips": ("tip", "sum")})
+    assert result_cache.hash_objective_function(sum_tips) == result_cache.hash_objective_function(
+        build_function({"tips": ("tip", "sum")})
+    )
+    assert result_cache.hash_objective_function(sum_tips) != result_cache.hash_objective_function(
+        build_function({"tips": ("tip", "max")})
+    )
+    assert result_cache.hash_objective_function({"avg": metrics.Mean("tip")}) != result_cache.hash_objective_function(
+        {"avg": metrics.Mean("total_bill")}
+    )
+
+
+class MinTips:
+    def __init__(self, min_tip):
+        self.min_tip = min_tip
+
+    def objective(self, data):
+        return data.agg(n_tips=("tip", lambda tips: (tips >= self.min_tip).sum()))
+
+
+def sum_column(data, column="tip"):
+    return data[column].sum()
+
+
+def sum_tips(data):
+    return sum_column(data)
+
+
+def test_hash_objective_function_dependencies(monkeypatch):
+    # Bound methods depend on their instance, partials on their arguments
+    assert result_cache.hash_objective_function(MinTips(1).objective) == result_cache.hash_objective_function(
+        MinTips(1).objective
+    )
+    assert result_cache.hash_objective_function(MinTips(1).objective) != result_cache.hash_objective_function(
+        MinTips(100).objective
+    )
+    assert result_cache.hash_objective_function(
+        functools.partial(sum_column, column="tip")
+    ) != result_cache.hash_objective_function(functools.partial(sum_column, column="total_bill"))
+
+    # The helper functions called by an objective function are hashed with it
+    tips_hash = result_cache.hash_objective_function(sum_tips)
+    monkeypatch.setitem(sum_tips.__globals__, "sum_column", lambda data, column="tip": data[column].max())
+    assert result_cache.hash_objective_function(sum_tips) != tips_hash
+
+
+def test_unhashable_objective_function_disables_cache(tmp_path):
+    lock = threading.Lock()
+
+    def objective_function(data):
+        with lock:
+            return data.agg(avg_tips=("tip", "mean"))
+
+    assert result_cache.hash_objective_function(objective_function) is None
+    HSA = HotSpotAnalyzer(
+        data=demo.tips().build_df(stack_count=2),
+        target_cols=["day", "smoker"],
+        time_period=["fake_ts"],
+        objective_function=objective_function,
+        verbose=False,
+    )
+    with pytest.warns(UserWarning):
+        HSA.run_hsa(cache=tmp_path)
+    assert HSA.cache is None
+    assert not list(tmp_path.iterdir())
+    assert len(HSA.hsa_output_df) > 0
+
+
+def test_result_cache_get_put(tmp_path):
+    cache = result_cache.ResultCache(tmp_path)
+    df = pd.DataFrame({"day": ["Sat", "Sun"], "n_rows": [3, 4]})
+
+    assert cache.get("key") is None
+    assert cache.put("key", df)
+    pd.testing.assert_frame_equal(cache.get("key"), df)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Outputs Parquet can't store are not cached
+    assert not cache.put("mixed", pd.DataFrame({"mixed": [1, "a"]}))
+    assert cache.get("mixed") is None
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = result_cache.ResultCache(tmp_path)
+    df = pd.DataFrame({"n_rows": range(100)})
+    for seconds_ago, key in zip([3, 2, 1], ["a", "b", "c"]):
+        cache.put(key, df)
+        last_used = time.time_ns() - seconds_ago * 10**9
+        os.utime(cache.path(key), ns=(last_used, last_used))
+    cache.get("a")  # "a" becomes the most recently used
+
+    cache.max_bytes = 2 * os.path.getsize(cache.path("a"))
+    assert cache.evict() == 1
+    assert [entry.name for entry in cache.entries()] == ["c.parquet", "a.parquet"]
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import metrics, rollup
+
+
+def build_df():
+    return pd.DataFrame(
+        {
+            "A": ["x", "x", "y", "y", None, "x"],
+            "B": [1, 2, 1, 2, 1, np.nan],
+            "V": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        }
+    )
+
+
+def test_rollup_combos_matches_groupby():
+    df = build_df()
+    aggregations = {
+        "total": ("V", "sum"),
+        "n": ("V", "count"),
+        "avg": ("V", "mean"),
+        "var": ("V", "var"),
+        "std": ("V", "std"),
+        "low": ("V", "min"),
+        "high": ("V", "max"),
+    }
+    combinations = [["A"], ["B"], ["A", "B"]]
+
+    outputs = rollup.rollup_combos(df, combinations, metrics.validate_metrics(aggregations))
+
+    for combo, output in zip(combinations, outputs):
+        df_grp = df.groupby(combo)
+        expected = df_grp.size().reset_index(name="n_rows").merge(df_grp.agg(**aggregations), on=combo)
+        pd.testing.assert_frame_equal(output, expected, check_dtype=False)
+
+
+def test_iter_rollup_combos_matches_rollup_combos():
+    df = build_df()
+    metric_specs = metrics.validate_metrics({"total": ("V", "sum"), "avg": ("V", "mean")})
+    combinations = [["A"], ["B"], ["A", "B"]]
+
+    outputs = rollup.rollup_combos(df, combinations, metric_specs)
+    for output, iter_output in zip(outputs, rollup.iter_rollup_combos(df, combinations, metric_specs)):
+        pd.testing.assert_frame_equal(output, iter_output)
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
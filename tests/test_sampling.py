@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, encoding, metrics, sampling
+
+METRIC_SPECS = {
+    "total_tips": metrics.Sum("tip"),
+    "avg_tips": metrics.Mean("tip"),
+    "n_tips": metrics.Count("tip"),
+    "max_bill": metrics.Max("total_bill"),
+}
+
+
+def build_hsa(data, **kwargs):
+    return HotSpotAnalyzer(
+        data=data,
+        target_cols=["day", "smoker", "size"],
+        time_period=["fake_ts"],
+        interaction_limit=2,
+        objective_function=METRIC_SPECS,
+        verbose=False,
+        **kwargs,
+    )
+
+
+def test_sample_rows():
+    df = pd.DataFrame({"ts": [1] * 90 + [2] * 9 + [3]})
+    data_codes = {"ts": encoding.encode_column(df["ts"])}
+    rows, strata = sampling.sample_rows(data_codes, ["ts"], 0.1, random_state=0)
+
+    # Each stratum keeps its share of the sample, & at least one row
+    assert strata.population.tolist() == [90, 9, 1]
+    assert strata.sample.tolist() == [9, 1, 1]
+    assert len(np.unique(rows)) == len(rows) == 11
+    assert np.bincount(data_codes["ts"].codes[rows]).tolist() == [9, 1, 1]
+
+    rows, strata = sampling.sample_rows(data_codes, [], 0.5, random_state=0)
+    assert strata.population.tolist() == [100]
+    assert len(rows) == 50
+
+
+def test_full_sample_matches_run_hsa():
+    df_tips = demo.tips().build_df(stack_count=3)
+    HSA = build_hsa(df_tips)
+    HSA.run_hsa()
+
+    HSA_sample = build_hsa(df_tips)
+    HSA_sample.run_hsa(sample_fraction=1)
+    output = HSA_sample.hsa_output_df
+
+    # A sample of every row has no sampling error
+    assert (output["n_sample_rows"] == output["n_rows"]).all()
+    assert (output["total_tips_lower"] == output["total_tips_upper"]).all()
+    assert not output["is_noisy"].any()
+    pd.testing.assert_frame_equal(HSA.hsa_output_df, output[HSA.hsa_output_df.columns], check_dtype=False)
+
+
+def test_approximate_run_hsa():
+    df_tips = demo.tips().build_df(stack_count=20)
+    HSA = build_hsa(df_tips)
+    HSA.run_hsa()
+
+    HSA_sample = build_hsa(df_tips)
+    HSA_sample.run_hsa(approximate=True, max_relative_error=0.5, random_state=0)
+    output = HSA_sample.hsa_output_df
+    assert output["n_sample_rows"].sum() < HSA.hsa_output_df["n_rows"].sum() / 5
+    assert "sample" in HSA_sample.profile()["phase"].tolist()
+
+    # The estimates are within their intervals, & a time period is a stratum of known size
+    for name in ["n_rows", "total_tips", "avg_tips", "n_tips"]:
+        assert (output[f"{name}_lower"] <= output[name]).all() and (output[name] <= output[f"{name}_upper"]).all()
+    overall = output["combo_dict"].map(lambda combo_dict: combo_dict == {"Overall": "Overall"}).to_numpy()
+    expected = HSA.hsa_output_df[HSA.hsa_output_df["interaction_count"] == 1]
+    np.testing.assert_array_equal(output.loc[overall, "n_rows"], expected["n_rows"].iloc[: overall.sum()])
+    assert "max_bill_lower" not in output.columns
+
+    not_noisy = HSA_sample.search_hsa_output(search_terms="day", exclude_noisy=True)
+    assert len(not_noisy) > 0 and not not_noisy["is_noisy"].any()
+    with pytest.raises(ValueError):
+        HSA.search_hsa_output(search_terms="day", exclude_noisy=True)
+
+
+def test_approximate_run_hsa_rejects_invalid_options():
+    df_tips = demo.tips().build_df(stack_count=1)
+    for options in [{"sample_fraction": 0}, {"sample_fraction": 1.5}, {"approximate": True, "cache": "cache"}]:
+        with pytest.raises(ValueError):
+            build_hsa(df_tips).run_hsa(**options)
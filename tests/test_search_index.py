@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import compact, encoding, search_index
+
+
+def build_index():
+    data = pd.DataFrame({"ts": [1, 1, 2], "day": ["Sat", "Sun", "Sat"], "size": [1, 2, 1], "Overall": "Overall"})
+    data_codes = encoding.encode_columns(data, ["ts", "day", "size", "Overall"])
+    combinations = [["ts", "Overall"], ["ts", "day"], ["ts", "day", "size"]]
+    raw_output_dicts = [
+        {
+            "combination": combo,
+            "interaction_count": 0,
+            "df": data[combo].drop_duplicates().assign(n_rows=1),
+        }
+        for combo in combinations
+    ]
+    compact_df = compact.build_compact_df(raw_output_dicts, data_codes, ["ts"], ["day", "size"])
+    combinations_df = compact.build_combinations_df(combinations, ["ts"])
+    return search_index.build_search_index(compact_df, combinations_df, ["ts"], ["day", "size"])
+
+
+def test_group_rows():
+    rows = search_index.group_rows(pd.Series([1, -1, 0, 1]).to_numpy())
+    assert {code: rows_i.tolist() for code, rows_i in rows.items()} == {0: [2], 1: [0, 3]}
+
+
+def test_build_search_index():
+    index = build_index()
+    # Rows: 0-1 Overall, 2-4 day, 5-7 day & size
+    assert index.n_keys.tolist() == [2, 2, 2, 2, 2, 3, 3, 3]
+    assert index.key_rows["Overall"].tolist() == [0, 1]
+    assert index.key_rows["size"].tolist() == [5, 6, 7]
+    assert index.key_value_rows[("day", "Sat")].tolist() == [2, 4, 5, 7]
+    # The value '1' is held by both ts & size
+    assert index.value_rows["1"].tolist() == [0, 2, 3, 5, 5, 6, 7]
+
+
+def test_search():
+    index = build_index()
+    assert index.search(["size"], "keys", "any").tolist() == [False] * 5 + [True] * 3
+    assert index.search(["ts", "day"], "keys", "all").tolist() == [False] * 2 + [True] * 3 + [False] * 3
+    assert index.search(["1", "Overall"], "values", "all").tolist() == [True] + [False] * 7
+    assert index.search(["1", "1", "Sat"], "values", "all").tolist() == [False] * 5 + [True] + [False] * 2
+    assert not index.search(["missing"], "values", "any").any()
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
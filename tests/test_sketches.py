@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.hot_spot_analysis import HotSpotAnalyzer
+from hot_spot_analysis.utils import demo, kernels, metrics, rollup, sketches, streaming
+
+METRIC_SPECS = {
+    "n_users": metrics.Distinct("user"),
+    "median_value": metrics.Quantile("value"),
+    "p90_value": metrics.Quantile("value", q=0.9),
+    "total_value": metrics.Sum("value"),
+}
+
+
+def build_df(n_rows=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "a": rng.integers(0, 3, n_rows),
+            "b": rng.choice(["x", "y", "z", "w"], n_rows),
+            "user": rng.integers(0, 5_000, n_rows),
+            "value": rng.lognormal(size=n_rows),
+        }
+    )
+
+
+def test_estimate_distinct():
+    for n_distinct in [0, 1, 10, 500, 50_000]:
+        values = pd.Series(np.arange(n_distinct).repeat(2))
+        registers = sketches.group_registers(np.zeros(len(values), dtype=np.int64), values, 1)
+        estimate, lower, upper = (values[0] for values in sketches.estimate_distinct(registers))
+        assert lower <= n_distinct <= upper
+        assert lower <= estimate <= upper
+        assert abs(estimate - n_distinct) <= 0.1 * n_distinct
+
+    # Merging the registers of two groups estimates the distinct values of both
+    values = pd.Series(np.arange(3_000))
+    registers = sketches.group_registers(np.arange(3_000) % 2, values, 2)
+    assert np.array_equal(registers.max(axis=0), sketches.group_registers(np.zeros(3_000, dtype=int), values, 1)[0])
+
+
+def test_estimate_quantile():
+    df = build_df()
+    # Negative values, zeros & values outside of the magnitudes of the bins are counted too
+    df["value"] = df["value"] * np.where(df["b"] == "x", -1, 1) + np.where(df["b"] == "y", 1e13, 0)
+    df.loc[::50, "value"] = 0
+    group_ids = df["a"].to_numpy()
+    counts = sketches.group_histograms(group_ids, df["value"].to_numpy(), 3)
+    assert counts.sum(axis=1).tolist() == np.bincount(group_ids).tolist()
+
+    grouped = df.groupby("a")["value"]
+    for q in [0, 0.1, 0.5, 0.99, 1]:
+        estimate, lower, upper = sketches.estimate_quantile(counts, grouped.min(), grouped.max(), q)
+        expected = grouped.quantile(q).to_numpy()
+        assert (lower <= expected).all() and (expected <= upper).all()
+        assert (lower <= estimate).all() and (estimate <= upper).all()
+
+
+def test_group_reduce_block():
+    rng = np.random.default_rng(0)
+    group_ids = rng.integers(0, 5, 100)
+    values = rng.integers(0, 10, (100, 20))
+    for func in ["sum", "min", "max"]:
+        block = kernels.group_reduce_block(func, group_ids, values, 5)
+        expected = [kernels.group_reduce(func, group_ids, values[:, i], 5) for i in range(20)]
+        np.testing.assert_array_equal(block, np.column_stack(expected))
+    assert kernels.group_reduce_block("max", group_ids[:0], values[:0], 0).shape == (0, 20)
+
+
+def test_sketches_roll_up():
+    df = build_df()
+    specs = metrics.validate_metrics(METRIC_SPECS)
+    combinations = [["Overall"], ["a"], ["b"], ["a", "b"]]
+    outputs = rollup.rollup_combos(df, combinations, specs)
+
+    for combo, output in zip(combinations, outputs):
+        if combo == ["Overall"]:
+            continue
+        grouped = df.groupby(combo)
+        expected = pd.DataFrame(
+            {
+                "n_users": grouped["user"].nunique(),
+                "median_value": grouped["value"].median(),
+                "p90_value": grouped["value"].quantile(0.9),
+            }
+        ).reset_index()
+        # The ~95% bounds of HyperLogLog may miss a group, its estimates stay within ~4 standard errors
+        assert (np.abs(output["n_users"] / expected["n_users"] - 1) <= 0.15).all()
+        assert (output["n_users_lower"] <= output["n_users"]).all()
+        assert (output["n_users"] <= output["n_users_upper"]).all()
+        for name in ["median_value", "p90_value"]:
+            assert (output[f"{name}_lower"] <= expected[name]).all()
+            assert (expected[name] <= output[f"{name}_upper"]).all()
+        assert "total_value_lower" not in output.columns
+
+    # The finest cut is aggregated once, every other combination is merged from it
+    direct = rollup.rollup_combos(df, [["b"]], specs)[0]
+    pd.testing.assert_frame_equal(outputs[2], direct)
+
+
+def test_sketches_stream():
+    df = build_df()
+    specs = metrics.validate_metrics(METRIC_SPECS)
+    chunks = [df.iloc[start : start + 5_000] for start in range(0, len(df), 5_000)]
+    combinations = [["a"], ["a", "b"]]
+    outputs, _ = streaming.rollup_chunks(chunks, combinations, specs)
+
+    expected = df.groupby("a")["value"].median().to_numpy()
+    assert (outputs[0]["median_value_lower"] <= expected).all()
+    assert (expected <= outputs[0]["median_value_upper"]).all()
+    expected = df.groupby("a")["user"].nunique().to_numpy()
+    assert (np.abs(outputs[0]["n_users"] / expected - 1) <= 0.15).all()
+
+
+def test_sketches_stream_drifting_data():
+    # The values grow 1000 fold along the stream, far past the range of the first chunk
+    df = build_df(n_rows=40_000)
+    df["value"] = df["value"] * np.geomspace(1, 1_000, len(df))
+    specs = metrics.validate_metrics(METRIC_SPECS)
+    chunks = [df.iloc[start : start + 5_000] for start in range(0, len(df), 5_000)]
+    combinations = [["a"], ["a", "b"]]
+    streamed, _ = streaming.rollup_chunks(chunks, combinations, specs)
+    in_memory = rollup.rollup_combos(df, combinations, specs)
+
+    # The bins don't depend on the chunks, so the stream gets the same sketches as the whole data
+    for streamed_output, output in zip(streamed, in_memory):
+        pd.testing.assert_frame_equal(streamed_output, output, check_dtype=False)
+
+    grouped = df.groupby(["a", "b"])["value"]
+    for name, q in [("median_value", 0.5), ("p90_value", 0.9)]:
+        expected = grouped.quantile(q).to_numpy()
+        assert (np.abs(streamed[1][name] / expected - 1) <= sketches.QUANTILE_RELATIVE_ACCURACY).all()
+        assert (streamed[1][f"{name}_lower"] <= expected).all()
+        assert (expected <= streamed[1][f"{name}_upper"]).all()
+
+
+def test_sketches_run_hsa():
+    df_tips = demo.tips().build_df(stack_count=2)
+    HSA = HotSpotAnalyzer(
+        data=df_tips,
+        target_cols=["day", "smoker"],
+        time_period=["fake_ts"],
+        objective_function={"median_tip": metrics.Quantile("tip"), "n_bills": metrics.Distinct("total_bill")},
+        verbose=False,
+    )
+    HSA.run_hsa()
+    output = HSA.hsa_output_df
+    assert list(output.columns[3:9]) == [
+        "median_tip",
+        "n_bills",
+        "median_tip_lower",
+        "median_tip_upper",
+        "n_bills_lower",
+        "n_bills_upper",
+    ]
+    assert (output["n_bills_lower"] <= output["n_bills"]).all()
+
+    HSA_duckdb = HotSpotAnalyzer(
+        data=df_tips,
+        target_cols=["day", "smoker"],
+        objective_function={"n_bills": metrics.Distinct("total_bill")},
+        backend="duckdb",
+        verbose=False,
+    )
+    with pytest.raises(ValueError):
+        HSA_duckdb.run_hsa()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import encoding, metrics, rollup, streaming
+
+
+def test_stream_encoder():
+    encoder = streaming.StreamEncoder()
+    first = encoder.encode(pd.Series(["b", "a", None, "b"]))
+    second = encoder.encode(pd.Series(["c", "a"]))
+    assert first.codes.tolist() == [0, 1, -1, 0]
+    assert second.codes.tolist() == [2, 1]
+
+    labels, sorted_codes = encoder.finish()
+    assert labels.tolist() == ["a", "b", "c"]
+    assert sorted_codes.tolist() == [1, 0, 2]
+
+
+def test_iter_chunks(tmp_path):
+    df = pd.DataFrame({"a": range(5), "b": list("vwxyz")})
+    df.to_csv(tmp_path / "data.csv", index=False)
+
+    chunks = list(streaming.iter_chunks([df, str(tmp_path / "data.csv")], chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [5, 2, 2, 1]
+
+    with pytest.raises(ValueError):
+        list(streaming.iter_chunks([df.to_numpy()]))
+
+
+def test_iter_parquet_chunks(tmp_path):
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": range(5), "b": list("vwxyz")})
+    df.to_parquet(tmp_path / "data.parquet")
+
+    chunks = list(streaming.iter_chunks(tmp_path / "data.parquet", chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df)
+
+
+def test_rollup_chunks_matches_rollup_combos():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "a": rng.choice(["x", "y", "z", None], 500),
+            "b": rng.integers(0, 5, 500),
+            "value": rng.normal(100, 1, 500),
+        }
+    )
+    combinations = [["a"], ["b"], ["a", "b"]]
+    metric_specs = metrics.validate_metrics({"avg": metrics.Mean("value"), "var": metrics.Var("value")})
+
+    expected = rollup.rollup_combos(data, combinations, metric_specs)
+    outputs, encoded = streaming.rollup_chunks(
+        (data.iloc[start : start + 64] for start in range(0, len(data), 64)),
+        combinations,
+        metric_specs,
+    )
+
+    for expected_df, output_df in zip(expected, outputs):
+        pd.testing.assert_frame_equal(expected_df, output_df)
+    assert encoded["a"].labels.tolist() == encoding.encode_column(data["a"]).labels.tolist()
+
+
+def test_rollup_chunks_without_chunks():
+    with pytest.raises(ValueError):
+        streaming.rollup_chunks([], [["a"]], metrics.validate_metrics({"n": metrics.Count("a")}))
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()
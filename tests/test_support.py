@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hot_spot_analysis.utils import encoding, support
+
+
+def encode(df):
+    return {col: encoding.encode_column(df[col]) for col in df.columns}
+
+
+def test_target_sets():
+    combinations = [["ts", "Overall"], ["ts", "A"], ["ts", "A", "B"]]
+    assert support.target_sets(combinations, ["ts"]) == [frozenset(), frozenset({"A"}), frozenset({"A", "B"})]
+
+
+def test_has_support():
+    data_codes = encode(pd.DataFrame({"A": ["x", "x", "x", "y", None], "B": [1, 1, 2, 1, 1]}))
+    all_rows = np.ones(5, dtype=bool)
+
+    assert support.has_support(data_codes, ["A"], all_rows, 2).tolist() == [True, True, True, False, False]
+    assert support.has_support(data_codes, ["A", "B"], all_rows, 2).tolist() == [True, True, False, False, False]
+    # Only the rows of the mask count towards the support
+    rows = np.array([True, False, True, True, True])
+    assert support.has_support(data_codes, ["A"], rows, 2).tolist() == [True, False, True, False, False]
+
+
+def test_iter_level_masks():
+    df = pd.DataFrame({"A": ["x", "x", "x", "y"], "B": [1, 1, 2, 2], "C": ["p", "q", "p", "p"]})
+    combinations = [["A"], ["B"], ["C"], ["A", "B"], ["A", "C"], ["B", "C"]]
+    levels = list(support.iter_level_masks(encode(df), combinations, [], min_support=2))
+
+    assert [combo_ids for combo_ids, _ in levels] == [[0, 1, 2], [3, 4, 5]]
+    assert all(mask.all() for mask in levels[0][1])
+    # A=y & C=q are below the support, so only the rows of supported groups of both parents remain
+    masks = dict(zip(*levels[1]))
+    assert masks[3].tolist() == [True, True, True, False]
+    assert masks[4].tolist() == [True, False, True, False]
+    assert masks[5].tolist() == [True, False, True, True]
+
+
+def test_empty_output():
+    data_codes = encode(pd.DataFrame({"A": ["x", "y"], "B": [1, 2]}))
+    template_df = pd.DataFrame({"A": ["x"], "n_rows": [1], "total": [2.0]})
+
+    df = support.empty_output(["A", "B"], data_codes, template_df, ["A"])
+    assert df.columns.tolist() == ["A", "B", "n_rows", "total"]
+    assert df.empty
+    assert df["B"].dtype == data_codes["B"].labels.dtype
+
+
+# Execute the tests
+if __name__ == "__main__":
+    pytest.main()